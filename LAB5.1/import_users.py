@@ -0,0 +1,36 @@
+"""
+Bulk User Import
+Registers the users of a CSV or JSONL file and reports what happened to
+each row
+"""
+
+import sys
+
+from user_storage import DATABASE_FILE, UserManager
+
+
+def main():
+    """Import users from a file into a database file."""
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python import_users.py <users.csv|.jsonl> [database: users.json|.db|.log]")
+        sys.exit(1)
+    
+    source = sys.argv[1]
+    database = sys.argv[2] if len(sys.argv) == 3 else DATABASE_FILE
+    with UserManager(database) as manager:
+        try:
+            report = manager.import_users(source)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    
+    print(report)
+    for line, message in report.errors:
+        print(f"  line {line}: {message}")
+    rejected = report.rows - report.imported
+    if rejected > len(report.errors):
+        print(f"  ... {rejected - len(report.errors):,} more rejected rows")
+
+
+if __name__ == "__main__":
+    main()
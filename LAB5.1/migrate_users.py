@@ -0,0 +1,32 @@
+"""
+User Database Migration
+Copies users between database files, e.g. from users.json to SQLite
+"""
+
+import sys
+import time
+
+from user_storage import migrate_users
+
+
+def main():
+    """Copy every user from one database file to another."""
+    if len(sys.argv) != 3:
+        print("Usage: python migrate_users.py <source: users.json|.db|.log> <target: users.db|.log|.json>")
+        sys.exit(1)
+    
+    source, target = sys.argv[1], sys.argv[2]
+    start = time.perf_counter()
+    try:
+        copied, skipped = migrate_users(source, target)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    print(f"Copied {copied:,} users from {source} to {target} in {time.perf_counter() - start:.2f}s")
+    if skipped:
+        print(f"Skipped {skipped:,} users already in {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,38 @@ Explainable Product Recommendation System
 Provides transparent, understandable product recommendations with clear reasoning
 """
 
-from dataclasses import dataclass
-from typing import List, Dict, Tuple
+import hashlib
+import heapq
+import json
+import math
+import multiprocessing
+import operator
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from bisect import bisect_left, bisect_right
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Dict, Iterable, Iterator, Mapping, Optional, Set, TextIO, Tuple
 from enum import Enum
 
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only the columnar backend needs it
+    np = None
+
+
+# Highest score a product can reach without sharing a category or feature
+# with the user: budget (20) + full rating bonus (15) out of 100 points.
+UNMATCHED_SCORE_CEILING = 35.0
+
 
 # ============================================================================
 # DATA STRUCTURES
@@ -22,7 +50,12 @@ class Category(Enum):
     BEAUTY = "Beauty & Personal Care"
 
 
-@dataclass
+# Stable category <-> small integer code mapping for compact storage
+CATEGORIES = list(Category)
+CATEGORY_CODES = {category: code for code, category in enumerate(CATEGORIES)}
+
+
+@dataclass(slots=True)
 class Product:
     """Represents a product with its attributes."""
     product_id: int
@@ -37,7 +70,7 @@ class Product:
         return f"{self.name} (${self.price:.2f}) - Rating: {self.rating}/5"
 
 
-@dataclass
+@dataclass(slots=True)
 class UserPreference:
     """Represents user's preferences and purchase history."""
     user_id: int
@@ -56,12 +89,87 @@ class UserPreference:
                 f"  Minimum Rating: {self.minimum_rating}/5")
 
 
-@dataclass
+class ReasonCode(Enum):
+    """Why a product scored as it did; each value is the text template."""
+    CATEGORY_MATCH = "Matches preferred category: {0}"
+    CATEGORY_OTHER = "Category: {0} (not in preferred list)"
+    WITHIN_BUDGET = "Within budget range (${0:.2f}-${1:.2f})"
+    OUTSIDE_BUDGET = "Price ${0:.2f} is outside budget range"
+    GOOD_RATING = "Good rating: {0}/5 (minimum: {1}/5)"
+    FEATURE_MATCH = "Has {0} preferred features: {1}"
+    NO_FEATURES = "No preferred features found in this product"
+    ALSO_BOUGHT = "{0:.0f}% of customers who bought {1} also bought this"
+    BONUS = "{0} (+{1:g} points)"
+    EXCLUDED = "Excluded by rule: {0}"
+    VARIETY = "Added for variety (#{0} by match score)"
+
+
+def render_reason(code: ReasonCode, values: Tuple) -> str:
+    """
+    Render a reason code and its values as text.
+    
+    Args:
+        code: Reason code
+        values: Numbers and names filled into the code's template
+        
+    Returns:
+        The reason sentence
+    """
+    if code is ReasonCode.FEATURE_MATCH:
+        count, features = values
+        return code.value.format(count, ", ".join(features))
+    return code.value.format(*values)
+
+
+class LazyReasons(Sequence):
+    """
+    Recommendation reasons stored as (code, values) pairs.
+    
+    The text is rendered the first time the reasons are read, so callers
+    that only use IDs and scores never pay for string formatting. Behaves
+    like (and compares equal to) the equivalent list of strings.
+    """
+    
+    __slots__ = ('_codes', '_text')
+    
+    def __init__(self, codes: List[Tuple[ReasonCode, Tuple]]):
+        self._codes = codes
+        self._text = None
+    
+    @property
+    def codes(self) -> List[Tuple[ReasonCode, Tuple]]:
+        """The unrendered (code, values) pairs."""
+        return self._codes
+    
+    def _rendered(self) -> List[str]:
+        if self._text is None:
+            self._text = [render_reason(code, values) for code, values in self._codes]
+        return self._text
+    
+    def __len__(self) -> int:
+        return len(self._codes)
+    
+    def __getitem__(self, index):
+        return self._rendered()[index]
+    
+    def __iter__(self):
+        return iter(self._rendered())
+    
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return self._rendered() == list(other)
+        return NotImplemented
+    
+    def __repr__(self):
+        return repr(self._rendered())
+
+
+@dataclass(slots=True)
 class Recommendation:
     """Represents a single recommendation with explanation."""
     product: Product
     match_score: float  # 0-100%
-    reasons: List[str]  # Why this product is recommended
+    reasons: Sequence[str]  # Why this product is recommended (list or LazyReasons)
     matching_features: List[str]  # User features this product has
     
     def __str__(self):
@@ -80,12 +188,669 @@ class Recommendation:
 # PRODUCT DATABASE
 # ============================================================================
 
-class ProductDatabase:
-    """Manages the product catalog."""
+def _to_array(typecode: str, values: Sequence) -> array:
+    """Copy a sequence (e.g. a memoryview) into a new array."""
+    result = array(typecode)
+    if isinstance(values, memoryview):
+        result.frombytes(values.cast('B'))
+    else:
+        result.extend(values)
+    return result
+
+
+# (product_id, category, price, rating, features) of a product as indexed
+IndexedRow = Tuple[int, Category, float, float, Tuple[str, ...]]
+
+
+def _indexed_row(product: Product) -> IndexedRow:
+    """
+    Copy the indexed fields of a product, checking them first.
+    
+    Raises:
+        ValueError: If a field cannot be indexed
+    """
+    if not isinstance(product.category, Category):
+        raise ValueError(f"Product {product.product_id}: invalid category {product.category!r}")
+    for name in ('price', 'rating'):
+        value = getattr(product, name)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+            raise ValueError(f"Product {product.product_id}: invalid {name} {value!r}")
+    if isinstance(product.features, str) or not all(isinstance(f, str) for f in product.features):
+        raise ValueError(f"Product {product.product_id}: features must be a list of strings")
+    return (
+        product.product_id,
+        product.category,
+        float(product.price),
+        float(product.rating),
+        tuple(product.features)
+    )
+
+
+class ReadWriteLock:
+    """
+    Lock allowing many concurrent readers or a single writer.
+    
+    Waiting writers hold back new readers so updates are not starved.
+    The lock is not re-entrant.
+    """
     
     def __init__(self):
-        """Initialize with sample products."""
-        self.products = self._create_sample_products()
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+    
+    @contextmanager
+    def reading(self):
+        """Hold the lock as one of possibly many readers."""
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+    
+    @contextmanager
+    def writing(self):
+        """Hold the lock exclusively."""
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class CompactProductStore(Sequence):
+    """
+    Struct-of-arrays storage for large product catalogs.
+    
+    Numeric fields live in typed ``array`` columns and features are stored
+    as codes into a shared vocabulary, so each product costs a few dozen
+    bytes plus its name and description instead of a dataclass, a list
+    and a copy of every feature string. Product objects are materialized
+    on access; changing a materialized Product does not change the store.
+    """
+    
+    _ARRAY_COLUMNS = (
+        ('product_ids', 'q'), ('prices', 'd'), ('ratings', 'd'), ('category_codes', 'b'),
+        ('feature_codes', 'i'), ('feature_starts', 'q'), ('feature_ends', 'q'),
+    )
+    
+    def __init__(self, products: Iterable[Product] = ()):
+        """
+        Initialize the store.
+        
+        Args:
+            products: Products to copy into the store
+        """
+        self.product_ids = array('q')
+        self.prices = array('d')
+        self.ratings = array('d')
+        self.category_codes = array('b')
+        self.names: Sequence[str] = []
+        self.descriptions: Sequence[str] = []
+        
+        # Feature codes of position i: feature_codes[feature_starts[i]:feature_ends[i]]
+        self.feature_codes = array('i')
+        self.feature_starts = array('q')
+        self.feature_ends = array('q')
+        self.feature_vocabulary: List[str] = []
+        self._feature_lookup: Dict[str, int] = {}
+        # Codes left behind by replaced or removed products
+        self._dead_features = 0
+        
+        for product in products:
+            self.append(product)
+    
+    @classmethod
+    def from_columns(
+        cls,
+        columns: Dict[str, Sequence],
+        feature_vocabulary: List[str]
+    ) -> "CompactProductStore":
+        """
+        Create a store around existing columns without copying them.
+        
+        Columns may be read-only (e.g. memoryviews over a memory-mapped
+        snapshot); call make_writable() before modifying such a store.
+        
+        Args:
+            columns: Sequences keyed by column attribute name
+            feature_vocabulary: Feature strings indexed by feature code
+            
+        Returns:
+            The store
+        """
+        store = cls()
+        for name, column in columns.items():
+            setattr(store, name, column)
+        store.feature_vocabulary = list(feature_vocabulary)
+        store._feature_lookup = {f: code for code, f in enumerate(store.feature_vocabulary)}
+        return store
+    
+    def __len__(self) -> int:
+        return len(self.product_ids)
+    
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[p] for p in range(*position.indices(len(self)))]
+        
+        # len() of a column: len(self) would add a Python-level call to
+        # every product read on the scoring path
+        count = len(self.product_ids)
+        if position < 0:
+            position += count
+        if not 0 <= position < count:
+            raise IndexError("product position out of range")
+        
+        return Product(
+            product_id=self.product_ids[position],
+            name=self.names[position],
+            category=CATEGORIES[self.category_codes[position]],
+            price=self.prices[position],
+            rating=self.ratings[position],
+            description=self.descriptions[position],
+            features=self.features_at(position)
+        )
+    
+    def append(self, product: Product):
+        """Add a product at the end of the store."""
+        self.product_ids.append(product.product_id)
+        self.prices.append(product.price)
+        self.ratings.append(product.rating)
+        self.category_codes.append(CATEGORY_CODES[product.category])
+        self.names.append(product.name)
+        self.descriptions.append(product.description)
+        self.feature_starts.append(len(self.feature_codes))
+        self.feature_codes.extend(self.feature_code(f) for f in product.features)
+        self.feature_ends.append(len(self.feature_codes))
+    
+    def replace(self, position: int, product: Product):
+        """Overwrite the product at a position."""
+        self.product_ids[position] = product.product_id
+        self.prices[position] = product.price
+        self.ratings[position] = product.rating
+        self.category_codes[position] = CATEGORY_CODES[product.category]
+        self.names[position] = product.name
+        self.descriptions[position] = product.description
+        
+        codes = array('i', (self.feature_code(f) for f in product.features))
+        start = self.feature_starts[position]
+        old_length = self.feature_ends[position] - start
+        if len(codes) <= old_length:
+            self.feature_codes[start:start + len(codes)] = codes
+            self._dead_features += old_length - len(codes)
+        else:
+            # Does not fit in place: write at the end, the old codes become dead
+            start = len(self.feature_codes)
+            self.feature_codes.extend(codes)
+            self._dead_features += old_length
+        self.feature_starts[position] = start
+        self.feature_ends[position] = start + len(codes)
+        self._compact_features_if_needed()
+    
+    def pop(self):
+        """Remove the product at the last position."""
+        self._dead_features += self.feature_ends[-1] - self.feature_starts[-1]
+        for column in (self.product_ids, self.prices, self.ratings, self.category_codes,
+                       self.names, self.descriptions, self.feature_starts, self.feature_ends):
+            column.pop()
+        self._compact_features_if_needed()
+    
+    def make_writable(self):
+        """Copy read-only columns (e.g. from a snapshot) into mutable arrays."""
+        for name, typecode in self._ARRAY_COLUMNS:
+            column = getattr(self, name)
+            if not isinstance(column, array):
+                setattr(self, name, _to_array(typecode, column))
+        for name in ('names', 'descriptions'):
+            column = getattr(self, name)
+            if not isinstance(column, list):
+                setattr(self, name, list(column))
+    
+    def _compact_features_if_needed(self):
+        """Rewrite feature_codes without dead codes once they are the majority."""
+        if self._dead_features <= max(1024, len(self.feature_codes) // 2):
+            return
+        
+        codes = array('i')
+        for position in range(len(self)):
+            start = len(codes)
+            codes.extend(self.feature_codes[self.feature_starts[position]:self.feature_ends[position]])
+            self.feature_starts[position] = start
+            self.feature_ends[position] = len(codes)
+        self.feature_codes = codes
+        self._dead_features = 0
+    
+    def feature_code(self, feature: str) -> int:
+        """Get the code of a feature string, adding it to the vocabulary if new."""
+        code = self._feature_lookup.get(feature)
+        if code is None:
+            code = len(self.feature_vocabulary)
+            self.feature_vocabulary.append(feature)
+            self._feature_lookup[feature] = code
+        return code
+    
+    def features_at(self, position: int) -> List[str]:
+        """Get the feature strings of the product at a position."""
+        vocabulary = self.feature_vocabulary
+        start = self.feature_starts[position]
+        end = self.feature_ends[position]
+        return [vocabulary[code] for code in self.feature_codes[start:end]]
+    
+    def index_rows(self) -> Iterator[Tuple[int, Category, float, List[str]]]:
+        """Yield (product_id, category, price, features) without building Products."""
+        for position in range(len(self)):
+            yield (
+                self.product_ids[position],
+                CATEGORIES[self.category_codes[position]],
+                self.prices[position],
+                self.features_at(position)
+            )
+
+
+class ProductDatabase:
+    """
+    Manages the product catalog.
+    
+    Every change bumps ``version``. Changes made through upsert_products
+    and remove_products are also recorded in a change log, so derived
+    structures (ColumnarCatalog, RecommendationCache) can update only the
+    affected products instead of rebuilding.
+    """
+    
+    # Number of versions kept in the change log
+    CHANGE_LOG_SIZE = 256
+    
+    def __init__(
+        self,
+        products: Iterable[Product] = None,
+        compact: bool = False,
+        index: Dict = None
+    ):
+        """
+        Initialize the catalog.
+        
+        Args:
+            products: Products to load (default: the sample products); a
+                CompactProductStore is used as-is
+            compact: Keep products in a CompactProductStore instead of a list
+            index: Prebuilt indexes, as returned by export_index(), to use
+                instead of rebuilding them
+        """
+        if products is None:
+            products = self._create_sample_products()
+        
+        self._lock = ReadWriteLock()
+        self._change_log: "OrderedDict[int, Tuple[Set[int], List[Tuple[float, float]]]]" = OrderedDict()
+        
+        if isinstance(products, CompactProductStore):
+            self.products = products
+        elif compact:
+            self.products = CompactProductStore(products)
+        else:
+            self.products = list(products)
+        
+        if index is None:
+            self.rebuild_index()
+        else:
+            self._restore_index(index)
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_change_log'] = OrderedDict()
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = ReadWriteLock()
+    
+    def reading(self):
+        """
+        Context manager for reads that must see one consistent version.
+        
+        Updates wait until all readers are done, and readers never see a
+        batch of updates half applied.
+        """
+        return self._lock.reading()
+    
+    def _index_rows(self) -> Iterator[Tuple[int, Category, float, List[str]]]:
+        """Yield (product_id, category, price, features) for every position."""
+        if isinstance(self.products, CompactProductStore):
+            yield from self.products.index_rows()
+        else:
+            for product in self.products:
+                yield product.product_id, product.category, product.price, product.features
+    
+    def _remember_rows(self):
+        """
+        Record what was indexed at each position of a product list.
+        
+        List entries are the caller's objects and may be modified after
+        being added, so updates remove index entries using this copy,
+        kept as one list per IndexedRow field. A CompactProductStore owns
+        its columns and needs no copy.
+        """
+        if isinstance(self.products, CompactProductStore):
+            self._indexed_rows = None
+        else:
+            rows = [
+                (p.product_id, p.category, p.price, p.rating, tuple(p.features))
+                for p in self.products
+            ]
+            self._indexed_rows = tuple(list(column) for column in zip(*rows)) if rows else ([], [], [], [], [])
+    
+    def columns(self) -> Tuple[Sequence[int], Sequence[float], Sequence[float]]:
+        """
+        Get (product_ids, prices, ratings) indexed by position.
+        
+        For hot loops that filter many positions: reading a column does
+        not build a Product, which a CompactProductStore would do on every
+        access. The sequences are live; hold the read lock while using them.
+        """
+        if self._indexed_rows is None:
+            store = self.products
+            return store.product_ids, store.prices, store.ratings
+        product_ids, _, prices, ratings, _ = self._indexed_rows
+        return product_ids, prices, ratings
+    
+    def _indexed_row(self, position: int) -> "IndexedRow":
+        """What the indexes hold for the product at a position."""
+        if self._indexed_rows is not None:
+            return tuple(column[position] for column in self._indexed_rows)
+        store = self.products
+        return (
+            store.product_ids[position],
+            CATEGORIES[store.category_codes[position]],
+            store.prices[position],
+            store.ratings[position],
+            tuple(store.features_at(position))
+        )
+    
+    def fingerprint(self) -> str:
+        """
+        Hash of the catalog's contents, to identify it across processes.
+        
+        Covers the ID, category, price, rating and features of every
+        product, in position order. ``version`` restarts in every process,
+        so files derived from a catalog (e.g. segment tables) record this
+        instead. Costs one pass over the catalog, cached until it changes.
+        """
+        with self._lock.reading():
+            cached = getattr(self, '_fingerprint', None)
+            if cached is not None and cached[0] == self.version:
+                return cached[1]
+            digest = hashlib.blake2b(digest_size=16)
+            for position in range(len(self.products)):
+                product_id, category, price, rating, features = self._indexed_row(position)
+                row = (product_id, category.value, float(price), float(rating), tuple(features))
+                digest.update(repr(row).encode('utf-8'))
+            self._fingerprint = (self.version, digest.hexdigest())
+            return self._fingerprint[1]
+    
+    def rebuild_index(self):
+        """
+        Rebuild the lookup indexes used for candidate generation.
+        
+        Must be called after modifying ``self.products`` directly.
+        Indexes refer to products by their position in ``self.products``.
+        """
+        # Lets derived structures (e.g. ColumnarCatalog) detect staleness
+        self.version = getattr(self, 'version', 0) + 1
+        
+        # Postings are arrays of positions: 8 bytes per entry, no int objects
+        self._category_index: Dict[Category, array] = {}
+        self._feature_index: Dict[str, array] = {}
+        self._id_positions: Mapping[int, int] = {}
+        prices = array('d')
+        
+        for position, (product_id, category, price, features) in enumerate(self._index_rows()):
+            self._category_index.setdefault(category, array('q')).append(position)
+            for feature in set(features):
+                self._feature_index.setdefault(feature, array('q')).append(position)
+            self._id_positions[product_id] = position
+            prices.append(price)
+        
+        # Positions ordered by price, with a parallel array for bisection
+        self._price_order = array('q', sorted(range(len(prices)), key=prices.__getitem__))
+        self._sorted_prices = array('d', (prices[p] for p in self._price_order))
+        self._remember_rows()
+    
+    def export_index(self) -> Dict:
+        """
+        Get the index structures, e.g. to persist them in a snapshot.
+        
+        Returns:
+            Dictionary accepted by the ``index`` argument of the constructor
+        """
+        return {
+            'category': self._category_index,
+            'feature': self._feature_index,
+            'id_positions': self._id_positions,
+            'price_order': self._price_order,
+            'sorted_prices': self._sorted_prices,
+        }
+    
+    def _restore_index(self, index: Dict):
+        """Adopt prebuilt index structures instead of rebuilding them."""
+        self.version = getattr(self, 'version', 0) + 1
+        self._category_index = index['category']
+        self._feature_index = index['feature']
+        self._id_positions = index['id_positions']
+        self._price_order = index['price_order']
+        self._sorted_prices = index['sorted_prices']
+        self._remember_rows()
+    
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+    
+    def upsert_products(self, products: Iterable[Product]) -> Dict[str, int]:
+        """
+        Add new products and replace existing ones with the same ID.
+        
+        Indexes are updated in place, so the cost grows with the size of
+        the batch rather than the catalog. The batch is validated and
+        prepared before the write lock is taken, then applied as one
+        version; an invalid product leaves the database unchanged.
+        
+        Args:
+            products: Products to add or replace (the last one wins when
+                an ID appears twice)
+            
+        Returns:
+            Dictionary with the number of products added and updated
+            
+        Raises:
+            ValueError: If a product has an invalid category, price,
+                rating or feature list
+        """
+        batch = {product.product_id: product for product in products}
+        rows = [(product, _indexed_row(product)) for product in batch.values()]
+        added = updated = 0
+        positions = set()
+        states = []
+        
+        with self._lock.writing():
+            self._make_writable()
+            
+            for product, row in rows:
+                position = self._id_positions.get(row[0])
+                if position is None:
+                    position = len(self.products)
+                    self.products.append(product)
+                    if self._indexed_rows is not None:
+                        for column, value in zip(self._indexed_rows, row):
+                            column.append(value)
+                    added += 1
+                else:
+                    old = self._indexed_row(position)
+                    states.append(old[2:4])
+                    self._index_remove(position, old)
+                    self._set_product(position, product, row)
+                    updated += 1
+                
+                self._index_add(position, row)
+                states.append(row[2:4])
+                positions.add(position)
+            
+            if positions:
+                self._log_change(positions, states)
+        
+        return {'added': added, 'updated': updated}
+    
+    def remove_products(self, product_ids: Iterable[int]) -> int:
+        """
+        Remove products by ID.
+        
+        The last product moves into each freed position, so removal costs
+        the same wherever the product sits in the catalog. This reorders
+        the catalog: get_all_products() and the tie-breaking between equal
+        scores (the earlier position wins) can then differ from a catalog
+        built without the removed products.
+        
+        Args:
+            product_ids: IDs to remove; unknown IDs are ignored
+            
+        Returns:
+            Number of products removed
+        """
+        removed = 0
+        positions = set()
+        states = []
+        
+        with self._lock.writing():
+            self._make_writable()
+            
+            for product_id in set(product_ids):
+                position = self._id_positions.get(product_id)
+                if position is None:
+                    continue
+                
+                old = self._indexed_row(position)
+                states.append(old[2:4])
+                self._index_remove(position, old)
+                
+                last = len(self.products) - 1
+                if position != last:
+                    moved = self._indexed_row(last)
+                    self._index_remove(last, moved)
+                    self._set_product(position, self.products[last], moved)
+                    self._index_add(position, moved)
+                    states.append(moved[2:4])
+                
+                self.products.pop()
+                if self._indexed_rows is not None:
+                    for column in self._indexed_rows:
+                        column.pop()
+                positions.update((position, last))
+                removed += 1
+            
+            if positions:
+                self._log_change(positions, states)
+        
+        return removed
+    
+    def changes_since(self, version: int) -> Optional[Tuple[Set[int], List[Tuple[float, float]]]]:
+        """
+        Describe what changed after a given version.
+        
+        Args:
+            version: Version the caller is up to date with
+            
+        Returns:
+            Tuple of (positions whose product changed or disappeared,
+            (price, rating) of every affected product before and after the
+            change), or None if the change log cannot tell (e.g. after
+            rebuild_index) and the caller must rebuild
+        """
+        positions = set()
+        states = []
+        for changed_version in range(version + 1, self.version + 1):
+            change = self._change_log.get(changed_version)
+            if change is None:
+                return None
+            positions.update(change[0])
+            states.extend(change[1])
+        return positions, states
+    
+    def _log_change(self, positions: Set[int], states: List[Tuple[float, float]]):
+        """Bump the version and record what changed."""
+        self.version += 1
+        self._change_log[self.version] = (positions, states)
+        while len(self._change_log) > self.CHANGE_LOG_SIZE:
+            self._change_log.popitem(last=False)
+    
+    def _set_product(self, position: int, product: Product, row: "IndexedRow"):
+        """Store a product, indexed as row, at an existing position."""
+        if isinstance(self.products, CompactProductStore):
+            self.products.replace(position, product)
+        else:
+            self.products[position] = product
+            for column, value in zip(self._indexed_rows, row):
+                column[position] = value
+    
+    def _index_add(self, position: int, row: "IndexedRow"):
+        """Add a product's indexed row at a position to every index."""
+        product_id, category, price, _, features = row
+        self._category_index.setdefault(category, array('q')).append(position)
+        for feature in set(features):
+            self._feature_index.setdefault(feature, array('q')).append(position)
+        self._id_positions[product_id] = position
+        
+        slot = bisect_right(self._sorted_prices, price)
+        self._sorted_prices.insert(slot, price)
+        self._price_order.insert(slot, position)
+    
+    def _index_remove(self, position: int, row: "IndexedRow"):
+        """Remove the indexed row at a position from every index."""
+        product_id, category, price, _, features = row
+        self._remove_posting(self._category_index, category, position)
+        for feature in set(features):
+            self._remove_posting(self._feature_index, feature, position)
+        if self._id_positions.get(product_id) == position:
+            del self._id_positions[product_id]
+        
+        start = bisect_left(self._sorted_prices, price)
+        end = bisect_right(self._sorted_prices, price)
+        slot = start + self._price_order[start:end].index(position)
+        del self._sorted_prices[slot]
+        del self._price_order[slot]
+    
+    @staticmethod
+    def _remove_posting(index: Dict, key, position: int):
+        """Remove a position from a posting array, dropping it when empty."""
+        posting = index[key]
+        posting.remove(position)
+        if not posting:
+            del index[key]
+    
+    def _make_writable(self):
+        """Copy read-only structures (e.g. from a snapshot) into mutable ones."""
+        if isinstance(self.products, CompactProductStore):
+            self.products.make_writable()
+        if not isinstance(self._id_positions, dict):
+            self._id_positions = dict(self._id_positions.items())
+        if not isinstance(self._price_order, array):
+            self._price_order = _to_array('q', self._price_order)
+            self._sorted_prices = _to_array('d', self._sorted_prices)
+        for index in (self._category_index, self._feature_index):
+            for key, posting in index.items():
+                if not isinstance(posting, array):
+                    index[key] = _to_array('q', posting)
     
     def _create_sample_products(self) -> List[Product]:
         """Create a sample product database."""
@@ -265,142 +1030,2306 @@ class ProductDatabase:
             ),
         ]
     
-    def get_product(self, product_id: int) -> Product:
+    def get_product(self, product_id: int) -> Optional[Product]:
         """Get a product by ID."""
-        for product in self.products:
-            if product.product_id == product_id:
-                return product
-        return None
+        position = self._id_positions.get(product_id)
+        if position is None:
+            return None
+        return self.products[position]
+    
+    def get_products(self, product_ids: Iterable[int]) -> List[Product]:
+        """
+        Get several products by ID.
+        
+        Args:
+            product_ids: IDs to look up
+            
+        Returns:
+            Products in the order requested; unknown IDs are skipped
+        """
+        return [self.products[p] for p in self.positions_of(product_ids)]
+    
+    def positions_of(self, product_ids: Iterable[int]) -> List[int]:
+        """
+        Get the catalog positions of products by ID.
+        
+        Args:
+            product_ids: IDs to look up
+            
+        Returns:
+            Positions in the order requested; unknown IDs are skipped
+        """
+        id_positions = self._id_positions
+        return [id_positions[i] for i in product_ids if i in id_positions]
     
-    def get_all_products(self) -> List[Product]:
+    def get_all_products(self) -> Sequence[Product]:
         """Get all products."""
         return self.products
     
     def get_products_by_category(self, category: Category) -> List[Product]:
         """Get products in a specific category."""
-        return [p for p in self.products if p.category == category]
-
-
-# ============================================================================
-# RECOMMENDATION ENGINE
-# ============================================================================
-
-class RecommendationEngine:
-    """Generates explainable product recommendations."""
+        return [self.products[p] for p in self._category_index.get(category, ())]
     
-    def __init__(self, database: ProductDatabase):
-        """Initialize the recommendation engine."""
-        self.database = database
+    def get_product_ids_with_feature(self, feature: str) -> Set[int]:
+        """Get the IDs of all products that have a feature."""
+        product_ids = self.columns()[0]
+        return {product_ids[p] for p in self._feature_index.get(feature, ())}
     
-    def recommend_products(
-        self,
-        user: UserPreference,
-        num_recommendations: int = 5
-    ) -> List[Recommendation]:
+    def positions_in_price_range(self, price_min: float, price_max: float) -> Sequence[int]:
         """
-        Generate product recommendations with explanations.
+        Get positions of products priced within an inclusive range.
         
         Args:
-            user: User preferences and constraints
-            num_recommendations: Number of products to recommend
+            price_min: Lowest accepted price
+            price_max: Highest accepted price
             
         Returns:
-            List of recommendations sorted by match score (highest first)
+            Product positions ordered by price
         """
-        
-        recommendations = []
-        
-        # Get all products excluding already purchased
-        available_products = [
-            p for p in self.database.get_all_products()
-            if p.product_id not in user.purchase_history
-        ]
-        
-        # Calculate match score for each product
-        for product in available_products:
-            match_score, reasons, matching_features = self._calculate_match_score(
-                product, user
-            )
-            
-            # Only include products that meet minimum criteria
-            if match_score > 0:
-                recommendation = Recommendation(
-                    product=product,
-                    match_score=match_score,
-                    reasons=reasons,
-                    matching_features=matching_features
-                )
-                recommendations.append(recommendation)
-        
-        # Sort by match score (highest first)
-        recommendations.sort(key=lambda r: r.match_score, reverse=True)
-        
-        # Return top N recommendations
-        return recommendations[:num_recommendations]
+        start = bisect_left(self._sorted_prices, price_min)
+        end = bisect_right(self._sorted_prices, price_max)
+        return self._price_order[start:end]
     
-    def _calculate_match_score(
+    def positions_related_to(
         self,
-        product: Product,
-        user: UserPreference
-    ) -> Tuple[float, List[str], List[str]]:
+        categories: List[Category],
+        features: List[str]
+    ) -> Set[int]:
         """
-        Calculate how well a product matches user preferences.
+        Get positions of products sharing a category or feature.
         
         Args:
-            product: Product to evaluate
-            user: User preferences
+            categories: Categories to match
+            features: Feature strings to match
             
         Returns:
-            Tuple of (match_score, reasons, matching_features)
+            Set of product positions
         """
+        related = set()
+        for category in set(categories):
+            related.update(self._category_index.get(category, ()))
+        for feature in set(features):
+            related.update(self._feature_index.get(feature, ()))
+        return related
+
+
+# ============================================================================
+# TOP-K SELECTION
+# ============================================================================
+
+class TopKSelector:
+    """
+    Streaming selection of the K highest-scoring products.
+    
+    Keeps a bounded min-heap of (score, -position) entries, so pushing n
+    products costs O(n log k). Equal scores are ranked by catalog position,
+    exactly like a stable sort by descending score.
+    """
+    
+    def __init__(self, k: int):
+        """
+        Initialize the selector.
         
-        score = 0.0
-        max_score = 0.0
-        reasons = []
-        matching_features = []
-        
-        # ===== CATEGORY MATCHING (20 points max) =====
-        max_score += 20
-        if product.category in user.preferred_categories:
-            score += 20
-            reasons.append(f"Matches preferred category: {product.category.value}")
-        else:
-            reasons.append(f"Category: {product.category.value} (not in preferred list)")
-        
-        # ===== BUDGET MATCHING (20 points max) =====
-        max_score += 20
-        if user.budget_min <= product.price <= user.budget_max:
-            score += 20
-            reasons.append(f"Within budget range (${user.budget_min:.2f}-${user.budget_max:.2f})")
-        else:
-            reasons.append(f"Price ${product.price:.2f} is outside budget range")
-            return 0, reasons, matching_features  # Skip if outside budget
-        
-        # ===== RATING MATCHING (15 points max) =====
-        max_score += 15
-        if product.rating >= user.minimum_rating:
-            # Award points based on how much above minimum
-            rating_bonus = (product.rating - user.minimum_rating) / (5 - user.minimum_rating)
-            score += 15 * rating_bonus
-            reasons.append(f"Good rating: {product.rating}/5 (minimum: {user.minimum_rating}/5)")
-        else:
-            return 0, reasons, matching_features  # Skip if below minimum rating
+        Args:
+            k: Number of products to keep
+        """
+        self.k = k
+        self._heap: List[Tuple[float, int]] = []
+    
+    def __len__(self) -> int:
+        return len(self._heap)
+    
+    def push(self, score: float, position: int):
+        """Offer a product; it is kept only if it ranks in the top K."""
+        entry = (score, -position)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+    
+    def is_full(self) -> bool:
+        """Check whether K products have been kept."""
+        return len(self._heap) >= self.k
+    
+    def weakest_score(self) -> float:
+        """Get the lowest score currently kept."""
+        return self._heap[0][0]
+    
+    def results(self) -> List[Tuple[float, int]]:
+        """
+        Get the kept products, best first.
         
-        # ===== FEATURE MATCHING (45 points max) =====
-        max_score += 45
-        feature_match_count = 0
-        for feature in product.features:
-            if feature in user.preferred_features:
+        Returns:
+            List of (score, position) tuples
+        """
+        return [(score, -negated) for score, negated in sorted(self._heap, reverse=True)]
+
+
+# ============================================================================
+# SCORING PROFILES
+# ============================================================================
+
+_NUMERIC_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# Field -> operators it supports
+_CONDITION_OPERATORS = {
+    'price': tuple(_NUMERIC_OPERATORS),
+    'rating': tuple(_NUMERIC_OPERATORS),
+    'product_id': tuple(_NUMERIC_OPERATORS) + ('in', 'not in'),
+    'category': ('in', 'not in'),
+    'feature': ('has', 'lacks'),
+}
+
+_CATEGORY_BY_TEXT = {category.value: category for category in Category}
+_CATEGORY_BY_TEXT.update({category.name: category for category in Category})
+
+
+@dataclass(frozen=True, slots=True)
+class Condition:
+    """
+    A test on one product field, e.g. ``Condition('price', '<=', 100)``.
+    
+    Fields and operators:
+        price, rating: <, <=, >, >=, ==, !=  (value: number)
+        product_id: the same, or in / not in  (value: list of IDs)
+        category: in / not in  (value: list of category values or names)
+        feature: has / lacks  (value: feature or list; "has" means any)
+    """
+    field: str
+    op: str
+    value: Any
+    
+    def __post_init__(self):
+        operators = _CONDITION_OPERATORS.get(self.field)
+        if operators is None:
+            raise ValueError(f"Unknown field '{self.field}', expected one of {list(_CONDITION_OPERATORS)}")
+        if self.op not in operators:
+            raise ValueError(f"Field '{self.field}' supports {list(operators)}, not '{self.op}'")
+    
+    def __str__(self):
+        return f"{self.field} {self.op} {self.value}"
+    
+    def _values(self) -> frozenset:
+        """The value as a set, with categories resolved to Category members."""
+        values = self.value if isinstance(self.value, (list, tuple, set, frozenset)) else [self.value]
+        if self.field != 'category':
+            return frozenset(values)
+        
+        categories = set()
+        for value in values:
+            category = value if isinstance(value, Category) else _CATEGORY_BY_TEXT.get(value)
+            if category is None:
+                raise ValueError(f"Unknown category '{value}'")
+            categories.add(category)
+        return frozenset(categories)
+    
+    def compile(self) -> Callable[[Product], bool]:
+        """Build a function testing the condition on one product."""
+        if self.op in _NUMERIC_OPERATORS:
+            compare = _NUMERIC_OPERATORS[self.op]
+            value = self.value
+            if self.field == 'price':
+                return lambda product: compare(product.price, value)
+            if self.field == 'rating':
+                return lambda product: compare(product.rating, value)
+            return lambda product: compare(product.product_id, value)
+        
+        values = self._values()
+        if self.field == 'feature':
+            if self.op == 'has':
+                return lambda product: not values.isdisjoint(product.features)
+            return lambda product: values.isdisjoint(product.features)
+        if self.field == 'category':
+            if self.op == 'in':
+                return lambda product: product.category in values
+            return lambda product: product.category not in values
+        if self.op == 'in':
+            return lambda product: product.product_id in values
+        return lambda product: product.product_id not in values
+    
+    def mask(self, catalog: "ColumnarCatalog") -> "np.ndarray":
+        """Evaluate the condition for every product of a columnar catalog."""
+        size = catalog.size
+        if self.op in _NUMERIC_OPERATORS:
+            column = {
+                'price': catalog.prices,
+                'rating': catalog.ratings,
+                'product_id': catalog.product_ids,
+            }[self.field][:size]
+            return _NUMERIC_OPERATORS[self.op](column, self.value)
+        
+        values = self._values()
+        if self.field == 'feature':
+            wanted = [catalog.feature_vocabulary[f] for f in values if f in catalog.feature_vocabulary]
+            found = np.zeros(size, dtype=bool)
+            hits = np.isin(catalog.feature_codes[:catalog.feature_count], wanted)
+            found[catalog.feature_rows[:catalog.feature_count][hits]] = True
+            return found if self.op == 'has' else ~found
+        if self.field == 'category':
+            found = np.isin(catalog.category_codes[:size], [CATEGORY_CODES[c] for c in values])
+        else:
+            found = np.isin(catalog.product_ids[:size], list(values))
+        return found if self.op == 'in' else ~found
+    
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "Condition":
+        """Create a condition from ``{"field": ..., "op": ..., "value": ...}``."""
+        try:
+            return cls(data['field'], data['op'], data['value'])
+        except KeyError as e:
+            raise ValueError(f"Condition is missing {e}") from None
+
+
+@dataclass(frozen=True, slots=True)
+class BonusRule:
+    """Extra points for products meeting a condition, with the reason shown."""
+    condition: Condition
+    points: float
+    reason: str
+    
+    def __post_init__(self):
+        if self.points < 0:
+            raise ValueError("Bonus points cannot be negative")
+    
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "BonusRule":
+        """Create a rule from ``{"if": {condition}, "points": ..., "reason": ...}``."""
+        try:
+            return cls(
+                Condition.from_dict(data['if']),
+                float(data['points']),
+                str(data.get('reason') or data['if'])
+            )
+        except KeyError as e:
+            raise ValueError(f"Bonus rule is missing {e}") from None
+
+
+@dataclass(frozen=True, slots=True)
+class ScoringProfile:
+    """
+    Declarative scoring configuration.
+    
+    Weights are the points of the four standard components. Hard filters
+    exclude products (on top of the user's budget and minimum rating) and
+    bonus rules add points. The score is the share of all available points,
+    as a percentage. The default profile reproduces the built-in scores.
+    
+    A profile is compiled once into a scoring function (compile()) and, for
+    the NumPy backend, into array masks (ColumnarCatalog.score).
+    """
+    name: str = "default"
+    category_weight: float = 20.0
+    budget_weight: float = 20.0
+    rating_weight: float = 15.0
+    feature_weight: float = 45.0
+    filters: Tuple[Condition, ...] = ()
+    bonuses: Tuple[BonusRule, ...] = ()
+    
+    def __post_init__(self):
+        if min(self.category_weight, self.budget_weight, self.rating_weight, self.feature_weight) < 0:
+            raise ValueError("Weights cannot be negative")
+        if self.total_points <= 0:
+            raise ValueError("A profile must award some points")
+        # Accept lists (e.g. from JSON) while keeping the profile hashable
+        object.__setattr__(self, 'filters', tuple(self.filters))
+        object.__setattr__(self, 'bonuses', tuple(self.bonuses))
+    
+    @property
+    def total_points(self) -> float:
+        """Most points a product can earn; scores are a share of this."""
+        total = 0.0
+        for points in (self.category_weight, self.budget_weight, self.rating_weight, self.feature_weight):
+            total += points
+        for bonus in self.bonuses:
+            total += bonus.points
+        return total
+    
+    @property
+    def unmatched_ceiling(self) -> float:
+        """Highest score of a product sharing no category or feature with the user."""
+        points = self.budget_weight + self.rating_weight + sum(bonus.points for bonus in self.bonuses)
+        return points / self.total_points * 100
+    
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "ScoringProfile":
+        """
+        Create a profile from a JSON-style dictionary.
+        
+        Example:
+            {"name": "clearance", "weights": {"category": 10, "features": 55},
+             "filters": [{"field": "rating", "op": ">=", "value": 3.5}],
+             "bonuses": [{"if": {"field": "price", "op": "<", "value": 25},
+                          "points": 10, "reason": "Under $25"}]}
+        
+        Raises:
+            ValueError: If a rule or weight is invalid
+        """
+        weights = dict(data.get('weights') or {})
+        unknown = set(weights) - {'category', 'budget', 'rating', 'features'}
+        if unknown:
+            raise ValueError(f"Unknown weights {sorted(unknown)}")
+        
+        return cls(
+            name=str(data.get('name', 'custom')),
+            category_weight=float(weights.get('category', 20.0)),
+            budget_weight=float(weights.get('budget', 20.0)),
+            rating_weight=float(weights.get('rating', 15.0)),
+            feature_weight=float(weights.get('features', 45.0)),
+            filters=tuple(Condition.from_dict(rule) for rule in data.get('filters') or ()),
+            bonuses=tuple(BonusRule.from_dict(rule) for rule in data.get('bonuses') or ())
+        )
+    
+    def compile(self) -> Callable[[Product, UserPreference, Set[Category], Set[str]], float]:
+        """
+        Build the scoring function for the hot path.
+        
+        Weights and rules are bound once, so scoring a product runs no
+        profile lookups; the result equals the match score computed with
+        reasons, without building any.
+        
+        Returns:
+            Function (product, user, preferred categories as a set,
+            preferred features as a set) -> match score, 0 if filtered out
+        """
+        category_weight = self.category_weight
+        budget_weight = self.budget_weight
+        rating_weight = self.rating_weight
+        feature_weight = self.feature_weight
+        total = self.total_points
+        filters = tuple(condition.compile() for condition in self.filters)
+        bonuses = tuple((bonus.points, bonus.condition.compile()) for bonus in self.bonuses)
+        
+        def score_product(product, user, categories, features):
+            for passes in filters:
+                if not passes(product):
+                    return 0
+            
+            score = 0.0
+            
+            if product.category in categories:
+                score += category_weight
+            
+            if not user.budget_min <= product.price <= user.budget_max:
+                return 0
+            score += budget_weight
+            
+            if product.rating < user.minimum_rating:
+                return 0
+            rating_bonus = (product.rating - user.minimum_rating) / (5 - user.minimum_rating)
+            score += rating_weight * rating_bonus
+            
+            feature_match_count = sum(1 for feature in product.features if feature in features)
+            if feature_match_count > 0:
+                score += (feature_match_count / max(len(user.preferred_features), 1)) * feature_weight
+            
+            for points, applies in bonuses:
+                if applies(product):
+                    score += points
+            
+            return (score / total) * 100
+        
+        return score_product
+
+
+DEFAULT_PROFILE = ScoringProfile()
+
+
+# ============================================================================
+# COLUMNAR CATALOG (NumPy backend)
+# ============================================================================
+
+class ColumnarCatalog:
+    """
+    Column-oriented copy of a ProductDatabase for batched scoring.
+    
+    Prices, ratings and category codes are NumPy arrays indexed by product
+    position. Product features form a sparse bitmap of (row, code) pairs:
+    entry j says the product at ``feature_rows[j]`` has feature
+    ``feature_codes[j]``; a row's entries are contiguous, from
+    ``row_starts[i]`` to ``row_ends[i]``. Arrays keep spare capacity so
+    catalog updates are applied in place by sync(); replaced entries get
+    code -1 and never match.
+    """
+    
+    _ROW_COLUMNS = ('product_ids', 'prices', 'ratings', 'category_codes', 'row_starts', 'row_ends')
+    _FEATURE_COLUMNS = ('feature_codes', 'feature_rows')
+    
+    def __init__(self, database: ProductDatabase):
+        """
+        Build the columns from a product database.
+        
+        Args:
+            database: Catalog to convert
+        """
+        if np is None:
+            raise ImportError("The columnar backend requires NumPy (pip install numpy).")
+        
+        products = database.get_all_products()
+        self.database = database
+        self.version = database.version
+        
+        if isinstance(products, CompactProductStore):
+            # Columns already exist; copy them instead of materializing Products
+            self.product_ids = np.array(products.product_ids, dtype=np.int64)
+            self.prices = np.array(products.prices, dtype=np.float64)
+            self.ratings = np.array(products.ratings, dtype=np.float64)
+            self.category_codes = np.array(products.category_codes, dtype=np.int8)
+            self.feature_vocabulary = dict(products._feature_lookup)
+            
+            store_starts = np.array(products.feature_starts, dtype=np.int64)
+            lengths = np.array(products.feature_ends, dtype=np.int64) - store_starts
+            self.row_starts = np.cumsum(lengths) - lengths
+            entries = np.repeat(store_starts - self.row_starts, lengths) + np.arange(lengths.sum())
+            self.feature_codes = np.array(products.feature_codes, dtype=np.int32)[entries]
+        else:
+            self.product_ids = np.array([p.product_id for p in products], dtype=np.int64)
+            self.prices = np.array([p.price for p in products], dtype=np.float64)
+            self.ratings = np.array([p.rating for p in products], dtype=np.float64)
+            self.category_codes = np.array(
+                [CATEGORY_CODES[p.category] for p in products], dtype=np.int8
+            )
+            
+            self.feature_vocabulary: Dict[str, int] = {}
+            codes = []
+            for product in products:
+                for feature in product.features:
+                    codes.append(
+                        self.feature_vocabulary.setdefault(feature, len(self.feature_vocabulary))
+                    )
+            
+            lengths = np.array([len(p.features) for p in products], dtype=np.int64)
+            self.row_starts = np.cumsum(lengths) - lengths
+            self.feature_codes = np.array(codes, dtype=np.int32)
+        
+        self.row_ends = self.row_starts + lengths
+        self.feature_rows = np.repeat(np.arange(len(products), dtype=np.int64), lengths)
+        self.size = len(products)
+        self.feature_count = len(self.feature_codes)
+        self.dead_features = 0
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def sync(self, database: ProductDatabase) -> bool:
+        """
+        Apply the database changes made since this catalog was built.
+        
+        Only rows whose product changed are rewritten.
+        
+        Args:
+            database: The database this catalog was built from
+            
+        Returns:
+            True if the catalog is up to date; False if it must be rebuilt
+            (changes unknown, or too many dead feature entries)
+        """
+        if database.version == self.version:
+            return True
+        
+        changes = database.changes_since(self.version)
+        if changes is None:
+            return False
+        
+        products = database.get_all_products()
+        new_size = len(products)
+        self._reserve(self._ROW_COLUMNS, new_size)
+        
+        for position in sorted(changes[0]):
+            if position < self.size:
+                self._clear_features(position)
+            if position < new_size:
+                self._write_row(position, products[position])
+        
+        self.size = new_size
+        self.version = database.version
+        return self.dead_features <= max(1024, self.feature_count // 2)
+    
+    def _clear_features(self, position: int):
+        """Retire the feature entries of a row."""
+        start, end = self.row_starts[position], self.row_ends[position]
+        self.feature_codes[start:end] = -1
+        self.dead_features += int(end - start)
+        self.row_ends[position] = start
+    
+    def _write_row(self, position: int, product: Product):
+        """Store a product's columns and append its feature entries."""
+        self.product_ids[position] = product.product_id
+        self.prices[position] = product.price
+        self.ratings[position] = product.rating
+        self.category_codes[position] = CATEGORY_CODES[product.category]
+        
+        codes = [
+            self.feature_vocabulary.setdefault(f, len(self.feature_vocabulary))
+            for f in product.features
+        ]
+        start = self.feature_count
+        end = start + len(codes)
+        self._reserve(self._FEATURE_COLUMNS, end)
+        self.feature_codes[start:end] = codes
+        self.feature_rows[start:end] = position
+        self.row_starts[position] = start
+        self.row_ends[position] = end
+        self.feature_count = end
+    
+    def _reserve(self, names: Tuple[str, ...], needed: int):
+        """Grow the named arrays (doubling) to hold at least ``needed`` items."""
+        for name in names:
+            column = getattr(self, name)
+            if len(column) < needed:
+                grown = np.zeros(max(needed, 2 * len(column), 16), dtype=column.dtype)
+                grown[:len(column)] = column
+                setattr(self, name, grown)
+    
+    def score(
+        self,
+        user: UserPreference,
+        exclude_purchased: bool = True,
+        profile: ScoringProfile = DEFAULT_PROFILE,
+        counts: Dict[str, int] = None
+    ) -> "np.ndarray":
+        """
+        Compute the match score of every product for a user.
+        
+        Performs the same floating point operations, in the same order,
+        as RecommendationEngine._calculate_match_score so scores are
+        bit-for-bit identical.
+        
+        Args:
+            user: User preferences
+            exclude_purchased: Give purchased products a score of 0
+            profile: Weights and rules; filters and bonuses become masks
+            counts: When given, candidate counts after each filter are
+                added to it (for instrumentation)
+            
+        Returns:
+            Array of match scores by position; 0 for excluded products
+        """
+        size = self.size
+        prices = self.prices[:size]
+        ratings = self.ratings[:size]
+        
+        # ===== HARD FILTERS: budget, rating, purchase history =====
+        eligible = (prices >= user.budget_min) & (prices <= user.budget_max)
+        if counts is not None:
+            counts['catalog'] = counts.get('catalog', 0) + size
+            counts['budget'] = counts.get('budget', 0) + int(eligible.sum())
+        eligible &= ratings >= user.minimum_rating
+        if counts is not None:
+            counts['rating'] = counts.get('rating', 0) + int(eligible.sum())
+        if exclude_purchased and user.purchase_history:
+            # Clear the purchased bits: O(history), independent of catalog size
+            eligible[self.database.positions_of(set(user.purchase_history))] = False
+        if counts is not None:
+            counts['purchase_history'] = counts.get('purchase_history', 0) + int(eligible.sum())
+        for condition in profile.filters:
+            eligible &= condition.mask(self)
+        
+        # ===== CATEGORY MATCHING =====
+        preferred_codes = [CATEGORY_CODES[c] for c in set(user.preferred_categories)]
+        score = np.where(
+            np.isin(self.category_codes[:size], preferred_codes), float(profile.category_weight), 0.0
+        )
+        
+        # ===== BUDGET MATCHING =====
+        score += profile.budget_weight
+        
+        # ===== RATING MATCHING =====
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rating_bonus = (ratings - user.minimum_rating) / (5 - user.minimum_rating)
+        score += profile.rating_weight * rating_bonus
+        
+        # ===== FEATURE MATCHING =====
+        wanted = [
+            self.feature_vocabulary[f] for f in set(user.preferred_features)
+            if f in self.feature_vocabulary
+        ]
+        if wanted:
+            hits = np.isin(self.feature_codes[:self.feature_count], wanted)
+            match_counts = np.bincount(self.feature_rows[:self.feature_count][hits], minlength=size)
+            feature_score = (match_counts / max(len(user.preferred_features), 1)) * profile.feature_weight
+            score += np.where(match_counts > 0, feature_score, 0.0)
+        
+        # ===== BONUS RULES =====
+        for bonus in profile.bonuses:
+            score += np.where(bonus.condition.mask(self), bonus.points, 0.0)
+        
+        # ===== NORMALIZE TO PERCENTAGE =====
+        match_percentage = (score / profile.total_points) * 100
+        return np.where(eligible & (match_percentage > 0), match_percentage, 0.0)
+    
+    @staticmethod
+    def top_positions(scores: "np.ndarray", k: int) -> List[int]:
+        """
+        Select the positions of the K best positive scores.
+        
+        Uses a partial select instead of sorting the whole catalog. Ties
+        are ranked by position, matching a stable sort.
+        
+        Args:
+            scores: Match scores by position
+            k: Number of positions to return
+            
+        Returns:
+            Positions ordered by descending score
+        """
+        positions = np.flatnonzero(scores > 0)
+        
+        if len(positions) > k:
+            candidate_scores = scores[positions]
+            kth_score = np.partition(candidate_scores, len(positions) - k)[len(positions) - k]
+            above = positions[candidate_scores > kth_score]
+            tied = positions[candidate_scores == kth_score][:k - len(above)]
+            positions = np.sort(np.concatenate([above, tied]))
+        
+        ranked = positions[np.argsort(-scores[positions], kind='stable')]
+        return [int(position) for position in ranked]
+
+
+# ============================================================================
+# RESULT CACHE
+# ============================================================================
+
+class RecommendationCache:
+    """
+    LRU/TTL cache of product rankings keyed by preference fingerprint.
+    
+    Only the fields that affect scoring (categories, budget, features and
+    minimum rating) go into the key, so users with the same profile share
+    entries. sync() keeps the cache in step with the database: after an
+    incremental update only entries whose budget and rating filters admit
+    a changed product are dropped; otherwise the cache is cleared.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = None):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_entries: Entries kept before the least recently used is evicted
+            ttl_seconds: Lifetime of an entry (None = no expiry)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # key -> (expires_at, positions, complete, (budget_min, budget_max, minimum_rating))
+        self._entries: "OrderedDict[str, Tuple]" = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+    
+    def __getstate__(self):
+        # Worker processes get an empty cache with the same settings
+        return {'max_entries': self.max_entries, 'ttl_seconds': self.ttl_seconds}
+    
+    def __setstate__(self, state):
+        self.__init__(**state)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @staticmethod
+    def fingerprint(user: UserPreference) -> str:
+        """
+        Build a canonical hash of the scoring-relevant preference fields.
+        
+        Args:
+            user: User preferences
+            
+        Returns:
+            Hex digest identifying the preference profile
+        """
+        canonical = json.dumps([
+            sorted({category.value for category in user.preferred_categories}),
+            float(user.budget_min),
+            float(user.budget_max),
+            # Duplicates change the feature score, so they are kept
+            sorted(user.preferred_features),
+            float(user.minimum_rating),
+        ])
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    def sync(self, database: ProductDatabase):
+        """
+        Drop the entries that database changes since the last sync affect.
+        
+        A ranking can only change if a changed product passes its budget
+        and rating filters, before or after the change.
+        
+        Args:
+            database: The database the cached rankings come from
+        """
+        with self._lock:
+            if self._version == database.version:
+                return
+            
+            changes = None
+            if self._version is not None:
+                changes = database.changes_since(self._version)
+            
+            if changes is None:
+                self._entries.clear()
+            else:
+                states = changes[1]
+                stale = [
+                    key for key, (_, _, _, (low, high, min_rating)) in self._entries.items()
+                    if any(low <= price <= high and rating >= min_rating for price, rating in states)
+                ]
+                for key in stale:
+                    del self._entries[key]
+            
+            self._version = database.version
+    
+    def get(self, key: str, version: int):
+        """
+        Look up a ranking.
+        
+        Args:
+            key: Preference fingerprint
+            version: Current database version
+            
+        Returns:
+            Tuple of (positions, complete) or None on a miss
+        """
+        with self._lock:
+            if version != self._version:
+                # Not synced with this version: nothing cached is trustworthy
+                self._entries.clear()
+                self._version = version
+            
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+    
+    def put(
+        self,
+        key: str,
+        version: int,
+        positions: List[int],
+        complete: bool,
+        user: UserPreference
+    ):
+        """
+        Store a ranking.
+        
+        Args:
+            key: Preference fingerprint
+            version: Database version the ranking was computed for
+            positions: Ranked product positions
+            complete: True if the ranking holds every positive-scoring product
+            user: Preferences the ranking was computed for
+        """
+        if self.ttl_seconds is None:
+            expires_at = float('inf')
+        else:
+            expires_at = time.monotonic() + self.ttl_seconds
+        
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            
+            filters = (user.budget_min, user.budget_max, user.minimum_rating)
+            self._entries[key] = (expires_at, positions, complete, filters)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        Get cache statistics.
+        
+        Returns:
+            Dictionary with hits, misses, hit_rate and size
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._entries),
+        }
+
+# ============================================================================
+# APPROXIMATE FEATURE RETRIEVAL
+# ============================================================================
+
+class FeatureLSHIndex:
+    """
+    MinHash LSH index over hashed product feature sets.
+    
+    Each product is a sparse binary vector: its features hashed (CRC-32)
+    into a 32-bit space. ``bands * rows`` MinHash functions summarize the
+    vector; the signature is cut into bands and every band is a bucket key,
+    so products whose feature sets overlap strongly with the user's share
+    buckets with high probability. query() looks only at the user's
+    buckets, so its cost depends on bucket sizes, not catalog size.
+    
+    Candidates are ranked by the number of buckets they share with the
+    user (an estimate of feature-set similarity); the engine then filters
+    and scores them exactly, so final scores and reasons are unchanged.
+    """
+    
+    # Universal hashing (a * x + b) mod p with a Mersenne prime; products fit int64
+    _PRIME = (1 << 31) - 1
+    # Base used to fold the MinHash values of a band into one bucket key
+    _KEY_BASE = 1000003
+    # Products whose signatures NumPy computes at once while building
+    _BUILD_CHUNK = 65536
+    
+    def __init__(
+        self,
+        database: ProductDatabase,
+        bands: int = 32,
+        rows: int = 1,
+        max_candidates: int = 10000,
+        seed: int = 0
+    ):
+        """
+        Build the index from a product database.
+        
+        Args:
+            database: Catalog to index
+            bands: Buckets per product; more bands raise recall
+            rows: MinHash values per band; more rows make buckets stricter
+            max_candidates: Most candidates returned by a query
+            seed: Seed for the hash functions
+        """
+        if bands < 1 or rows < 1:
+            raise ValueError("bands and rows must be at least 1")
+        
+        self.bands = bands
+        self.rows = rows
+        self.max_candidates = max_candidates
+        self.seed = seed
+        
+        rng = random.Random(seed)
+        count = bands * rows
+        self._multipliers = [rng.randrange(1, self._PRIME) for _ in range(count)]
+        self._offsets = [rng.randrange(0, self._PRIME) for _ in range(count)]
+        self._lock = threading.Lock()
+        self._build(database)
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def _build(self, database: ProductDatabase):
+        """Index every product of the database."""
+        # band -> {bucket key -> positions}
+        self._buckets: List[Dict[int, array]] = [{} for _ in range(self.bands)]
+        # Bucket keys of every position, ``bands`` per position (0 = no features)
+        self._keys = array('q')
+        self.size = 0
+        self.version = database.version
+        
+        if np is not None:
+            self._build_with_numpy(database)
+            return
+        
+        token_cache = {}
+        for position, (_, _, _, features) in enumerate(database._index_rows()):
+            self._keys.extend(self._band_keys(features, token_cache))
+            self._insert(position)
+            self.size += 1
+    
+    def _build_with_numpy(self, database: ProductDatabase):
+        """
+        Index every product, computing signatures with array operations.
+        
+        Produces exactly the keys and buckets of the pure-Python build.
+        """
+        vocabulary: Dict[str, int] = {}
+        codes = array('q')
+        lengths = array('q')
+        for _, _, _, features in database._index_rows():
+            lengths.append(len(features))
+            codes.extend([vocabulary.setdefault(f, len(vocabulary)) for f in features])
+        
+        prime = self._PRIME
+        tokens = np.array(
+            [zlib.crc32(feature.encode("utf-8")) % prime for feature in vocabulary],
+            dtype=np.int64
+        )
+        multipliers = np.array(self._multipliers, dtype=np.int64)
+        offsets = np.array(self._offsets, dtype=np.int64)
+        token_signatures = (tokens[:, None] * multipliers + offsets) % prime
+        
+        codes = np.frombuffer(codes, dtype=np.int64)
+        lengths = np.frombuffer(lengths, dtype=np.int64)
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        size = len(lengths)
+        keys = np.zeros((size, self.bands), dtype=np.int64)
+        
+        for first in range(0, size, self._BUILD_CHUNK):
+            last = min(first + self._BUILD_CHUNK, size)
+            rows = np.flatnonzero(lengths[first:last]) + first
+            if len(rows) == 0:
+                continue
+            entries = codes[starts[first]:ends[last - 1]]
+            minimum = np.minimum.reduceat(
+                token_signatures[entries], starts[rows] - starts[first], axis=0
+            ).reshape(len(rows), self.bands, self.rows)
+            
+            folded = np.zeros((len(rows), self.bands), dtype=np.int64)
+            for row in range(self.rows):
+                folded = (folded * self._KEY_BASE + minimum[:, :, row]) % prime
+            keys[rows] = folded + 1
+        
+        self._keys = _to_array('q', memoryview(keys.ravel()))
+        self.size = size
+        
+        positions = np.arange(size, dtype=np.int64)
+        for band, buckets in enumerate(self._buckets):
+            band_keys = keys[:, band]
+            order = np.argsort(band_keys, kind='stable')
+            sorted_keys = band_keys[order]
+            bounds = np.flatnonzero(np.diff(sorted_keys)) + 1
+            for start, end in zip(
+                np.concatenate(([0], bounds)).tolist(),
+                np.concatenate((bounds, [size])).tolist()
+            ):
+                key = int(sorted_keys[start])
+                if key:
+                    buckets[key] = _to_array('q', memoryview(positions[order[start:end]]))
+    
+    def sync(self, database: ProductDatabase):
+        """
+        Apply the database changes made since the index was built.
+        
+        Only changed positions are re-indexed; the index is rebuilt when
+        the change log cannot describe the changes.
+        """
+        with self._lock:
+            if database.version == self.version:
+                return
+            
+            changes = database.changes_since(self.version)
+            if changes is None:
+                self._build(database)
+                return
+            
+            products = database.get_all_products()
+            new_size = len(products)
+            if new_size > self.size:
+                self._keys.extend([0] * ((new_size - self.size) * self.bands))
+            
+            for position in sorted(changes[0]):
+                if position < self.size:
+                    self._discard(position)
+                if position < new_size:
+                    keys = self._band_keys(products[position].features)
+                    self._keys[position * self.bands:(position + 1) * self.bands] = array('q', keys)
+                    self._insert(position)
+            
+            del self._keys[new_size * self.bands:]
+            self.size = new_size
+            self.version = database.version
+    
+    def query(self, features: Iterable[str]) -> Optional[List[int]]:
+        """
+        Find products whose features resemble the given ones.
+        
+        Args:
+            features: Preferred features
+            
+        Returns:
+            Up to ``max_candidates`` product positions, most similar first,
+            or None when there are no features to search with
+        """
+        keys = self._band_keys(features)
+        if not any(keys):
+            return None
+        
+        shared: Dict[int, int] = {}
+        with self._lock:
+            for buckets, key in zip(self._buckets, keys):
+                for position in buckets.get(key, ()):
+                    shared[position] = shared.get(position, 0) + 1
+        
+        if len(shared) <= self.max_candidates:
+            return sorted(shared, key=shared.__getitem__, reverse=True)
+        return heapq.nlargest(self.max_candidates, shared, key=shared.__getitem__)
+    
+    def _band_keys(self, features: Iterable[str], token_cache: Dict = None) -> List[int]:
+        """
+        Compute the bucket key of every band for a feature set.
+        
+        Args:
+            features: Feature strings
+            token_cache: Optional dict reusing hash values of repeated features
+            
+        Returns:
+            ``bands`` keys; all 0 for an empty feature set
+        """
+        prime = self._PRIME
+        signatures = []
+        for feature in set(features):
+            signature = token_cache.get(feature) if token_cache is not None else None
+            if signature is None:
+                token = zlib.crc32(feature.encode("utf-8")) % prime
+                signature = [
+                    (a * token + b) % prime
+                    for a, b in zip(self._multipliers, self._offsets)
+                ]
+                if token_cache is not None:
+                    token_cache[feature] = signature
+            signatures.append(signature)
+        
+        if not signatures:
+            return [0] * self.bands
+        
+        minimum = list(map(min, zip(*signatures))) if len(signatures) > 1 else signatures[0]
+        keys = []
+        for band in range(self.bands):
+            key = 0
+            for value in minimum[band * self.rows:(band + 1) * self.rows]:
+                key = (key * self._KEY_BASE + value) % prime
+            # Keys are never 0, which marks "no features"
+            keys.append(key + 1)
+        return keys
+    
+    def _insert(self, position: int):
+        """Add a position to the buckets named by its stored keys."""
+        start = position * self.bands
+        for buckets, key in zip(self._buckets, self._keys[start:start + self.bands]):
+            if key:
+                buckets.setdefault(key, array('q')).append(position)
+    
+    def _discard(self, position: int):
+        """Remove a position from the buckets named by its stored keys."""
+        start = position * self.bands
+        for buckets, key in zip(self._buckets, self._keys[start:start + self.bands]):
+            if key:
+                ProductDatabase._remove_posting(buckets, key, position)
+
+
+# ============================================================================
+# CO-PURCHASE MODEL
+# ============================================================================
+
+class CoPurchaseModel:
+    """
+    Item-to-item co-purchase model built from purchase histories.
+    
+    Co-purchase counts form a sparse matrix in CSR layout: row ``r`` holds
+    the products bought together with product ``row_ids[r]``, as column
+    indices ``indices[indptr[r]:indptr[r + 1]]`` and counts in ``data``.
+    The affinity of Y for a buyer of X is the share of X's buyers who also
+    bought Y. The ``top_k`` strongest neighbours of every product are kept
+    in fixed-size slots, so a lookup costs O(k).
+    
+    Purchases are added incrementally: add_purchases() collects counts and
+    refresh() merges them into the matrix, recomputing the neighbours of
+    only the products whose counts changed.
+    """
+    
+    def __init__(self, top_k: int = 20, max_history: int = 100):
+        """
+        Create an empty model.
+        
+        Args:
+            top_k: Neighbours kept per product
+            max_history: Most recent purchases of a user paired with new ones,
+                bounding the cost of very long histories
+        """
+        self.top_k = top_k
+        self.max_history = max_history
+        
+        self.row_ids = array('q')        # row -> product ID
+        self._rows: Dict[int, int] = {}  # product ID -> row
+        self.buyers = array('q')         # row -> number of buyers
+        self.indptr = array('q', [0])
+        self.indices = array('q')
+        self.data = array('q')
+        
+        self._neighbor_ids = array('q')
+        self._neighbor_scores = array('d')
+        self._neighbor_counts = array('q')
+        
+        self._pending: Dict[int, Dict[int, int]] = {}
+        self._lock = threading.Lock()
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.row_ids)
+    
+    @classmethod
+    def from_histories(
+        cls,
+        histories: Iterable[Sequence[int]],
+        top_k: int = 20,
+        max_history: int = 100
+    ) -> "CoPurchaseModel":
+        """
+        Build a model from complete purchase histories, one per user.
+        
+        Args:
+            histories: Product IDs bought by each user
+            top_k: Neighbours kept per product
+            max_history: See __init__
+            
+        Returns:
+            The refreshed model
+        """
+        model = cls(top_k=top_k, max_history=max_history)
+        for history in histories:
+            model.add_purchases(history)
+        model.refresh()
+        return model
+    
+    def add_purchases(self, new_product_ids: Iterable[int], previous_product_ids: Iterable[int] = ()):
+        """
+        Record that a user bought some products.
+        
+        Each new product is paired with the others and with the user's
+        previous purchases. Counts take effect at the next refresh().
+        
+        Args:
+            new_product_ids: Products just bought
+            previous_product_ids: Products the user had bought before
+        """
+        previous = list(dict.fromkeys(previous_product_ids))[-self.max_history:]
+        seen = set(previous)
+        new = [p for p in dict.fromkeys(new_product_ids) if p not in seen][-self.max_history:]
+        if not new:
+            return
+        
+        with self._lock:
+            for product_id in new:
+                self._row(product_id)
+                self.buyers[self._rows[product_id]] += 1
+            
+            pending = self._pending
+            for i, product_id in enumerate(new):
+                row = pending.setdefault(product_id, {})
+                for other in previous:
+                    row[other] = row.get(other, 0) + 1
+                    other_row = pending.setdefault(other, {})
+                    other_row[product_id] = other_row.get(product_id, 0) + 1
+                for other in new[i + 1:]:
+                    row[other] = row.get(other, 0) + 1
+                    other_row = pending.setdefault(other, {})
+                    other_row[product_id] = other_row.get(product_id, 0) + 1
+    
+    def refresh(self) -> int:
+        """
+        Merge pending counts into the matrix and update affected neighbours.
+        
+        Returns:
+            Number of products whose neighbours were recomputed
+        """
+        with self._lock:
+            pending = self._pending
+            if not pending:
+                return 0
+            self._pending = {}
+            
+            for product_id in pending:
+                self._row(product_id)
+            rows = self._rows
+            changes = {rows[product_id]: counts for product_id, counts in pending.items()}
+            
+            # Unchanged runs of rows are copied in one slice; every row added
+            # since the last refresh has pending counts, so runs predate it
+            old_rows = len(self.indptr) - 1
+            indptr = array('q', [0])
+            indices = array('q')
+            data = array('q')
+            copied = 0
+            for row in sorted(changes) + [len(self.row_ids)]:
+                if copied < row:
+                    start, end = self.indptr[copied], self.indptr[row]
+                    shift = len(indices) - start
+                    indices.extend(self.indices[start:end])
+                    data.extend(self.data[start:end])
+                    indptr.extend([offset + shift for offset in self.indptr[copied + 1:row + 1]])
+                if row == len(self.row_ids):
+                    break
+                
+                merged = {}
+                if row < old_rows:
+                    start, end = self.indptr[row], self.indptr[row + 1]
+                    merged.update(zip(self.indices[start:end], self.data[start:end]))
+                for other, count in changes[row].items():
+                    column = rows[other]
+                    merged[column] = merged.get(column, 0) + count
+                for column in sorted(merged):
+                    indices.append(column)
+                    data.append(merged[column])
+                indptr.append(len(indices))
+                copied = row + 1
+            self.indptr, self.indices, self.data = indptr, indices, data
+            
+            for row in changes:
+                self._update_neighbors(row)
+            return len(changes)
+    
+    def neighbors(self, product_id: int) -> List[Tuple[int, float]]:
+        """
+        Get the products most often bought together with a product.
+        
+        Args:
+            product_id: Product to look up
+            
+        Returns:
+            Up to top_k (product ID, affinity) pairs, strongest first;
+            affinity is the share of the product's buyers who also bought
+            the neighbour
+        """
+        row = self._rows.get(product_id)
+        if row is None:
+            return []
+        start = row * self.top_k
+        end = start + self._neighbor_counts[row]
+        return list(zip(self._neighbor_ids[start:end], self._neighbor_scores[start:end]))
+    
+    def csr_arrays(self) -> Dict:
+        """
+        Get the co-purchase matrix as CSR arrays.
+        
+        ``scipy.sparse.csr_matrix((data, indices, indptr), shape=shape)``
+        accepts them directly; rows and columns follow ``row_ids``.
+        
+        Returns:
+            Dictionary with data, indices, indptr, shape and row_ids
+            (NumPy arrays when NumPy is installed)
+        """
+        with self._lock:
+            arrays = {
+                'data': self.data,
+                'indices': self.indices,
+                'indptr': self.indptr,
+                'row_ids': self.row_ids,
+            }
+            if np is not None:
+                arrays = {name: np.array(values, dtype=np.int64) for name, values in arrays.items()}
+            arrays['shape'] = (len(self.row_ids), len(self.row_ids))
+            return arrays
+    
+    def _row(self, product_id: int) -> int:
+        """Get the row of a product, adding an empty one if new."""
+        row = self._rows.get(product_id)
+        if row is None:
+            row = len(self.row_ids)
+            self._rows[product_id] = row
+            self.row_ids.append(product_id)
+            self.buyers.append(0)
+            self._neighbor_ids.extend([0] * self.top_k)
+            self._neighbor_scores.extend([0.0] * self.top_k)
+            self._neighbor_counts.append(0)
+        return row
+    
+    def _update_neighbors(self, row: int):
+        """Recompute the top-k neighbours of one row."""
+        start, end = self.indptr[row], self.indptr[row + 1]
+        buyers = self.buyers[row] or 1
+        row_ids = self.row_ids
+        # Strongest first; equal counts by product ID so results are stable
+        best = heapq.nsmallest(
+            self.top_k,
+            zip(self.data[start:end], self.indices[start:end]),
+            key=lambda entry: (-entry[0], row_ids[entry[1]])
+        )
+        
+        slot = row * self.top_k
+        for offset, (count, column) in enumerate(best):
+            self._neighbor_ids[slot + offset] = row_ids[column]
+            self._neighbor_scores[slot + offset] = count / buyers
+        self._neighbor_counts[row] = len(best)
+
+
+# ============================================================================
+# DIVERSITY RE-RANKING
+# ============================================================================
+
+@dataclass(frozen=True, slots=True)
+class DiversityPolicy:
+    """
+    Re-ranks the best products so a list is not N near-identical ones.
+    
+    Slots are filled greedily by maximal marginal relevance (MMR): each goes
+    to the candidate maximizing
+    ``relevance * score / 100 - (1 - relevance) * similarity``, where the
+    similarity is the highest Jaccard similarity between the candidate's
+    features (its category counting as one more feature) and those of the
+    products already chosen. An optional cap limits how many products of
+    one category are chosen while other candidates remain.
+    
+    Only the ``pool_factor * N`` best products are re-ranked, so the extra
+    cost is O(pool * N) whatever the catalog size.
+    """
+    relevance: float = 0.7
+    pool_factor: int = 4
+    category_cap: Optional[int] = None
+    
+    def __post_init__(self):
+        if not 0.0 <= self.relevance <= 1.0:
+            raise ValueError("Relevance must be between 0 and 1")
+        if self.pool_factor < 1:
+            raise ValueError("Pool factor must be at least 1")
+        if self.category_cap is not None and self.category_cap < 1:
+            raise ValueError("Category cap must be at least 1")
+    
+    def pool_size(self, num_recommendations: int) -> int:
+        """Number of top-scored products to choose from."""
+        return num_recommendations * self.pool_factor
+    
+    def rerank(self, candidates: List[Tuple[float, Product]], num_recommendations: int) -> List[int]:
+        """
+        Choose a varied list from candidates.
+        
+        Args:
+            candidates: (match score, product) pairs, best score first
+            num_recommendations: Number of products to choose
+            
+        Returns:
+            Indexes into candidates, in the chosen order
+        """
+        tokens = [set(product.features) | {product.category} for _, product in candidates]
+        similarity = [0.0] * len(candidates)
+        per_category = {}
+        remaining = list(range(len(candidates)))
+        chosen = []
+        
+        while remaining and len(chosen) < num_recommendations:
+            best = None
+            best_value = -float('inf')
+            for i in remaining:
+                score, product = candidates[i]
+                if (self.category_cap is not None
+                        and per_category.get(product.category, 0) >= self.category_cap):
+                    continue
+                value = self.relevance * score / 100 - (1 - self.relevance) * similarity[i]
+                if value > best_value:
+                    best, best_value = i, value
+            if best is None:
+                break
+            
+            chosen.append(best)
+            remaining.remove(best)
+            category = candidates[best][1].category
+            per_category[category] = per_category.get(category, 0) + 1
+            # Only the new product can raise a candidate's similarity
+            chosen_tokens = tokens[best]
+            for i in remaining:
+                shared = len(tokens[i] & chosen_tokens)
+                if shared:
+                    overlap = shared / (len(tokens[i]) + len(chosen_tokens) - shared)
+                    if overlap > similarity[i]:
+                        similarity[i] = overlap
+        
+        # When the cap leaves too few products, fill up by score
+        chosen.extend(remaining[:num_recommendations - len(chosen)])
+        return chosen
+
+
+# ============================================================================
+# INSTRUMENTATION
+# ============================================================================
+
+class RequestTrace:
+    """
+    Timings and counts of one recommendation request.
+    
+    Stages are timed as laps: lap(name) closes the stage that started at
+    the previous lap. Stages: cache, retrieve, boost, filter, score,
+    select, build. Candidate counts: catalog, then what survives the
+    budget, rating and purchase-history filters, then products scored
+    and returned.
+    """
+    
+    __slots__ = ('user_id', 'stages', 'allocated_blocks', 'candidates', 'cache_hit',
+                 'total_seconds', '_started', '_last', '_blocks')
+    
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.stages: Dict[str, float] = {}
+        self.allocated_blocks: Dict[str, int] = {}
+        self.candidates: Dict[str, int] = {}
+        self.cache_hit = False
+        self.total_seconds = 0.0
+        self._blocks = sys.getallocatedblocks()
+        self._started = self._last = time.perf_counter()
+    
+    def lap(self, stage: str):
+        """Close a stage: charge it the time and blocks since the last lap."""
+        now = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last)
+        self.allocated_blocks[stage] = self.allocated_blocks.get(stage, 0) + (blocks - self._blocks)
+        self._last = now
+        self._blocks = blocks
+    
+    def count(self, name: str, value: int):
+        """Record the number of candidates left at a point."""
+        self.candidates[name] = self.candidates.get(name, 0) + value
+    
+    def finish(self):
+        """Stop the request clock."""
+        self.total_seconds = time.perf_counter() - self._started
+
+
+class EngineStats:
+    """Aggregated request traces (thread-safe)."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.requests = 0
+            self.cache_hits = 0
+            self.total_seconds = 0.0
+            # stage -> [count, total seconds, max seconds, allocated blocks]
+            self._stages: Dict[str, List] = {}
+            # name -> [total candidates, requests that counted them]
+            self._candidates: Dict[str, List[int]] = {}
+    
+    def record(self, trace: RequestTrace):
+        """Add one finished request."""
+        with self._lock:
+            self.requests += 1
+            self.cache_hits += trace.cache_hit
+            self.total_seconds += trace.total_seconds
+            for stage, seconds in trace.stages.items():
+                self._record_stage(stage, seconds, trace.allocated_blocks.get(stage, 0))
+            for name, value in trace.candidates.items():
+                entry = self._candidates.setdefault(name, [0, 0])
+                entry[0] += value
+                entry[1] += 1
+    
+    def record_stage(self, stage: str, seconds: float, blocks: int = 0):
+        """Add a stage timed outside a request (e.g. explanation text)."""
+        with self._lock:
+            self._record_stage(stage, seconds, blocks)
+    
+    def _record_stage(self, stage: str, seconds: float, blocks: int):
+        entry = self._stages.setdefault(stage, [0, 0.0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        entry[3] += blocks
+    
+    def summary(self) -> Dict:
+        """
+        Summarize the recorded requests.
+        
+        Returns:
+            Dictionary with request and cache-hit counts, per-stage count,
+            total/mean/max milliseconds and mean net allocated blocks, and
+            the mean candidate count at each filter (over the requests
+            that reached it; cache hits skip the filters)
+        """
+        with self._lock:
+            requests = self.requests or 1
+            return {
+                'requests': self.requests,
+                'cache_hits': self.cache_hits,
+                'mean_ms': self.total_seconds / requests * 1000,
+                'stages': {
+                    stage: {
+                        'count': count,
+                        'total_ms': total * 1000,
+                        'mean_ms': total / count * 1000,
+                        'max_ms': longest * 1000,
+                        'mean_allocated_blocks': blocks / count,
+                    }
+                    for stage, (count, total, longest, blocks) in self._stages.items()
+                },
+                'mean_candidates': {
+                    name: total / counted for name, (total, counted) in self._candidates.items()
+                },
+            }
+
+
+class Instrumentation:
+    """
+    Opt-in instrumentation for a RecommendationEngine.
+    
+    Pass one as ``RecommendationEngine(..., instrumentation=...)``. Every
+    request is traced, added to ``stats`` and passed to each hook. An
+    engine without instrumentation only pays an ``is None`` check at each
+    stage boundary.
+    """
+    
+    def __init__(self, hooks: Iterable[Callable[[RequestTrace], None]] = ()):
+        """
+        Args:
+            hooks: Callables receiving each finished RequestTrace
+        """
+        self.stats = EngineStats()
+        self.hooks = list(hooks)
+    
+    def add_hook(self, hook: Callable[[RequestTrace], None]):
+        """Call ``hook(trace)`` after every request."""
+        self.hooks.append(hook)
+    
+    def start(self, user: UserPreference) -> RequestTrace:
+        """Begin tracing a request."""
+        return RequestTrace(user.user_id)
+    
+    def finish(self, trace: RequestTrace):
+        """Record a finished request and run the hooks."""
+        trace.finish()
+        self.stats.record(trace)
+        for hook in self.hooks:
+            hook(trace)
+
+
+# ============================================================================
+# RECOMMENDATION ENGINE
+# ============================================================================
+
+class RecommendationEngine:
+    """Generates explainable product recommendations."""
+    
+    BACKENDS = ("python", "numpy")
+    
+    def __init__(
+        self,
+        database: ProductDatabase,
+        backend: str = "python",
+        cache: "RecommendationCache" = None,
+        retriever: "FeatureLSHIndex" = None,
+        segments: "SegmentTable" = None,
+        copurchase: "CoPurchaseModel" = None,
+        copurchase_weight: float = 10.0,
+        profile: ScoringProfile = None,
+        diversity: DiversityPolicy = None,
+        instrumentation: Instrumentation = None
+    ):
+        """
+        Initialize the recommendation engine.
+        
+        Args:
+            database: Product catalog
+            backend: "python" scores indexed candidates one at a time,
+                "numpy" scores the whole catalog with array operations
+            cache: Optional cache of rankings shared between similar users
+            retriever: Optional approximate index; when set, only the
+                products it retrieves are scored (falling back to the full
+                search when they yield too few recommendations)
+            segments: Optional precomputed per-segment candidate lists
+                (see segment_tables.py); when the user's segment is in the
+                table only its candidates are filtered and scored, falling
+                back like the retriever; it must have been built from
+                this catalog, and is ignored once the catalog changes
+            copurchase: Optional co-purchase model; products often bought
+                with the user's purchases earn up to ``copurchase_weight``
+                extra points, and scores are rescaled to stay within 100%
+            copurchase_weight: Points awarded for an affinity of 1.0
+            profile: Scoring weights and rules (default: DEFAULT_PROFILE,
+                the built-in 20/20/15/45 scoring); compiled once here
+            diversity: Optional re-ranking of the top-scored products into
+                a more varied list; products chosen over higher-scored ones
+                get an "added for variety" reason
+            instrumentation: Optional per-stage timers, candidate counts
+                and hooks for requests served in this process
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {self.BACKENDS}")
+        
+        self.database = database
+        self.backend = backend
+        self.cache = cache
+        self.retriever = retriever
+        if segments is not None and segments.catalog_fingerprint != database.fingerprint():
+            raise ValueError("Segment table was built from a different catalog")
+        self.segments = segments
+        self._segments_version = database.version
+        self.copurchase = copurchase
+        self.copurchase_weight = copurchase_weight
+        self.profile = profile if profile is not None else DEFAULT_PROFILE
+        self.diversity = diversity
+        self.instrumentation = instrumentation
+        self._columnar = None
+        self._columnar_lock = threading.Lock()
+        self._compile_profile()
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Compiled closures cannot be pickled; workers compile their own
+        for name in ('_columnar_lock', '_score_product', '_filters', '_bonuses'):
+            del state[name]
+        # Hooks may not be picklable, and worker statistics would be lost
+        state['instrumentation'] = None
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._columnar_lock = threading.Lock()
+        self._compile_profile()
+    
+    def _compile_profile(self):
+        """Compile the scoring profile into the functions used per product."""
+        self._score_product = self.profile.compile()
+        self._filters = [(condition, condition.compile()) for condition in self.profile.filters]
+        self._bonuses = [(bonus, bonus.condition.compile()) for bonus in self.profile.bonuses]
+    
+    def _columnar_catalog(self) -> ColumnarCatalog:
+        """
+        Get the columnar catalog, applying database changes to it first.
+        
+        Must be called while holding the database read lock.
+        """
+        with self._columnar_lock:
+            if self._columnar is None or not self._columnar.sync(self.database):
+                self._columnar = ColumnarCatalog(self.database)
+            return self._columnar
+    
+    def recommend_products(
+        self,
+        user: UserPreference,
+        num_recommendations: int = 5
+    ) -> List[Recommendation]:
+        """
+        Generate product recommendations with explanations.
+        
+        Args:
+            user: User preferences and constraints
+            num_recommendations: Number of products to recommend
+            
+        Returns:
+            List of recommendations sorted by match score (highest first),
+            or in the re-ranked order when a diversity policy is set
+        """
+        if num_recommendations <= 0:
+            return []
+        
+        depth = num_recommendations
+        if self.diversity is not None:
+            depth = self.diversity.pool_size(num_recommendations)
+        
+        trace = self.instrumentation.start(user) if self.instrumentation is not None else None
+        
+        with self.database.reading():
+            boosts = self._copurchase_boosts(user)
+            if trace is not None and self.copurchase is not None:
+                trace.lap('boost')
+            
+            # Cached rankings are shared across purchase histories, so they
+            # cannot hold history-dependent co-purchase boosts
+            if self.cache is not None and not boosts:
+                self.cache.sync(self.database)
+                positions = self._cached_ranking(user, depth, trace)
+            else:
+                positions = self._rank_positions(user, depth, boosts=boosts, trace=trace)
+            
+            variety = None
+            if self.diversity is not None:
+                positions, variety = self._diversify(positions, user, num_recommendations, boosts)
+                if trace is not None:
+                    trace.lap('diversify')
+            
+            recommendations = self._build_recommendations(positions, user, boosts, variety)
+        
+        if trace is not None:
+            trace.lap('build')
+            trace.count('returned', len(recommendations))
+            self.instrumentation.finish(trace)
+        return recommendations
+    
+    def recommend_batch(
+        self,
+        users: Iterable[UserPreference],
+        num_recommendations: int = 5,
+        workers: int = None,
+        chunk_size: int = 256
+    ) -> Iterator[List[Recommendation]]:
+        """
+        Generate recommendations for many users using worker processes.
+        
+        Workers receive the engine once, at start-up; where the platform
+        supports fork they inherit the catalog instead of unpickling it.
+        Users are sent in chunks and at most two chunks per worker are in
+        flight, so memory stays bounded however many users are streamed.
+        
+        Args:
+            users: User preferences (any iterable, consumed lazily)
+            num_recommendations: Number of products to recommend per user
+            workers: Number of processes (default: CPU count); 1 runs
+                everything in this process
+            chunk_size: Users sent to a worker per task
+            
+        Yields:
+            The recommendation list of each user, in input order; identical
+            to calling recommend_products for that user
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        
+        if workers <= 1:
+            for user in users:
+                yield self.recommend_products(user, num_recommendations)
+            return
+        
+        if self.backend == "numpy":
+            # Build the columns before forking so every worker shares them
+            with self.database.reading():
+                self._columnar_catalog()
+        
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_batch_worker,
+            initargs=(self,)
+        )
+        pending = deque()
+        try:
+            for chunk in _chunked(users, chunk_size):
+                pending.append(pool.submit(_recommend_chunk, chunk, num_recommendations))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            pool.shutdown(cancel_futures=True)
+    
+    def _rank_positions(
+        self,
+        user: UserPreference,
+        k: int,
+        exclude_purchased: bool = True,
+        boosts: Dict[int, Tuple[float, int]] = None,
+        trace: RequestTrace = None
+    ) -> List[int]:
+        """
+        Find the catalog positions of the K best products for a user.
+        
+        Args:
+            user: User preferences and constraints
+            k: Number of positions to return
+            exclude_purchased: Skip products in the user's purchase history
+            boosts: Co-purchase affinities by position, from _copurchase_boosts
+            trace: Request trace to record stages in, when instrumented
+            
+        Returns:
+            Product positions sorted by match score (highest first)
+        """
+        boosts = boosts or {}
+        
+        if self.segments is not None:
+            positions = self._segment_positions(user, k, exclude_purchased, boosts, trace)
+            if positions is not None:
+                return positions
+        
+        if self.retriever is not None:
+            positions = self._retrieved_positions(user, k, exclude_purchased, boosts, trace)
+            if positions is not None:
+                return positions
+        
+        if self.backend == "numpy":
+            catalog = self._columnar_catalog()
+            counts = trace.candidates if trace is not None else None
+            scores = catalog.score(user, exclude_purchased, self.profile, counts)
+            if self.copurchase is not None:
+                affinities = np.zeros(len(scores))
+                for position, (affinity, _) in boosts.items():
+                    affinities[position] = affinity
+                affinities[scores <= 0] = 0.0
+                scores = self._with_copurchase(scores, affinities)
+            if trace is not None:
+                trace.lap('score')
+            positions = catalog.top_positions(scores, k)
+            if trace is not None:
+                trace.lap('select')
+            return positions
+        
+        # Columns, not Products: a compact store would build a Product per read
+        product_ids, _, ratings = self.database.columns()
+        # A set keeps each check O(1) however long the history is
+        purchased = set(user.purchase_history) if exclude_purchased else set()
+        in_budget = self.database.positions_in_price_range(user.budget_min, user.budget_max)
+        
+        # Candidates: in budget, rating high enough and not yet purchased
+        if trace is None:
+            eligible = [
+                position
+                for position in in_budget
+                if ratings[position] >= user.minimum_rating
+                and product_ids[position] not in purchased
+            ]
+        else:
+            # Same filters one at a time, to count what each removes
+            rated = [p for p in in_budget if ratings[p] >= user.minimum_rating]
+            eligible = [p for p in rated if product_ids[p] not in purchased]
+            trace.count('catalog', len(product_ids))
+            trace.count('budget', len(in_budget))
+            trace.count('rating', len(rated))
+            trace.count('purchase_history', len(eligible))
+            trace.lap('filter')
+        
+        # Products sharing a category or feature with the user are scored first
+        related = self.database.positions_related_to(
+            user.preferred_categories, user.preferred_features
+        )
+        related.update(boosts)
+        top = TopKSelector(k)
+        first_pass = [position for position in eligible if position in related]
+        self._select_positions(top, first_pass, user, boosts)
+        scored = len(first_pass)
+        
+        # Unrelated products score at most the profile's unmatched ceiling
+        # (UNMATCHED_SCORE_CEILING by default), so they only need scoring
+        # when they could still reach the top N
+        if not top.is_full() or top.weakest_score() <= self.profile.unmatched_ceiling:
+            second_pass = [position for position in eligible if position not in related]
+            self._select_positions(top, second_pass, user, boosts)
+            scored += len(second_pass)
+        
+        if trace is not None:
+            trace.count('scored', scored)
+            trace.lap('score')
+        positions = [position for _, position in top.results()]
+        if trace is not None:
+            trace.lap('select')
+        return positions
+    
+    def _retrieved_positions(
+        self,
+        user: UserPreference,
+        k: int,
+        exclude_purchased: bool,
+        boosts: Dict[int, Tuple[float, int]],
+        trace: RequestTrace = None
+    ) -> Optional[List[int]]:
+        """
+        Rank only the products returned by the approximate retriever.
+        
+        Returns:
+            Product positions sorted by match score, or None when the
+            retriever has nothing to search with or too few candidates
+            pass the filters
+        """
+        self.retriever.sync(self.database)
+        candidates = self.retriever.query(user.preferred_features)
+        if candidates is None:
+            return None
+        if boosts:
+            candidates = list(dict.fromkeys(candidates + list(boosts)))
+        if trace is not None:
+            trace.count('retrieved', len(candidates))
+            trace.lap('retrieve')
+        return self._rank_candidates(candidates, user, k, exclude_purchased, boosts, trace)
+    
+    def _segment_positions(
+        self,
+        user: UserPreference,
+        k: int,
+        exclude_purchased: bool,
+        boosts: Dict[int, Tuple[float, int]],
+        trace: RequestTrace = None
+    ) -> Optional[List[int]]:
+        """
+        Rank only the precomputed candidates of the user's segment.
+        
+        Returns:
+            Product positions sorted by match score, or None when the
+            catalog changed after the table was attached, the user's
+            segment is not in the table or too few candidates pass the
+            filters
+        """
+        # A stale table would miss products added or changed since
+        if self.database.version != self._segments_version:
+            return None
+        product_ids = self.segments.candidates(user)
+        if product_ids is None:
+            return None
+        id_positions = self.database._id_positions
+        candidates = [
+            position
+            for position in map(id_positions.get, product_ids)
+            if position is not None
+        ]
+        if boosts:
+            candidates = list(dict.fromkeys(candidates + list(boosts)))
+        if trace is not None:
+            trace.count('segment', len(candidates))
+            trace.lap('segment')
+        return self._rank_candidates(candidates, user, k, exclude_purchased, boosts, trace)
+    
+    def _rank_candidates(
+        self,
+        candidates: List[int],
+        user: UserPreference,
+        k: int,
+        exclude_purchased: bool,
+        boosts: Dict[int, Tuple[float, int]],
+        trace: RequestTrace = None
+    ) -> Optional[List[int]]:
+        """
+        Filter and score a short list of candidate positions.
+        
+        Returns:
+            The K best positions sorted by match score, or None when fewer
+            than K candidates pass the filters
+        """
+        product_ids, prices, ratings = self.database.columns()
+        purchased = set(user.purchase_history) if exclude_purchased else set()
+        eligible = [
+            position
+            for position in candidates
+            if user.budget_min <= prices[position] <= user.budget_max
+            and ratings[position] >= user.minimum_rating
+            and product_ids[position] not in purchased
+        ]
+        if trace is not None:
+            trace.count('eligible', len(eligible))
+            trace.lap('filter')
+        
+        top = TopKSelector(k)
+        self._select_positions(top, eligible, user, boosts)
+        if trace is not None:
+            trace.count('scored', len(eligible))
+            trace.lap('score')
+        if not top.is_full():
+            return None
+        positions = [position for _, position in top.results()]
+        if trace is not None:
+            trace.lap('select')
+        return positions
+    
+    def _cached_ranking(
+        self,
+        user: UserPreference,
+        num_recommendations: int,
+        trace: RequestTrace = None
+    ) -> List[int]:
+        """
+        Get the top positions for a user through the result cache.
+        
+        Cached rankings ignore purchase history so users with the same
+        profile share them; purchased products are filtered out afterwards.
+        A ranking is recomputed deeper when filtering leaves too few items.
+        """
+        product_ids = self.database.columns()[0]
+        purchased = set(user.purchase_history)
+        key = self.cache.fingerprint(user)
+        
+        entry = self.cache.get(key, self.database.version)
+        if entry is not None:
+            ranking, complete = entry
+            positions = [p for p in ranking if product_ids[p] not in purchased]
+            if len(positions) >= num_recommendations or complete:
+                if trace is not None:
+                    trace.cache_hit = True
+                    trace.lap('cache')
+                return positions[:num_recommendations]
+        if trace is not None:
+            trace.lap('cache')
+        
+        # Deep enough that every purchased product could be skipped
+        depth = num_recommendations + len(purchased)
+        ranking = self._rank_positions(user, depth, exclude_purchased=False, trace=trace)
+        self.cache.put(key, self.database.version, ranking, len(ranking) < depth, user)
+        
+        positions = [p for p in ranking if product_ids[p] not in purchased]
+        if trace is not None:
+            trace.lap('cache')
+        return positions[:num_recommendations]
+    
+    def _select_positions(
+        self,
+        top: "TopKSelector",
+        positions: List[int],
+        user: UserPreference,
+        boosts: Dict[int, Tuple[float, int]] = None
+    ):
+        """
+        Score products by catalog position and feed them to a selector.
+        
+        Args:
+            top: Selector collecting the best products
+            positions: Product positions in the database
+            user: User preferences
+            boosts: Co-purchase affinities by position
+        """
+        products = self.database.get_all_products()
+        categories = set(user.preferred_categories)
+        features = set(user.preferred_features)
+        
+        for position in positions:
+            match_score = self._score_product(products[position], user, categories, features)
+            
+            # Only include products that meet minimum criteria
+            if match_score > 0:
+                if self.copurchase is not None:
+                    boost = boosts.get(position) if boosts else None
+                    match_score = self._with_copurchase(match_score, boost[0] if boost else 0.0)
+                top.push(match_score, position)
+    
+    def _diversify(
+        self,
+        positions: List[int],
+        user: UserPreference,
+        num_recommendations: int,
+        boosts: Dict[int, Tuple[float, int]] = None
+    ) -> Tuple[List[int], Dict[int, int]]:
+        """
+        Re-rank the top-scored positions with the diversity policy.
+        
+        Args:
+            positions: Candidate positions sorted by match score
+            user: User preferences
+            num_recommendations: Number of positions to choose
+            boosts: Co-purchase affinities by position
+            
+        Returns:
+            Tuple of (chosen positions, score rank by position for those
+            chosen ahead of a higher-scored candidate)
+        """
+        products = self.database.get_all_products()
+        categories = set(user.preferred_categories)
+        features = set(user.preferred_features)
+        
+        candidates = []
+        for position in positions:
+            product = products[position]
+            match_score = self._score_product(product, user, categories, features)
+            if self.copurchase is not None:
+                boost = boosts.get(position) if boosts else None
+                match_score = self._with_copurchase(match_score, boost[0] if boost else 0.0)
+            candidates.append((match_score, product))
+        
+        chosen = self.diversity.rerank(candidates, num_recommendations)
+        
+        # A product was picked for variety when a better-scored one was left
+        variety = {}
+        passed_over = set(range(len(candidates)))
+        for i in chosen:
+            if i != min(passed_over):
+                variety[positions[i]] = i + 1
+            passed_over.discard(i)
+        return [positions[i] for i in chosen], variety
+    
+    def _build_recommendations(
+        self,
+        positions: List[int],
+        user: UserPreference,
+        boosts: Dict[int, Tuple[float, int]] = None,
+        variety: Dict[int, int] = None
+    ) -> List[Recommendation]:
+        """
+        Create recommendations, with reasons, for the selected products.
+        
+        Args:
+            positions: Product positions in ranking order
+            user: User preferences
+            boosts: Co-purchase affinities by position
+            variety: Score rank of products chosen for variety, by position
+            
+        Returns:
+            List of recommendations in the same order
+        """
+        products = self.database.get_all_products()
+        recommendations = []
+        
+        for position in positions:
+            product = products[position]
+            match_score, reason_codes, matching_features = self._match_details(
+                product, user
+            )
+            if self.copurchase is not None:
+                affinity, source_id = (boosts or {}).get(position, (0.0, None))
+                match_score = self._with_copurchase(match_score, affinity)
+                if affinity > 0:
+                    source = self.database.get_product(source_id)
+                    reason_codes.append((
+                        ReasonCode.ALSO_BOUGHT,
+                        (affinity * 100, source.name if source else f"product {source_id}")
+                    ))
+            if variety and position in variety:
+                reason_codes.append((ReasonCode.VARIETY, (variety[position],)))
+            recommendations.append(Recommendation(
+                product=product,
+                match_score=match_score,
+                reasons=LazyReasons(reason_codes),
+                matching_features=matching_features
+            ))
+        
+        return recommendations
+    
+    def _copurchase_boosts(self, user: UserPreference) -> Dict[int, Tuple[float, int]]:
+        """
+        Collect co-purchase affinities from the user's recent purchases.
+        
+        Costs O(k) per purchase considered, independent of catalog size.
+        
+        Returns:
+            Dictionary of position -> (best affinity, ID of the purchased
+            product it comes from); empty without a model or history
+        """
+        if self.copurchase is None or not user.purchase_history:
+            return {}
+        
+        id_positions = self.database._id_positions
+        boosts = {}
+        for source_id in user.purchase_history[-self.copurchase.max_history:]:
+            for product_id, affinity in self.copurchase.neighbors(source_id):
+                position = id_positions.get(product_id)
+                if position is not None and affinity > boosts.get(position, (0.0,))[0]:
+                    boosts[position] = (affinity, source_id)
+        return boosts
+    
+    def _with_copurchase(self, match_score, affinity):
+        """
+        Add the co-purchase component to match scores.
+        
+        Works on floats and NumPy arrays alike, with the same arithmetic.
+        
+        Args:
+            match_score: Score from the standard components (0-100)
+            affinity: Co-purchase affinity (0-1)
+            
+        Returns:
+            Combined score, rescaled to 0-100
+        """
+        weight = self.copurchase_weight
+        return (match_score + weight * affinity) / (100 + weight) * 100
+    
+    def _calculate_match_score(
+        self,
+        product: Product,
+        user: UserPreference
+    ) -> Tuple[float, List[str], List[str]]:
+        """
+        Calculate how well a product matches user preferences.
+        
+        Args:
+            product: Product to evaluate
+            user: User preferences
+            
+        Returns:
+            Tuple of (match_score, reasons, matching_features)
+        """
+        match_score, reason_codes, matching_features = self._match_details(product, user)
+        reasons = [render_reason(code, values) for code, values in reason_codes]
+        return match_score, reasons, matching_features
+    
+    def _match_details(
+        self,
+        product: Product,
+        user: UserPreference
+    ) -> Tuple[float, List[Tuple[ReasonCode, Tuple]], List[str]]:
+        """
+        Calculate the match score and record reasons as codes.
+        
+        Args:
+            product: Product to evaluate
+            user: User preferences
+            
+        Returns:
+            Tuple of (match_score, reason codes, matching_features)
+        """
+        
+        profile = self.profile
+        score = 0.0
+        max_score = 0.0
+        reasons = []
+        matching_features = []
+        
+        # ===== HARD FILTERS FROM THE PROFILE =====
+        for condition, passes in self._filters:
+            if not passes(product):
+                reasons.append((ReasonCode.EXCLUDED, (condition,)))
+                return 0, reasons, matching_features
+        
+        # ===== CATEGORY MATCHING (20 points by default) =====
+        max_score += profile.category_weight
+        if product.category in user.preferred_categories:
+            score += profile.category_weight
+            reasons.append((ReasonCode.CATEGORY_MATCH, (product.category.value,)))
+        else:
+            reasons.append((ReasonCode.CATEGORY_OTHER, (product.category.value,)))
+        
+        # ===== BUDGET MATCHING (20 points by default) =====
+        max_score += profile.budget_weight
+        if user.budget_min <= product.price <= user.budget_max:
+            score += profile.budget_weight
+            reasons.append((ReasonCode.WITHIN_BUDGET, (user.budget_min, user.budget_max)))
+        else:
+            reasons.append((ReasonCode.OUTSIDE_BUDGET, (product.price,)))
+            return 0, reasons, matching_features  # Skip if outside budget
+        
+        # ===== RATING MATCHING (15 points by default) =====
+        max_score += profile.rating_weight
+        if product.rating >= user.minimum_rating:
+            # Award points based on how much above minimum
+            rating_bonus = (product.rating - user.minimum_rating) / (5 - user.minimum_rating)
+            score += profile.rating_weight * rating_bonus
+            reasons.append((ReasonCode.GOOD_RATING, (product.rating, user.minimum_rating)))
+        else:
+            return 0, reasons, matching_features  # Skip if below minimum rating
+        
+        # ===== FEATURE MATCHING (45 points by default) =====
+        max_score += profile.feature_weight
+        feature_match_count = 0
+        for feature in product.features:
+            if feature in user.preferred_features:
                 feature_match_count += 1
                 matching_features.append(feature)
         
         if feature_match_count > 0:
-            feature_score = (feature_match_count / max(len(user.preferred_features), 1)) * 45
+            feature_score = (feature_match_count / max(len(user.preferred_features), 1)) * profile.feature_weight
             score += feature_score
-            features_str = ", ".join(matching_features)
-            reasons.append(f"Has {feature_match_count} preferred features: {features_str}")
+            reasons.append((ReasonCode.FEATURE_MATCH, (feature_match_count, matching_features)))
         else:
-            reasons.append("No preferred features found in this product")
+            reasons.append((ReasonCode.NO_FEATURES, ()))
+        
+        # ===== BONUS RULES FROM THE PROFILE =====
+        for bonus, applies in self._bonuses:
+            max_score += bonus.points
+            if applies(product):
+                score += bonus.points
+                reasons.append((ReasonCode.BONUS, (bonus.reason, bonus.points)))
         
         # ===== NORMALIZE TO PERCENTAGE =====
         if max_score > 0:
@@ -420,33 +3349,107 @@ class RecommendationEngine:
         Returns:
             Formatted explanation text
         """
-        explanation = f"""
+        if self.instrumentation is None:
+            return "".join(self._explanation_parts(recommendation))
+        
+        start = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        text = "".join(self._explanation_parts(recommendation))
+        self.instrumentation.stats.record_stage(
+            'explain', time.perf_counter() - start, sys.getallocatedblocks() - blocks
+        )
+        return text
+    
+    def write_explanations(
+        self,
+        recommendations: Iterable[Recommendation],
+        stream: TextIO
+    ) -> int:
+        """
+        Write the explanations of many recommendations to a stream.
+        
+        Each explanation is written piece by piece, so no large string is
+        built however many recommendations there are.
+        
+        Args:
+            recommendations: Recommendations to explain
+            stream: Text stream to write to (file, sys.stdout, StringIO...)
+            
+        Returns:
+            Number of explanations written
+        """
+        count = 0
+        for recommendation in recommendations:
+            stream.writelines(self._explanation_parts(recommendation))
+            count += 1
+        return count
+    
+    def _explanation_parts(self, recommendation: Recommendation) -> List[str]:
+        """Build the pieces of an explanation, in order."""
+        product = recommendation.product
+        bar_length = int(recommendation.match_score / 5)
+        
+        parts = [f"""
 ╔════════════════════════════════════════════════════════════════╗
-║  PRODUCT RECOMMENDATION: {recommendation.product.name[:55]}
+║  PRODUCT RECOMMENDATION: {product.name[:55]}
 ╚════════════════════════════════════════════════════════════════╝
 
 Match Score: {recommendation.match_score:.1f}%
-{"█" * int(recommendation.match_score / 5)}{"░" * (20 - int(recommendation.match_score / 5))}
+{"█" * bar_length}{"░" * (20 - bar_length)}
 
 Product Details:
-  • Price: ${recommendation.product.price:.2f}
-  • Rating: {recommendation.product.rating}/5 ⭐
-  • Category: {recommendation.product.category.value}
-  • Description: {recommendation.product.description}
+  • Price: ${product.price:.2f}
+  • Rating: {product.rating}/5 ⭐
+  • Category: {product.category.value}
+  • Description: {product.description}
 
 Why We Recommend This:
-"""
+"""]
         for i, reason in enumerate(recommendation.reasons, 1):
-            explanation += f"  {i}. {reason}\n"
+            parts.append(f"  {i}. {reason}\n")
         
-        explanation += f"""
+        parts.append(f"""
 All Product Features:
-  • {', '.join(recommendation.product.features)}
+  • {', '.join(product.features)}
 
 Your Matching Features:
   • {', '.join(recommendation.matching_features) if recommendation.matching_features else 'None'}
-"""
-        return explanation
+""")
+        return parts
+
+
+# ============================================================================
+# BATCH WORKERS
+# ============================================================================
+
+# Engine used by batch worker processes, set once per worker
+_batch_engine = None
+
+
+def _init_batch_worker(engine: RecommendationEngine):
+    """Store the engine in a freshly started worker process."""
+    global _batch_engine
+    _batch_engine = engine
+
+
+def _recommend_chunk(
+    users: List[UserPreference],
+    num_recommendations: int
+) -> List[List[Recommendation]]:
+    """Recommend products for a chunk of users inside a worker process."""
+    return [_batch_engine.recommend_products(user, num_recommendations) for user in users]
+
+
+def _chunked(items: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most ``size`` items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 # ============================================================================
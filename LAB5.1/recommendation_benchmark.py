@@ -0,0 +1,536 @@
+"""
+Recommendation System Benchmarks
+Measures catalog memory and the throughput, latency and memory of each scoring path
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Callable, Dict, Iterator, List, Sequence, TextIO, Tuple
+
+from product_recommendation import (
+    Category,
+    CoPurchaseModel,
+    DiversityPolicy,
+    FeatureLSHIndex,
+    Product,
+    ProductDatabase,
+    Recommendation,
+    RecommendationCache,
+    RecommendationEngine,
+    UserPreference,
+    np,
+)
+from recommendation_service import LatencyTracker
+
+
+# ============================================================================
+# SYNTHETIC DATA
+# ============================================================================
+
+FEATURE_POOL_SIZE = 500
+PRICE_DISTRIBUTIONS = ("uniform", "lognormal")
+
+
+class ZipfSampler:
+    """
+    Draws ranks 0..size-1 with probability proportional to 1 / (rank + 1) ** s.
+    
+    An exponent of 0 gives a uniform distribution; around 1 a few ranks
+    dominate, as feature tags and product popularity do in real catalogs.
+    """
+    
+    def __init__(self, size: int, exponent: float):
+        self.size = size
+        self._cumulative = list(accumulate(1.0 / (rank + 1) ** exponent for rank in range(size)))
+    
+    def sample(self, rng: random.Random) -> int:
+        """Draw one rank."""
+        return min(bisect_left(self._cumulative, rng.random() * self._cumulative[-1]), self.size - 1)
+
+
+def generate_products(
+    count: int,
+    seed: int = 0,
+    feature_pool: int = FEATURE_POOL_SIZE,
+    feature_skew: float = 0.0,
+    price_distribution: str = "uniform"
+) -> Iterator[Product]:
+    """
+    Generate synthetic products.
+    
+    Feature strings are built fresh for every product, like strings parsed
+    from a catalog file, so the list layout pays for repeated strings.
+    
+    Args:
+        count: Number of products
+        seed: Random seed
+        feature_pool: Number of distinct features
+        feature_skew: Zipf exponent of feature popularity (0 = uniform)
+        price_distribution: "uniform" ($5-$500) or "lognormal" (median
+            about $40 with a long tail of expensive products)
+    
+    Yields:
+        Products with IDs 1..count
+    """
+    if price_distribution not in PRICE_DISTRIBUTIONS:
+        raise ValueError(f"Unknown price distribution '{price_distribution}'")
+    
+    rng = random.Random(seed)
+    categories = list(Category)
+    features = ZipfSampler(feature_pool, feature_skew)
+    
+    for product_id in range(1, count + 1):
+        if price_distribution == "lognormal":
+            price = round(min(max(rng.lognormvariate(3.7, 1.0), 1.0), 5000.0), 2)
+        else:
+            price = round(rng.uniform(5.0, 500.0), 2)
+        
+        yield Product(
+            product_id=product_id,
+            name=f"Product {product_id}",
+            category=rng.choice(categories),
+            price=price,
+            rating=round(rng.uniform(3.0, 5.0), 1),
+            description=f"Synthetic product number {product_id}",
+            features=[
+                f"feature-{features.sample(rng)}"
+                for _ in range(rng.randint(2, 6))
+            ]
+        )
+
+
+def generate_users(
+    count: int,
+    product_count: int,
+    seed: int = 0,
+    feature_pool: int = FEATURE_POOL_SIZE,
+    feature_skew: float = 0.0,
+    history_length: int = 20,
+    product_skew: float = 1.0,
+    profiles: int = 0
+) -> List[UserPreference]:
+    """
+    Generate a synthetic user population.
+    
+    Args:
+        count: Number of users
+        product_count: Catalog size (product IDs are 1..product_count)
+        seed: Random seed
+        feature_pool: Number of distinct features
+        feature_skew: Zipf exponent of preferred-feature popularity
+        history_length: Mean purchase history length (exponentially
+            distributed, so some histories are several times longer)
+        product_skew: Zipf exponent of product popularity in histories
+        profiles: When > 0, users share this many preference profiles and
+            differ only in their histories (as cached segments would)
+    
+    Returns:
+        List of users with IDs 1..count
+    """
+    rng = random.Random(seed)
+    categories = list(Category)
+    features = ZipfSampler(feature_pool, feature_skew)
+    products = ZipfSampler(product_count, product_skew)
+    
+    def make_profile():
+        budget_max = round(rng.choice([50.0, 100.0, 200.0, 500.0, 1000.0]) * rng.uniform(0.8, 1.2), 2)
+        return {
+            'budget_min': round(budget_max * rng.choice([0.0, 0.1, 0.25]), 2),
+            'budget_max': budget_max,
+            'preferred_categories': rng.sample(categories, rng.randint(1, 3)),
+            'preferred_features': list({f"feature-{features.sample(rng)}" for _ in range(rng.randint(2, 8))}),
+            'minimum_rating': rng.choice([3.0, 3.5, 4.0, 4.5]),
+        }
+    
+    shared = [make_profile() for _ in range(profiles)]
+    users = []
+    for user_id in range(1, count + 1):
+        profile = rng.choice(shared) if shared else make_profile()
+        length = min(int(rng.expovariate(1 / history_length)) if history_length else 0, product_count)
+        history = list({products.sample(rng) + 1 for _ in range(length)})
+        users.append(UserPreference(
+            user_id=user_id,
+            name=f"User {user_id}",
+            purchase_history=history,
+            **profile
+        ))
+    return users
+
+
+# ============================================================================
+# MEMORY BENCHMARK
+# ============================================================================
+
+def measure_catalog_memory(count: int, compact: bool) -> Dict:
+    """
+    Measure the memory held by a ProductDatabase, including its indexes.
+    
+    Args:
+        count: Number of products
+        compact: Use the compact struct-of-arrays layout
+    
+    Returns:
+        Dictionary with the layout, product count and bytes used
+    """
+    gc.collect()
+    tracemalloc.start()
+    database = ProductDatabase(generate_products(count), compact=compact)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        'layout': 'compact' if compact else 'dataclass',
+        'products': len(database.get_all_products()),
+        'bytes': current,
+        'peak_bytes': peak,
+        'bytes_per_product': current / max(count, 1),
+    }
+
+
+def run_memory_benchmark(sizes: List[int], output: TextIO = None) -> List[Dict]:
+    """
+    Compare both catalog layouts at each size.
+    
+    Args:
+        sizes: Catalog sizes to measure
+        output: Stream the table is printed to as results come in
+            (default: stdout)
+    
+    Returns:
+        List of measurement dictionaries
+    """
+    results = []
+    output = output or sys.stdout
+    
+    print(f"{'Layout':<10} {'Products':>10} {'Memory (MB)':>12} {'Peak (MB)':>10} {'Bytes/product':>14}",
+          file=output)
+    print("-" * 60, file=output)
+    
+    for size in sizes:
+        for compact in (False, True):
+            result = measure_catalog_memory(size, compact)
+            results.append(result)
+            print(f"{result['layout']:<10} {result['products']:>10,} "
+                  f"{result['bytes'] / 1e6:>12.1f} {result['peak_bytes'] / 1e6:>10.1f} "
+                  f"{result['bytes_per_product']:>14.0f}", file=output)
+    
+    return results
+
+
+# ============================================================================
+# THROUGHPUT BENCHMARK
+# ============================================================================
+
+def _python_engine(database: ProductDatabase, users: List[UserPreference]) -> RecommendationEngine:
+    return RecommendationEngine(database)
+
+
+def _numpy_engine(database: ProductDatabase, users: List[UserPreference]) -> RecommendationEngine:
+    return RecommendationEngine(database, backend="numpy")
+
+
+def _cached_engine(database: ProductDatabase, users: List[UserPreference]) -> RecommendationEngine:
+    return RecommendationEngine(database, cache=RecommendationCache())
+
+
+def _lsh_engine(database: ProductDatabase, users: List[UserPreference]) -> RecommendationEngine:
+    return RecommendationEngine(database, retriever=FeatureLSHIndex(database))
+
+
+def _copurchase_engine(database: ProductDatabase, users: List[UserPreference]) -> RecommendationEngine:
+    model = CoPurchaseModel.from_histories(user.purchase_history for user in users)
+    return RecommendationEngine(database, copurchase=model)
+
+
+def _diverse_engine(database: ProductDatabase, users: List[UserPreference]) -> RecommendationEngine:
+    return RecommendationEngine(database, diversity=DiversityPolicy())
+
+
+# Scoring path name -> factory(database, users) building a ready engine
+SCORING_PATHS: Dict[str, Callable[[ProductDatabase, List[UserPreference]], RecommendationEngine]] = {
+    'python': _python_engine,
+    'numpy': _numpy_engine,
+    'cached': _cached_engine,
+    'lsh': _lsh_engine,
+    'copurchase': _copurchase_engine,
+    'diverse': _diverse_engine,
+}
+
+
+def list_diversity(recommendations: List[Recommendation]) -> Tuple[int, float]:
+    """
+    Measure how varied one recommendation list is.
+    
+    Returns:
+        Tuple of (distinct categories, mean Jaccard similarity of the
+        feature sets over all pairs of products)
+    """
+    features = [set(recommendation.product.features) for recommendation in recommendations]
+    pairs = 0
+    total = 0.0
+    for i in range(len(features)):
+        for j in range(i + 1, len(features)):
+            union = len(features[i] | features[j])
+            total += len(features[i] & features[j]) / union if union else 1.0
+            pairs += 1
+    categories = len({recommendation.product.category for recommendation in recommendations})
+    return categories, total / pairs if pairs else 0.0
+
+
+def measure_scoring_path(
+    path: str,
+    database: ProductDatabase,
+    users: List[UserPreference],
+    num_recommendations: int = 10,
+    memory_users: int = 100
+) -> Dict:
+    """
+    Measure one scoring path.
+    
+    Users are timed one request at a time. Peak memory is measured in a
+    separate pass over the first ``memory_users`` users, because tracing
+    allocations slows the interpreter down.
+    
+    Args:
+        path: Name in SCORING_PATHS
+        database: Catalog to recommend from
+        users: Users to recommend for
+        num_recommendations: Products per request
+        memory_users: Users in the memory pass (0 = skip it)
+    
+    Returns:
+        Dictionary with setup time, recommendations per second, latency
+        percentiles, list diversity and peak memory
+    """
+    factory = SCORING_PATHS[path]
+    
+    start = time.perf_counter()
+    engine = factory(database, users)
+    engine.recommend_products(users[0], num_recommendations)  # build lazy structures
+    setup_seconds = time.perf_counter() - start
+    
+    latency = LatencyTracker(window=len(users))
+    lists = []
+    start = time.perf_counter()
+    for user in users:
+        request_start = time.perf_counter()
+        lists.append(engine.recommend_products(user, num_recommendations))
+        latency.record(time.perf_counter() - request_start)
+    elapsed = time.perf_counter() - start
+    
+    diversity = [list_diversity(recommendations) for recommendations in lists]
+    del lists
+    
+    result = {
+        'path': path,
+        'users': len(users),
+        'setup_seconds': setup_seconds,
+        'recommendations_per_second': len(users) / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'mean': elapsed / len(users) * 1000,
+            'p50': latency.percentile(50) * 1000,
+            'p95': latency.percentile(95) * 1000,
+            'p99': latency.percentile(99) * 1000,
+            'max': latency.percentile(100) * 1000,
+        },
+        'diversity': {
+            'mean_categories': sum(categories for categories, _ in diversity) / len(users),
+            'mean_feature_similarity': sum(similarity for _, similarity in diversity) / len(users),
+        },
+    }
+    del engine
+    
+    if memory_users:
+        gc.collect()
+        tracemalloc.start()
+        engine = factory(database, users)
+        for user in users[:memory_users]:
+            engine.recommend_products(user, num_recommendations)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_memory_bytes'] = peak
+    
+    return result
+
+
+def run_throughput_benchmark(
+    products: int,
+    users: int,
+    paths: Sequence[str],
+    num_recommendations: int = 10,
+    feature_pool: int = FEATURE_POOL_SIZE,
+    feature_skew: float = 1.0,
+    price_distribution: str = "lognormal",
+    history_length: int = 20,
+    profiles: int = 0,
+    memory_users: int = 100,
+    compact: bool = False,
+    seed: int = 0
+) -> Dict:
+    """
+    Benchmark every requested scoring path on one synthetic workload.
+    
+    Args:
+        products: Catalog size
+        users: Number of users (requests) per path
+        paths: Names in SCORING_PATHS
+        num_recommendations: Products per request
+        feature_pool: Number of distinct features
+        feature_skew: Zipf exponent of feature popularity
+        price_distribution: See generate_products
+        history_length: Mean purchase history length
+        profiles: Shared preference profiles (0 = every user is unique)
+        memory_users: Users in the memory pass of each path
+        compact: Use the compact catalog layout
+        seed: Random seed
+    
+    Returns:
+        Report with the environment, the workload and one result per path
+    """
+    unknown = [path for path in paths if path not in SCORING_PATHS]
+    if unknown:
+        raise ValueError(f"Unknown scoring paths {unknown}, expected some of {list(SCORING_PATHS)}")
+    
+    database = ProductDatabase(
+        generate_products(products, seed, feature_pool, feature_skew, price_distribution),
+        compact=compact
+    )
+    population = generate_users(
+        users, products, seed + 1, feature_pool, feature_skew, history_length, profiles=profiles
+    )
+    
+    results = []
+    for path in paths:
+        if path == 'numpy' and np is None:
+            results.append({'path': path, 'skipped': "NumPy is not installed"})
+            continue
+        results.append(measure_scoring_path(
+            path, database, population, num_recommendations, memory_users
+        ))
+    
+    return {
+        'benchmark': 'throughput',
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'numpy': np.__version__ if np is not None else None,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'workload': {
+            'products': products,
+            'users': users,
+            'num_recommendations': num_recommendations,
+            'feature_pool': feature_pool,
+            'feature_skew': feature_skew,
+            'price_distribution': price_distribution,
+            'history_length': history_length,
+            'profiles': profiles,
+            'compact': compact,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def print_throughput_report(report: Dict, output: TextIO = None):
+    """Print a throughput report as a table (to stdout by default)."""
+    output = output or sys.stdout
+    print(f"{'Path':<12} {'Recs/s':>10} {'p50 (ms)':>10} {'p95 (ms)':>10} "
+          f"{'p99 (ms)':>10} {'Peak (MB)':>10} {'Setup (s)':>10} {'Categories':>11} {'Similarity':>11}",
+          file=output)
+    print("-" * 101, file=output)
+    for result in report['results']:
+        if 'skipped' in result:
+            print(f"{result['path']:<12} skipped: {result['skipped']}", file=output)
+            continue
+        latency = result['latency_ms']
+        peak = result.get('peak_memory_bytes')
+        print(f"{result['path']:<12} {result['recommendations_per_second']:>10.1f} "
+              f"{latency['p50']:>10.2f} {latency['p95']:>10.2f} {latency['p99']:>10.2f} "
+              f"{peak / 1e6 if peak is not None else math.nan:>10.1f} "
+              f"{result['setup_seconds']:>10.2f} "
+              f"{result['diversity']['mean_categories']:>11.2f} "
+              f"{result['diversity']['mean_feature_similarity']:>11.3f}", file=output)
+
+
+# ============================================================================
+# MAIN PROGRAM
+# ============================================================================
+
+def main():
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--suite',
+        choices=('memory', 'throughput'),
+        default='memory',
+        help="Benchmark to run (default: memory)"
+    )
+    parser.add_argument(
+        '--sizes',
+        default='100000,1000000',
+        help="Memory suite: comma-separated catalog sizes (default: 100000,1000000)"
+    )
+    parser.add_argument('--products', type=int, default=100000, help="Throughput suite: catalog size")
+    parser.add_argument('--users', type=int, default=1000, help="Throughput suite: requests per path")
+    parser.add_argument(
+        '--paths',
+        default=','.join(SCORING_PATHS),
+        help=f"Throughput suite: comma-separated scoring paths (default: {','.join(SCORING_PATHS)})"
+    )
+    parser.add_argument('--recommendations', type=int, default=10, help="Products per request")
+    parser.add_argument('--feature-pool', type=int, default=FEATURE_POOL_SIZE, help="Distinct features")
+    parser.add_argument('--feature-skew', type=float, default=1.0, help="Zipf exponent of feature popularity")
+    parser.add_argument('--prices', choices=PRICE_DISTRIBUTIONS, default='lognormal', help="Price distribution")
+    parser.add_argument('--history', type=int, default=20, help="Mean purchase history length")
+    parser.add_argument('--profiles', type=int, default=0, help="Shared preference profiles (0 = all unique)")
+    parser.add_argument('--memory-users', type=int, default=100, help="Users in the peak-memory pass")
+    parser.add_argument('--compact', action='store_true', help="Use the compact catalog layout")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', metavar='PATH',
+                        help="Also write the results as JSON ('-' for stdout; the table then goes to stderr)")
+    args = parser.parse_args()
+    # Keep stdout parseable when the JSON goes there
+    table_output = sys.stderr if args.json == '-' else sys.stdout
+    
+    if args.suite == 'memory':
+        sizes = [int(size) for size in args.sizes.split(',')]
+        report = {'benchmark': 'memory', 'results': run_memory_benchmark(sizes, table_output)}
+    else:
+        report = run_throughput_benchmark(
+            products=args.products,
+            users=args.users,
+            paths=[path for path in args.paths.split(',') if path],
+            num_recommendations=args.recommendations,
+            feature_pool=args.feature_pool,
+            feature_skew=args.feature_skew,
+            price_distribution=args.prices,
+            history_length=args.history,
+            profiles=args.profiles,
+            memory_users=args.memory_users,
+            compact=args.compact,
+            seed=args.seed
+        )
+        print_throughput_report(report, table_output)
+    
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
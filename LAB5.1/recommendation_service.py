@@ -0,0 +1,796 @@
+"""
+Recommendation Service
+Asyncio HTTP front end that coalesces concurrent requests into micro-batches
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import random
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from product_recommendation import (
+    Category,
+    ProductDatabase,
+    Recommendation,
+    RecommendationCache,
+    RecommendationEngine,
+    UserPreference,
+    _init_batch_worker,
+    _recommend_chunk,
+    create_sample_user_1,
+    create_sample_user_2,
+    create_sample_user_3,
+)
+
+
+# Largest request body accepted, and most recommendations per request
+MAX_BODY_BYTES = 1024 * 1024
+MAX_RECOMMENDATIONS = 100
+
+_CATEGORY_LOOKUP = {category.value: category for category in Category}
+_CATEGORY_LOOKUP.update({category.name: category for category in Category})
+
+_STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+# ============================================================================
+# PAYLOADS
+# ============================================================================
+
+def user_from_payload(payload: Mapping) -> UserPreference:
+    """
+    Validate a JSON request payload and convert it to a UserPreference.
+    
+    Categories may be given by value ("Electronics") or name ("ELECTRONICS").
+    Only the budget is required.
+    
+    Args:
+        payload: Decoded JSON object
+    
+    Returns:
+        The user preferences
+    
+    Raises:
+        ValueError: If a field is missing or invalid
+    """
+    if not isinstance(payload, Mapping):
+        raise ValueError("request body must be a JSON object")
+    
+    try:
+        user_id = int(payload.get("user_id", 0))
+        name = str(payload.get("name") or "")
+        budget_min = float(payload["budget_min"])
+        budget_max = float(payload["budget_max"])
+        minimum_rating = float(payload.get("minimum_rating", 0.0))
+        categories = payload.get("preferred_categories") or []
+        features = payload.get("preferred_features") or []
+        purchase_history = payload.get("purchase_history") or []
+    except KeyError as e:
+        raise ValueError(f"missing field {e}") from None
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid value ({e})") from None
+    
+    if not (math.isfinite(budget_min) and math.isfinite(budget_max)):
+        raise ValueError("budget must be a finite number")
+    if budget_min > budget_max:
+        raise ValueError("budget_min cannot exceed budget_max")
+    # The rating bonus divides by 5 - minimum_rating
+    if not 0 <= minimum_rating < 5:
+        raise ValueError("minimum_rating must be at least 0 and below 5")
+    
+    if not isinstance(categories, list) or not isinstance(features, list):
+        raise ValueError("preferred_categories and preferred_features must be lists")
+    
+    preferred_categories = []
+    for category_text in categories:
+        category = _CATEGORY_LOOKUP.get(category_text) if isinstance(category_text, str) else None
+        if category is None:
+            raise ValueError(f"unknown category '{category_text}'")
+        preferred_categories.append(category)
+    
+    if not all(isinstance(feature, str) for feature in features):
+        raise ValueError("preferred_features must be strings")
+    
+    if not isinstance(purchase_history, list) or not all(
+        isinstance(product_id, int) and not isinstance(product_id, bool)
+        for product_id in purchase_history
+    ):
+        raise ValueError("purchase_history must be a list of integer product IDs")
+    
+    return UserPreference(
+        user_id=user_id,
+        name=name,
+        budget_min=budget_min,
+        budget_max=budget_max,
+        preferred_categories=preferred_categories,
+        preferred_features=list(features),
+        purchase_history=list(purchase_history),
+        minimum_rating=minimum_rating
+    )
+
+
+def user_to_payload(user: UserPreference) -> Dict:
+    """Convert a UserPreference to its JSON request payload."""
+    return {
+        "user_id": user.user_id,
+        "name": user.name,
+        "budget_min": user.budget_min,
+        "budget_max": user.budget_max,
+        "preferred_categories": [category.value for category in user.preferred_categories],
+        "preferred_features": list(user.preferred_features),
+        "purchase_history": list(user.purchase_history),
+        "minimum_rating": user.minimum_rating,
+    }
+
+
+def recommendation_to_payload(recommendation: Recommendation) -> Dict:
+    """Convert a Recommendation to a JSON-serializable dictionary."""
+    product = recommendation.product
+    return {
+        "product_id": product.product_id,
+        "name": product.name,
+        "category": product.category.value,
+        "price": product.price,
+        "rating": product.rating,
+        "match_score": recommendation.match_score,
+        "reasons": list(recommendation.reasons),
+        "matching_features": list(recommendation.matching_features),
+    }
+
+
+# ============================================================================
+# LATENCY TRACKING
+# ============================================================================
+
+class LatencyTracker:
+    """
+    Request latencies over a sliding window of the most recent requests.
+    """
+    
+    def __init__(self, window: int = 10000):
+        self._samples = deque(maxlen=window)
+        self.count = 0
+    
+    def record(self, seconds: float):
+        """Record the latency of one request."""
+        self._samples.append(seconds)
+        self.count += 1
+    
+    def percentile(self, percent: float) -> float:
+        """
+        Latency below which the given share of recent requests completed.
+        
+        Args:
+            percent: Percentile between 0 and 100
+        
+        Returns:
+            Latency in seconds (0.0 before the first request)
+        """
+        return _nearest_rank(sorted(self._samples), percent)
+    
+    def summary(self) -> Dict[str, float]:
+        """Return the p50, p99 and maximum latency in milliseconds."""
+        ordered = sorted(self._samples)
+        return {
+            'p50_ms': _nearest_rank(ordered, 50) * 1000,
+            'p99_ms': _nearest_rank(ordered, 99) * 1000,
+            'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+        }
+
+
+def _nearest_rank(ordered: List[float], percent: float) -> float:
+    """Nearest-rank percentile of a sorted list (0.0 when empty)."""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(ordered)) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+# ============================================================================
+# MICRO-BATCHING SERVICE
+# ============================================================================
+
+class RecommendationService:
+    """
+    Asynchronous front end for a RecommendationEngine.
+    
+    Concurrent requests are queued and coalesced into micro-batches: a
+    batch is dispatched as soon as a worker is free, taking everything that
+    arrived in the meantime (up to ``max_batch_size``), optionally waiting
+    ``max_wait_ms`` for more. Scoring runs in an executor so the event loop
+    only parses requests and writes responses.
+    
+    By default one worker thread scores batches against the live database,
+    so catalog updates are seen immediately. With ``processes`` > 1 batches
+    are scored in forked worker processes that hold a copy of the catalog
+    taken at start-up.
+    
+    Batching saves executor hand-offs and event loop wake-ups, not scoring
+    work: each request in a batch is still ranked by its own
+    ``recommend_products`` call (vectorized over products with the NumPy
+    backend, not across users). A request that fails is answered with its
+    own error; the rest of its batch is unaffected.
+    """
+    
+    def __init__(
+        self,
+        engine: RecommendationEngine,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 1.0,
+        processes: int = 0,
+        executor: Executor = None
+    ):
+        """
+        Args:
+            engine: Engine used to score requests
+            max_batch_size: Most requests scored together
+            max_wait_ms: Extra time to wait for a batch to fill (0 = none)
+            processes: Worker processes (0 or 1 scores in a thread)
+            executor: Executor to use instead of creating one; the caller
+                owns it and must shut it down
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.processes = processes
+        self.latency = LatencyTracker()
+        self.batches = 0
+        self.batched_requests = 0
+        
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._workers = max(processes, 1)
+        self._queue = None
+        self._slots = None
+        self._batcher = None
+        self._running = set()
+    
+    @property
+    def running(self) -> bool:
+        """Whether the service accepts requests."""
+        return self._batcher is not None
+    
+    async def start(self):
+        """Create the executor and start the batching task."""
+        if self.running:
+            return
+        
+        if self._executor is None:
+            if self.processes > 1:
+                if "fork" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("fork")
+                else:
+                    context = multiprocessing.get_context()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=context,
+                    initializer=_init_batch_worker,
+                    initargs=(self.engine,)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix="recommend"
+                )
+        
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self._workers)
+        self._batcher = asyncio.create_task(self._batch_loop())
+    
+    async def stop(self):
+        """Finish queued requests, then stop the batching task and executor."""
+        if not self.running:
+            return
+        
+        # Every queued request is marked done once its batch is dispatched
+        await self._queue.join()
+        while self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        self._batcher = None
+        
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+    
+    async def __aenter__(self):
+        await self.start()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.stop()
+    
+    async def recommend(
+        self,
+        user: UserPreference,
+        num_recommendations: int = 5
+    ) -> List[Recommendation]:
+        """
+        Recommend products for one user.
+        
+        The request joins the next micro-batch; the result is identical to
+        calling ``engine.recommend_products`` directly.
+        
+        Args:
+            user: User preferences
+            num_recommendations: Number of products to recommend
+        
+        Returns:
+            List of recommendations sorted by match score
+        """
+        if not self.running:
+            raise RuntimeError("service is not running")
+        
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((user, num_recommendations, future, time.perf_counter()))
+        return await future
+    
+    def stats(self) -> Dict[str, float]:
+        """Return request, batching and latency statistics."""
+        stats = {
+            'requests': self.latency.count,
+            'batches': self.batches,
+            'average_batch_size': self.batched_requests / self.batches if self.batches else 0.0,
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+        }
+        stats.update(self.latency.summary())
+        if self.engine.instrumentation is not None:
+            stats['engine'] = self.engine.instrumentation.stats.summary()
+        return stats
+    
+    async def _batch_loop(self):
+        """Collect queued requests into batches and dispatch them."""
+        while True:
+            # Wait for a free worker first: requests arriving meanwhile
+            # accumulate in the queue and join the next batch
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self.max_batch_size and self.max_wait > 0:
+                await asyncio.sleep(self.max_wait)
+                self._drain(batch)
+            
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._batch_done)
+            for _ in batch:
+                self._queue.task_done()
+    
+    def _drain(self, batch: List):
+        """Move queued requests into the batch, up to the size limit."""
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+    
+    def _batch_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._slots.release()
+    
+    async def _run_batch(self, batch: List[Tuple]):
+        """Score one batch in the executor and resolve its futures."""
+        self.batches += 1
+        self.batched_requests += len(batch)
+        
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[1], []).append(item)
+        
+        for num_recommendations, items in groups.items():
+            try:
+                await self._score_group(items, num_recommendations)
+            except Exception:
+                # Score the requests one at a time, so only the failing one
+                # gets the error
+                for item in items:
+                    try:
+                        await self._score_group([item], num_recommendations)
+                    except Exception as e:
+                        if not item[2].done():
+                            item[2].set_exception(e)
+    
+    async def _score_group(self, items: List[Tuple], num_recommendations: int):
+        """
+        Score requests for the same number of recommendations in the
+        executor and resolve their futures.
+        
+        Raises:
+            Exception: Whatever scoring raised; no future is resolved then
+        """
+        loop = asyncio.get_running_loop()
+        users = [item[0] for item in items]
+        if self.processes > 1:
+            results = await loop.run_in_executor(
+                self._executor, _recommend_chunk, users, num_recommendations
+            )
+        else:
+            results = await loop.run_in_executor(
+                self._executor, self._score, users, num_recommendations
+            )
+        
+        finished = time.perf_counter()
+        for (_, _, future, started), result in zip(items, results):
+            self.latency.record(finished - started)
+            if not future.done():
+                future.set_result(result)
+    
+    def _score(
+        self,
+        users: List[UserPreference],
+        num_recommendations: int
+    ) -> List[List[Recommendation]]:
+        """Score a group of users in the worker thread."""
+        return list(self.engine.recommend_batch(users, num_recommendations, workers=1))
+
+
+# ============================================================================
+# HTTP FRONT END
+# ============================================================================
+
+class RecommendationHTTPServer:
+    """
+    Minimal HTTP/1.1 server exposing a RecommendationService.
+    
+    Endpoints:
+        POST /recommend  body: user payload, optionally with
+                         "num_recommendations"; returns recommendations
+        GET  /stats      batching and latency statistics
+        GET  /health     liveness check
+    """
+    
+    def __init__(self, service: RecommendationService):
+        self.service = service
+        self._server = None
+        self._connections = {}
+    
+    @property
+    def port(self) -> int:
+        """Port the server is bound to (useful when started on port 0)."""
+        return self._server.sockets[0].getsockname()[1]
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        """Start the service and listen for connections."""
+        await self.service.start()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+    
+    async def stop(self):
+        """
+        Stop accepting connections, answer queued requests, then close
+        the remaining connections and shut the service down.
+        """
+        if self._server is not None:
+            self._server.close()
+        await self.service.stop()
+        
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+    
+    async def serve_forever(self):
+        """Serve until cancelled."""
+        async with self._server:
+            await self._server.serve_forever()
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one connection, honouring keep-alive."""
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except ValueError as e:
+                    # The stream cannot be parsed past a malformed head
+                    _write_response(writer, 400, {'error': str(e)}, False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, keep_alive, body = request
+                
+                if body is None:
+                    status, payload = 413, {'error': "request body too large"}
+                    keep_alive = False
+                else:
+                    status, payload = await self._dispatch(method, path, body)
+                
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            del self._connections[task]
+            writer.close()
+    
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        """Route a request and return (status, JSON payload)."""
+        path = path.split('?', 1)[0]
+        
+        if path == "/recommend":
+            if method != "POST":
+                return 405, {'error': "use POST"}
+            try:
+                payload = json.loads(body or b"null")
+                user = user_from_payload(payload)
+                num_recommendations = int(payload.get("num_recommendations", 5))
+            except (ValueError, TypeError) as e:
+                return 400, {'error': str(e)}
+            if not 1 <= num_recommendations <= MAX_RECOMMENDATIONS:
+                return 400, {'error': f"num_recommendations must be between 1 and {MAX_RECOMMENDATIONS}"}
+            
+            try:
+                recommendations = await self.service.recommend(user, num_recommendations)
+            except RuntimeError as e:
+                return 503, {'error': str(e)}
+            except Exception as e:
+                return 500, {'error': f"recommendation failed: {e}"}
+            return 200, {
+                'user_id': user.user_id,
+                'recommendations': [recommendation_to_payload(r) for r in recommendations],
+            }
+        
+        if method != "GET" and path in ("/stats", "/health"):
+            return 405, {'error': "use GET"}
+        if path == "/stats":
+            return 200, self.service.stats()
+        if path == "/health":
+            return 200, {'status': "ok"}
+        
+        return 404, {'error': f"unknown path {path}"}
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bool, Optional[bytes]]]:
+    """
+    Read one HTTP request.
+    
+    Returns:
+        (method, path, keep_alive, body), with body None when it exceeds
+        MAX_BODY_BYTES, or None when the client closed the connection
+    
+    Raises:
+        ValueError: If the request line or Content-Length is malformed
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise
+        return None
+    
+    lines = head.decode("latin-1").split("\r\n")
+    request_line = lines[0].split(" ")
+    if len(request_line) != 3 or not request_line[2].startswith("HTTP/"):
+        raise ValueError(f"malformed request line {lines[0]!r}")
+    method, path, version = request_line
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        keep_alive = connection != "close"
+    else:
+        keep_alive = connection == "keep-alive"
+    
+    length = headers.get("content-length", "0")
+    if not length.isdigit():
+        raise ValueError(f"invalid Content-Length {length!r}")
+    length = int(length)
+    if length > MAX_BODY_BYTES:
+        return method, path, False, None
+    body = await reader.readexactly(length) if length else b""
+    return method, path, keep_alive, body
+
+
+def _write_response(writer: asyncio.StreamWriter, status: int, payload: Dict, keep_alive: bool):
+    """Write a JSON response."""
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        f"\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+# ============================================================================
+# LOCAL CLIENT & LOAD TEST
+# ============================================================================
+
+class RecommendationClient:
+    """Keep-alive HTTP client for a local RecommendationHTTPServer."""
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+    
+    async def request(self, method: str, path: str, payload: Dict = None) -> Tuple[int, Dict]:
+        """
+        Send one request and return (status, decoded JSON body).
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self._writer.write(
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"\r\n".encode("latin-1") + body
+        )
+        await self._writer.drain()
+        
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        
+        response = await self._reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, json.loads(response)
+    
+    async def recommend(self, user: UserPreference, num_recommendations: int = 5) -> Dict:
+        """Request recommendations for a user; raises RuntimeError on errors."""
+        payload = user_to_payload(user)
+        payload["num_recommendations"] = num_recommendations
+        status, response = await self.request("POST", "/recommend", payload)
+        if status != 200:
+            raise RuntimeError(f"HTTP {status}: {response.get('error')}")
+        return response
+    
+    async def close(self):
+        """Close the connection."""
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._reader = self._writer = None
+
+
+async def run_load_test(
+    host: str,
+    port: int,
+    requests: int = 1000,
+    concurrency: int = 32,
+    seed: int = 0
+) -> Dict:
+    """
+    Send concurrent requests built from the sample users to a server.
+    
+    Args:
+        host: Server host
+        port: Server port
+        requests: Total number of requests
+        concurrency: Number of simultaneous client connections
+        seed: Random seed for the budgets
+    
+    Returns:
+        The server's /stats after the run, plus client-side throughput
+    """
+    rng = random.Random(seed)
+    samples = [create_sample_user_1(), create_sample_user_2(), create_sample_user_3()]
+    users = []
+    for request_id in range(requests):
+        user = samples[request_id % len(samples)]
+        payload = user_to_payload(user)
+        payload["user_id"] = request_id
+        payload["budget_max"] = round(payload["budget_max"] * rng.uniform(0.5, 1.5), 2)
+        payload["budget_min"] = min(payload["budget_min"], payload["budget_max"])
+        users.append(payload)
+    
+    async def worker(offset):
+        client = RecommendationClient(host, port)
+        try:
+            for payload in users[offset::concurrency]:
+                status, response = await client.request("POST", "/recommend", payload)
+                if status != 200:
+                    raise RuntimeError(f"HTTP {status}: {response.get('error')}")
+        finally:
+            await client.close()
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    client = RecommendationClient(host, port)
+    _, stats = await client.request("GET", "/stats")
+    await client.close()
+    stats['requests_per_second'] = requests / elapsed if elapsed else 0.0
+    return stats
+
+
+# ============================================================================
+# MAIN PROGRAM
+# ============================================================================
+
+async def _serve(args):
+    engine = RecommendationEngine(
+        ProductDatabase(),
+        backend=args.backend,
+        cache=RecommendationCache() if args.cache else None
+    )
+    service = RecommendationService(
+        engine,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        processes=args.processes
+    )
+    server = RecommendationHTTPServer(service)
+    await server.start(args.host, args.port)
+    print(f"Serving recommendations on http://{args.host}:{server.port}")
+    
+    try:
+        if args.load_test:
+            stats = await run_load_test(args.host, server.port, args.load_test, args.concurrency)
+            print(json.dumps(stats, indent=2))
+        else:
+            await server.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main():
+    """Run the recommendation service."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1', help="Address to bind (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Port to bind, 0 for any (default: 8080)")
+    parser.add_argument('--backend', choices=RecommendationEngine.BACKENDS, default='python')
+    parser.add_argument('--cache', action='store_true', help="Enable the result cache")
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=1.0)
+    parser.add_argument('--processes', type=int, default=0, help="Worker processes (default: one thread)")
+    parser.add_argument(
+        '--load-test',
+        type=int,
+        default=0,
+        metavar='N',
+        help="Send N requests from a local client, print the statistics and exit"
+    )
+    parser.add_argument('--concurrency', type=int, default=32, help="Client connections for --load-test")
+    args = parser.parse_args()
+    
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
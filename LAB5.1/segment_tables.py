@@ -0,0 +1,383 @@
+"""
+Precomputed Segment Tables
+Ranks the catalog offline for every user segment (category set, budget band,
+minimum-rating bucket) and stores the rankings in a compact binary table, so
+most online requests only filter and re-score a short candidate list
+"""
+
+import json
+import mmap
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from itertools import combinations
+from typing import Iterator, Optional, Sequence, Tuple
+
+from product_recommendation import (
+    CATEGORIES,
+    CATEGORY_CODES,
+    ProductDatabase,
+    RecommendationEngine,
+    ScoringProfile,
+    UserPreference,
+    np,
+)
+
+
+TABLE_MAGIC = b"SEGTABLE"
+TABLE_FORMAT_VERSION = 2
+
+# Upper bounds of the budget bands; a band covers budgets from $0 to its bound
+DEFAULT_BUDGET_BANDS = (25.0, 50.0, 100.0, 250.0, 500.0, 1000.0, 2500.0)
+
+# Lower bounds of the minimum-rating buckets
+DEFAULT_RATING_BUCKETS = (0.0, 3.0, 3.5, 4.0, 4.5)
+
+
+# ============================================================================
+# SEGMENTS
+# ============================================================================
+
+@dataclass(frozen=True, slots=True)
+class SegmentGrid:
+    """
+    How users are grouped into segments.
+    
+    A segment is a set of preferred categories (up to ``max_categories`` of
+    them), a budget band and a minimum-rating bucket. Its ranking is made
+    for the loosest user in it: budget $0 up to the band's bound and the
+    bucket's minimum rating, so every product a member of the segment may
+    see is eligible.
+    """
+    budget_bands: Tuple[float, ...] = DEFAULT_BUDGET_BANDS
+    rating_buckets: Tuple[float, ...] = DEFAULT_RATING_BUCKETS
+    max_categories: int = 2
+    
+    def __post_init__(self):
+        if list(self.budget_bands) != sorted(set(self.budget_bands)) or not self.budget_bands:
+            raise ValueError("Budget bands must be increasing")
+        if list(self.rating_buckets) != sorted(set(self.rating_buckets)) or not self.rating_buckets:
+            raise ValueError("Rating buckets must be increasing")
+        if not 0 <= self.max_categories <= len(CATEGORIES):
+            raise ValueError(f"max_categories must be between 0 and {len(CATEGORIES)}")
+        object.__setattr__(self, 'budget_bands', tuple(float(b) for b in self.budget_bands))
+        object.__setattr__(self, 'rating_buckets', tuple(float(b) for b in self.rating_buckets))
+    
+    def segment_of(self, user: UserPreference) -> Optional[int]:
+        """
+        Get the key of the segment a user belongs to.
+        
+        Returns:
+            Segment key, or None when the user is outside the grid (too
+            many categories, or a budget above the highest band)
+        """
+        mask = 0
+        for category in user.preferred_categories:
+            mask |= 1 << CATEGORY_CODES[category]
+        if bin(mask).count("1") > self.max_categories:
+            return None
+        
+        band = bisect_left(self.budget_bands, user.budget_max)
+        if band == len(self.budget_bands):
+            return None
+        bucket = bisect_right(self.rating_buckets, user.minimum_rating) - 1
+        if bucket < 0:
+            return None
+        return _segment_key(mask, band, bucket)
+    
+    def segments(self) -> Iterator[Tuple[int, UserPreference]]:
+        """
+        Enumerate the segments in key order.
+        
+        Yields:
+            (segment key, representative user) pairs
+        """
+        category_sets = [
+            categories
+            for size in range(self.max_categories + 1)
+            for categories in combinations(CATEGORIES, size)
+        ]
+        keyed = []
+        for categories in category_sets:
+            mask = sum(1 << CATEGORY_CODES[category] for category in categories)
+            for band, bound in enumerate(self.budget_bands):
+                for bucket, rating in enumerate(self.rating_buckets):
+                    keyed.append((_segment_key(mask, band, bucket), categories, bound, rating))
+        keyed.sort(key=lambda segment: segment[0])
+        
+        for key, categories, bound, rating in keyed:
+            yield key, UserPreference(
+                user_id=-1,
+                name=f"segment {key}",
+                budget_min=0.0,
+                budget_max=bound,
+                preferred_categories=list(categories),
+                preferred_features=[],
+                purchase_history=[],
+                minimum_rating=rating
+            )
+    
+    def to_dict(self) -> dict:
+        return {
+            'budget_bands': list(self.budget_bands),
+            'rating_buckets': list(self.rating_buckets),
+            'max_categories': self.max_categories,
+        }
+
+
+def _segment_key(mask: int, band: int, bucket: int) -> int:
+    """Pack a segment into one sortable integer."""
+    return (mask << 16) | (band << 8) | bucket
+
+
+def _typecode(column: Sequence[int]) -> str:
+    """Typecode of an array, or format of a memoryview cast from one."""
+    return column.typecode if isinstance(column, array) else column.format
+
+
+# ============================================================================
+# SEGMENT TABLE
+# ============================================================================
+
+class SegmentTable:
+    """
+    Precomputed candidate product IDs for every segment.
+    
+    Stored in CSR form: segment ``keys[i]`` owns
+    ``product_ids[offsets[i]:offsets[i + 1]]``, best first. Lookups are a
+    binary search over the keys, and tables loaded from disk are
+    memory-mapped, so opening one costs the same whatever its size.
+    
+    Pass a table to RecommendationEngine(segments=...); the engine scores
+    the user's candidates exactly (features included) and falls back to a
+    full search when the segment is missing or yields too few products.
+    """
+    
+    def __init__(
+        self,
+        grid: SegmentGrid,
+        depth: int,
+        keys: Sequence[int],
+        offsets: Sequence[int],
+        product_ids: Sequence[int],
+        catalog_fingerprint: str = ""
+    ):
+        """
+        Initialize a table from its columns.
+        
+        Args:
+            grid: Segmentation the table was built with
+            depth: Most candidates kept per segment
+            keys: Sorted segment keys
+            offsets: Start of each segment's candidates, plus the end
+            product_ids: Candidates of all segments, concatenated
+            catalog_fingerprint: ProductDatabase.fingerprint() of the
+                catalog the table was built from
+        """
+        self.grid = grid
+        self.depth = depth
+        self.keys = keys
+        self.offsets = offsets
+        self.product_ids = product_ids
+        self.catalog_fingerprint = catalog_fingerprint
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def candidates(self, user: UserPreference) -> Optional[Sequence[int]]:
+        """
+        Get the precomputed candidates for a user's segment.
+        
+        Costs O(log segments); for a loaded table the result is a view
+        into the file.
+        
+        Returns:
+            Product IDs, best first for the segment, or None when the
+            user has no segment in this table
+        """
+        key = self.grid.segment_of(user)
+        if key is None:
+            return None
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        return self.product_ids[self.offsets[i]:self.offsets[i + 1]]
+    
+    @classmethod
+    def build(
+        cls,
+        database: ProductDatabase,
+        grid: SegmentGrid = None,
+        depth: int = 500,
+        profile: ScoringProfile = None,
+        backend: str = "numpy" if np is not None else "python"
+    ) -> "SegmentTable":
+        """
+        Rank the catalog for every segment of a grid.
+        
+        Each segment is ranked once, for its representative user, which has
+        no preferred features: the candidates are the segment's best
+        products by category, budget and rating, and features are scored
+        online for each user. Build from the same profile the online engine
+        uses.
+        
+        Args:
+            database: Product catalog
+            grid: Segmentation (default: SegmentGrid())
+            depth: Candidates kept per segment
+            profile: Scoring profile (default: DEFAULT_PROFILE)
+            backend: Engine backend used for the ranking
+        
+        Returns:
+            The table
+        """
+        if grid is None:
+            grid = SegmentGrid()
+        if depth <= 0:
+            raise ValueError("Depth must be positive")
+        
+        engine = RecommendationEngine(database, backend=backend, profile=profile)
+        keys = array('q')
+        offsets = array('q', [0])
+        product_ids = array('q')
+        
+        catalog_fingerprint = database.fingerprint()
+        for key, user in grid.segments():
+            ranking = engine.recommend_products(user, depth)
+            keys.append(key)
+            product_ids.extend(recommendation.product.product_id for recommendation in ranking)
+            offsets.append(len(product_ids))
+        
+        # IDs are stored as 32-bit integers when they fit
+        if not product_ids or (min(product_ids) >= -2**31 and max(product_ids) < 2**31):
+            product_ids = array('i', product_ids)
+        return cls(grid, depth, keys, offsets, product_ids, catalog_fingerprint)
+    
+    def save(self, path: str) -> int:
+        """
+        Write the table in the binary layout read by load().
+        
+        Args:
+            path: Output file path
+        
+        Returns:
+            Number of bytes written
+        """
+        sections = {
+            'keys': array('q', self.keys),
+            'offsets': array('q', self.offsets),
+            'product_ids': array(_typecode(self.product_ids), self.product_ids),
+        }
+        
+        layout = {}
+        offset = 0
+        for name, column in sections.items():
+            size = len(column) * column.itemsize
+            layout[name] = [offset, size, column.typecode]
+            offset += size + (-size % 8)
+        
+        header = json.dumps({
+            'format_version': TABLE_FORMAT_VERSION,
+            'byteorder': sys.byteorder,
+            'grid': self.grid.to_dict(),
+            'depth': self.depth,
+            'catalog_fingerprint': self.catalog_fingerprint,
+            'sections': layout,
+        }).encode('utf-8')
+        header += b" " * (-len(header) % 8)
+        
+        with open(path, 'wb') as f:
+            f.write(TABLE_MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            for column in sections.values():
+                data = column.tobytes()
+                f.write(data)
+                f.write(b"\0" * (-len(data) % 8))
+            return f.tell()
+    
+    @classmethod
+    def load(cls, path: str, database: ProductDatabase = None) -> "SegmentTable":
+        """
+        Open a table written by save().
+        
+        Args:
+            path: Table file path
+            database: Optional catalog the table must have been built from
+        
+        Returns:
+            The table, with columns memory-mapped from the file
+        
+        Raises:
+            ValueError: If the file is not a compatible segment table, or
+                was built from a catalog other than ``database``
+        """
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        if mapped[:8] != TABLE_MAGIC:
+            raise ValueError(f"{path}: not a segment table")
+        header_length = int.from_bytes(mapped[8:16], 'little')
+        header = json.loads(mapped[16:16 + header_length].decode('utf-8'))
+        if header['format_version'] != TABLE_FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported segment table version {header['format_version']}")
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f"{path}: segment table was written on a {header['byteorder']}-endian machine")
+        if database is not None and header['catalog_fingerprint'] != database.fingerprint():
+            raise ValueError(f"{path}: segment table was built from a different catalog")
+        
+        buffer = memoryview(mapped)
+        data_start = 16 + header_length
+        columns = {}
+        for name, (offset, size, typecode) in header['sections'].items():
+            start_byte = data_start + offset
+            columns[name] = buffer[start_byte:start_byte + size].cast(typecode)
+        
+        table = cls(
+            SegmentGrid(
+                tuple(header['grid']['budget_bands']),
+                tuple(header['grid']['rating_buckets']),
+                header['grid']['max_categories']
+            ),
+            header['depth'],
+            columns['keys'],
+            columns['offsets'],
+            columns['product_ids'],
+            header['catalog_fingerprint']
+        )
+        # Keep the mapping alive as long as the table uses it
+        table._mmap = mapped
+        return table
+
+
+# ============================================================================
+# MAIN PROGRAM
+# ============================================================================
+
+def main():
+    """Build a segment table for a catalog snapshot (or the sample catalog)."""
+    if len(sys.argv) not in (2, 3, 4):
+        print("Usage: python segment_tables.py [snapshot.bin] <table.bin> [depth]")
+        sys.exit(1)
+    
+    arguments = sys.argv[1:]
+    depth = int(arguments.pop()) if len(arguments) > 1 and arguments[-1].isdigit() else 500
+    if len(arguments) == 2:
+        from catalog_io import load_snapshot
+        database, report = load_snapshot(arguments[0])
+        print(report)
+    else:
+        database = ProductDatabase()
+    target = arguments[-1]
+    
+    start = time.perf_counter()
+    table = SegmentTable.build(database, depth=depth)
+    elapsed = time.perf_counter() - start
+    size = table.save(target)
+    print(f"Ranked {len(table):,} segments in {elapsed:.2f}s; wrote {size:,} bytes to {target}")
+
+
+if __name__ == "__main__":
+    main()
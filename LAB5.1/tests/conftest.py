@@ -0,0 +1,96 @@
+"""
+Shared fixtures: random catalogs and users, and a reference ranking that
+scores every product the way the original catalog scan did.
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_recommendation import Category, Product, UserPreference  # noqa: E402
+
+
+FEATURES = [f"feature {i}" for i in range(30)]
+
+
+def random_products(rng: random.Random, count: int, first_id: int = 1):
+    """Products with repeated prices and ratings, so scores tie often."""
+    return [
+        Product(
+            product_id=first_id + i,
+            name=f"Product {first_id + i}",
+            category=rng.choice(list(Category)),
+            price=rng.choice([19.99, 50.0, 100.0, round(rng.uniform(5, 400), 2)]),
+            rating=rng.choice([3.5, 4.0, 4.5, 5.0, round(rng.uniform(3, 5), 1)]),
+            description="",
+            features=rng.sample(FEATURES, rng.randint(0, 5))
+        )
+        for i in range(count)
+    ]
+
+
+def random_users(rng: random.Random, count: int, product_ids):
+    """Users with varied categories, budgets, ratings and histories."""
+    return [
+        UserPreference(
+            user_id=i,
+            name=f"User {i}",
+            budget_min=rng.choice([0, 10, 50]),
+            budget_max=rng.choice([60, 100, 300, 1000]),
+            preferred_categories=rng.sample(list(Category), rng.randint(0, 3)),
+            preferred_features=rng.sample(FEATURES, rng.randint(0, 6)),
+            purchase_history=rng.sample(product_ids, min(len(product_ids), rng.randint(0, 10))),
+            minimum_rating=rng.choice([0.0, 3.0, 4.0, 4.5])
+        )
+        for i in range(count)
+    ]
+
+
+def reference_ranking(products, user: UserPreference, k: int):
+    """
+    Rank products as the original implementation did: score every product
+    not yet purchased, keep positive scores, stable sort, best first.
+    
+    Returns:
+        List of (product_id, score)
+    """
+    scored = []
+    for product in products:
+        if product.product_id in user.purchase_history:
+            continue
+        if not user.budget_min <= product.price <= user.budget_max:
+            continue
+        if product.rating < user.minimum_rating:
+            continue
+        score = 20.0 if product.category in user.preferred_categories else 0.0
+        score += 20
+        score += 15 * ((product.rating - user.minimum_rating) / (5 - user.minimum_rating))
+        matches = sum(1 for feature in product.features if feature in user.preferred_features)
+        if matches:
+            score += matches / max(len(user.preferred_features), 1) * 45
+        # Normalized by the 100 points available, as originally
+        score = score / 100 * 100
+        if score > 0:
+            scored.append((product.product_id, score))
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:k]
+
+
+def ranking(recommendations):
+    """(product_id, score) of each recommendation."""
+    return [(r.product.product_id, r.match_score) for r in recommendations]
+
+
+def assert_same_ranking(actual, expected):
+    """Same products in the same order, with scores equal up to rounding."""
+    assert [product_id for product_id, _ in actual] == [product_id for product_id, _ in expected]
+    assert [score for _, score in actual] == pytest.approx([score for _, score in expected])
+
+
+@pytest.fixture
+def rng():
+    return random.Random(1234)
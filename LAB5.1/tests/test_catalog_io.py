@@ -0,0 +1,119 @@
+"""
+Catalog files: invalid and repeated records are rejected with their
+location, and snapshots load the catalog they saved.
+"""
+
+import json
+
+import pytest
+
+from catalog_io import (
+    load_csv_catalog,
+    load_jsonl_catalog,
+    load_snapshot,
+    save_snapshot,
+    write_jsonl_catalog,
+)
+from conftest import assert_same_ranking, random_products, random_users, ranking, reference_ranking
+from product_recommendation import ProductDatabase, RecommendationEngine
+
+
+CSV_HEADER = "product_id,name,category,price,rating,description,features\n"
+
+
+def record(product_id, **fields):
+    row = {"product_id": product_id, "name": "Lamp", "category": "HOME",
+           "price": 20.0, "rating": 4.0, "features": ["led"]}
+    row.update(fields)
+    return row
+
+
+def write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    return str(path)
+
+
+@pytest.mark.parametrize("fields, message", [
+    ({"price": -1}, "price must be a non-negative number"),
+    ({"price": "nan"}, "price must be a non-negative number"),
+    ({"price": "inf"}, "price must be a non-negative number"),
+    ({"rating": 6}, "rating must be between 0 and 5"),
+    ({"rating": "nan"}, "rating must be between 0 and 5"),
+    ({"category": "Toys"}, "unknown category"),
+    ({"name": " "}, "name cannot be empty"),
+    ({"features": ["ok", ""]}, "features must be non-empty strings"),
+])
+def test_jsonl_rejects_bad_rows(tmp_path, fields, message):
+    path = write_jsonl(tmp_path / "catalog.jsonl", [record(1), record(2, **fields)])
+    with pytest.raises(ValueError, match=f"catalog.jsonl:2: {message}"):
+        load_jsonl_catalog(path)
+
+
+def test_jsonl_rejects_malformed_lines(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text(json.dumps(record(1)) + "\n{broken\n")
+    with pytest.raises(ValueError, match="catalog.jsonl:2: invalid JSON"):
+        load_jsonl_catalog(str(path))
+    
+    path = write_jsonl(path, [{"product_id": 1, "name": "Lamp"}])
+    with pytest.raises(ValueError, match="catalog.jsonl:1: missing field"):
+        load_jsonl_catalog(path)
+
+
+def test_jsonl_rejects_duplicate_ids(tmp_path):
+    path = write_jsonl(tmp_path / "catalog.jsonl", [record(1), record(2), record(1, price=5.0)])
+    with pytest.raises(ValueError, match="catalog.jsonl:3: duplicate product_id 1"):
+        load_jsonl_catalog(path)
+
+
+def test_csv_rejects_bad_rows_and_duplicates(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_text(CSV_HEADER + "1,Lamp,HOME,20,4,,led|warm\n2,Desk,HOME,nan,4,,\n")
+    with pytest.raises(ValueError, match="catalog.csv:3: price"):
+        load_csv_catalog(str(path))
+    
+    path.write_text(CSV_HEADER + "1,Lamp,HOME,20,4,,led|warm\n2,Desk,HOME,80,4,,\n2,Desk,HOME,90,4,,\n")
+    with pytest.raises(ValueError, match="catalog.csv:4: duplicate product_id 2"):
+        load_csv_catalog(str(path))
+
+
+def test_csv_features(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_text(CSV_HEADER + "1,Lamp,Home & Kitchen,20,4,,led|warm\n")
+    database, report = load_csv_catalog(str(path))
+    assert report.records == 1
+    assert database.get_product(1).features == ["led", "warm"]
+
+
+def test_snapshot_round_trip(tmp_path, rng):
+    products = random_products(rng, 200)
+    jsonl = tmp_path / "catalog.jsonl"
+    write_jsonl_catalog(products, str(jsonl))
+    loaded, _ = load_jsonl_catalog(str(jsonl), compact=True)
+    save_snapshot(loaded, str(tmp_path / "catalog.snap"))
+    database, report = load_snapshot(str(tmp_path / "catalog.snap"))
+    
+    assert report.records == len(products)
+    assert database.fingerprint() == ProductDatabase(products).fingerprint()
+    engine = RecommendationEngine(database)
+    for user in random_users(rng, 20, [product.product_id for product in products]):
+        assert_same_ranking(ranking(engine.recommend_products(user, 10)), reference_ranking(products, user, 10))
+
+
+def test_snapshot_rejects_duplicate_ids(tmp_path, rng):
+    product = random_products(rng, 1)[0]
+    with pytest.raises(ValueError, match="duplicate product IDs"):
+        save_snapshot(ProductDatabase([product, product]), str(tmp_path / "catalog.snap"))
+    
+    # A snapshot damaged or written by other tools is checked on load
+    path = tmp_path / "catalog.snap"
+    first, second = random_products(rng, 2)
+    save_snapshot(ProductDatabase([first, second]), str(path))
+    data = bytearray(path.read_bytes())
+    header_length = int.from_bytes(data[8:16], 'little')
+    offset, _, _ = json.loads(data[16:16 + header_length])['sections']['sorted_ids']
+    start = 16 + header_length + offset
+    data[start + 8:start + 16] = data[start:start + 8]
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match=f"catalog.snap: duplicate product_id {first.product_id}"):
+        load_snapshot(str(path))
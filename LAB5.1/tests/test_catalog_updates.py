@@ -0,0 +1,90 @@
+"""
+A catalog changed by upserts and removals must rank like one rebuilt from
+the same products.
+"""
+
+import dataclasses
+import math
+
+import pytest
+
+from conftest import FEATURES, assert_same_ranking, random_products, random_users, ranking, reference_ranking
+from product_recommendation import (
+    Category,
+    ProductDatabase,
+    RecommendationCache,
+    RecommendationEngine,
+    np,
+)
+
+
+BACKENDS = ["python"] + (["numpy"] if np is not None else [])
+
+
+def random_batch(rng, database, next_id):
+    """Changed copies of some products plus a few new ones."""
+    products = list(database.get_all_products())
+    changed = [
+        dataclasses.replace(
+            product,
+            category=rng.choice(list(Category)),
+            price=rng.choice([product.price, 50.0, round(rng.uniform(5, 400), 2)]),
+            rating=rng.choice([product.rating, 4.0, round(rng.uniform(3, 5), 1)]),
+            features=rng.sample(FEATURES, rng.randint(0, 5))
+        )
+        for product in rng.sample(products, 10)
+    ]
+    return changed + random_products(rng, 5, first_id=next_id)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_updates_match_rebuild(rng, backend, compact):
+    database = ProductDatabase(random_products(rng, 300), compact=compact)
+    engine = RecommendationEngine(database, backend=backend, cache=RecommendationCache())
+    next_id = 1000
+    
+    for step in range(6):
+        if step % 2:
+            ids = [product.product_id for product in database.get_all_products()]
+            assert database.remove_products(rng.sample(ids, 15) + [-1]) == 15
+        else:
+            batch = random_batch(rng, database, next_id)
+            assert database.upsert_products(batch) == {'added': 5, 'updated': 10}
+            next_id += 5
+        
+        products = list(database.get_all_products())
+        rebuilt = RecommendationEngine(ProductDatabase(products), backend=backend)
+        users = random_users(rng, 20, [product.product_id for product in products])
+        for user in users:
+            expected = reference_ranking(products, user, 10)
+            assert_same_ranking(ranking(rebuilt.recommend_products(user, 10)), expected)
+            assert_same_ranking(ranking(engine.recommend_products(user, 10)), expected)
+
+
+def test_lookups_follow_updates(rng):
+    products = random_products(rng, 50)
+    database = ProductDatabase(products)
+    moved = dataclasses.replace(products[0], price=123.0, features=["feature 0"])
+    database.upsert_products([moved])
+    database.remove_products([products[1].product_id])
+    
+    assert database.get_product(products[0].product_id).price == 123.0
+    assert database.get_product(products[1].product_id) is None
+    assert products[0].product_id in database.get_product_ids_with_feature("feature 0")
+    assert len(database.get_all_products()) == 49
+    
+    # The last product moved into the freed position
+    assert database.get_all_products()[1].product_id == products[-1].product_id
+
+
+def test_invalid_batch_changes_nothing(rng):
+    products = random_products(rng, 20)
+    database = ProductDatabase(products)
+    version = database.version
+    bad = dataclasses.replace(products[0], price=math.nan)
+    
+    with pytest.raises(ValueError):
+        database.upsert_products([dataclasses.replace(products[1], price=1.0), bad])
+    assert database.version == version
+    assert database.get_product(products[1].product_id).price == products[1].price
@@ -0,0 +1,75 @@
+"""
+Bulk import: bad rows and duplicates are rejected and counted, the rest
+are registered in one write.
+"""
+
+import json
+
+import pytest
+
+bcrypt = pytest.importorskip("bcrypt")
+
+from user_storage import HashCostPolicy, UserManager  # noqa: E402
+
+
+FAST = HashCostPolicy(4)
+
+
+@pytest.fixture(params=[".json", ".db", ".log"])
+def manager(request, tmp_path):
+    with UserManager(str(tmp_path / f"users{request.param}"), cost_policy=FAST) as manager:
+        manager.register_user("Old User", "old@example.com", "Secure123!o")
+        yield manager
+
+
+def test_csv_import(manager, tmp_path):
+    migrated = bcrypt.hashpw(b"Secure123!m", bcrypt.gensalt(rounds=4)).decode()
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "name,email,password,password_hash\n"
+        "Ann Lee,ann@example.com,Secure123!a,\n"          # 2: imported
+        "Bad Email,not-an-email,Secure123!b,\n"           # 3: invalid
+        "Weak,weak@example.com,password,\n"               # 4: invalid
+        "Ann Copy,ann@example.com,Secure123!c,\n"         # 5: duplicate
+        "Old Again,old@example.com,Secure123!d,\n"        # 6: existing
+        f"Mia Moved,mia@example.com,,{migrated}\n"        # 7: imported hash
+        "Bad Hash,bad@example.com,,not-a-hash\n"          # 8: invalid
+    )
+    report = manager.import_users(str(path))
+    
+    assert (report.rows, report.imported, report.invalid, report.duplicates, report.existing, report.failed) == (
+        7, 2, 3, 1, 1, 0
+    )
+    assert [line for line, _ in report.errors] == [3, 4, 5, 8, 6]
+    assert manager.login_user("ann@example.com", "Secure123!a")[0]
+    assert manager.login_user("mia@example.com", "Secure123!m")[0]
+    assert manager.get_user("old@example.com")['name'] == "Old User"
+    assert manager.get_user("not-an-email") is None
+
+
+def test_jsonl_import_skips_malformed_lines(manager, tmp_path):
+    path = tmp_path / "users.jsonl"
+    path.write_text(
+        json.dumps({"name": "Ann Lee", "email": "ann@example.com", "password": "Secure123!a"}) + "\n"
+        "{not json\n"
+        "\n"
+        + json.dumps(["a", "list"]) + "\n"
+        + json.dumps({"name": "Bob Stone", "email": "bob@example.com", "password": "Secure123!b"}) + "\n"
+    )
+    report = manager.import_users(str(path))
+    
+    assert (report.rows, report.imported, report.invalid) == (4, 2, 2)
+    assert [line for line, _ in report.errors] == [2, 4]
+    assert manager.login_user("bob@example.com", "Secure123!b")[0]
+
+
+def test_import_rejects_unknown_files(manager, tmp_path):
+    path = tmp_path / "users.txt"
+    path.write_text("name,email,password\n")
+    with pytest.raises(ValueError, match="Unknown import file type"):
+        manager.import_users(str(path))
+    
+    path = tmp_path / "users.csv"
+    path.write_text("name,mail\n")
+    with pytest.raises(ValueError, match="expected columns"):
+        manager.import_users(str(path))
@@ -0,0 +1,116 @@
+"""
+JSONFileStore journal: commits survive crashes and failures without
+losing users or reporting them wrongly.
+"""
+
+import json
+import threading
+
+import pytest
+
+from user_storage import JSONFileStore, StorageError
+
+
+class Crash(BaseException):
+    """Stands in for the process dying; nothing catches it."""
+
+
+def record(name):
+    return {'name': name, 'email': f"{name}@example.com", 'password_hash': "hash"}
+
+
+def users_on_disk(path):
+    with open(path) as f:
+        return set(json.load(f))
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "users.json")
+
+
+def test_crash_between_receipt_and_save_is_replayed(path, monkeypatch):
+    crashed = JSONFileStore(path)
+    assert crashed.add_many({"a@example.com": record("a")}) == {"a@example.com"}
+    
+    def die(users):
+        raise Crash()
+    
+    monkeypatch.setattr(crashed, "_save_users", die)
+    with pytest.raises(Crash):
+        crashed.add_many({"b@example.com": record("b")})
+    assert users_on_disk(path) == {"a@example.com"}
+    receipts = [entry for entry in crashed._read_journal() if 'receipt' in entry]
+    assert receipts and receipts[0]['added'] == ["b@example.com"]
+    
+    # The next writer, in this or another process, applies the entry
+    survivor = JSONFileStore(path)
+    assert survivor.add_many({"c@example.com": record("c"), "b@example.com": record("x")}) == {"c@example.com"}
+    assert users_on_disk(path) == {"a@example.com", "b@example.com", "c@example.com"}
+    assert survivor.get("b@example.com")['name'] == "b"
+    # Only the crashed call's receipt is left, still naming its user
+    assert [entry.get('added') for entry in survivor._read_journal()] == [["b@example.com"]]
+
+
+def test_crash_after_save_keeps_receipts(path, monkeypatch):
+    store = JSONFileStore(path)
+    write_journal = store._write_journal
+    
+    def die_on_cleanup(entries):
+        if not any('token' in entry for entry in entries):
+            raise Crash()
+        write_journal(entries)
+    
+    monkeypatch.setattr(store, "_write_journal", die_on_cleanup)
+    with pytest.raises(Crash):
+        store._append_journal({"a@example.com": record("a")})
+        store._commit_journal()
+    assert users_on_disk(path) == {"a@example.com"}
+    
+    survivor = JSONFileStore(path)
+    survivor.add_many({"b@example.com": record("b")})
+    receipts = [entry['added'] for entry in survivor._read_journal()]
+    assert receipts == [["a@example.com"]]
+
+
+def test_failed_receipt_write_leaves_cache_unchanged(path, monkeypatch):
+    store = JSONFileStore(path)
+    store.add_many({"a@example.com": record("a")})
+    assert store.page('email')
+    
+    def fail(entries):
+        raise StorageError("disk full")
+    
+    monkeypatch.setattr(store, "_write_journal", fail)
+    with pytest.raises(StorageError):
+        store.add_many({"b@example.com": record("b")})
+    monkeypatch.undo()
+    
+    assert "b@example.com" not in store
+    assert [email for (_, email), _ in store.page('email')] == ["a@example.com"]
+    assert users_on_disk(path) == {"a@example.com"}
+
+
+def test_concurrent_writers_each_get_their_users(path):
+    stores = [JSONFileStore(path) for _ in range(4)]
+    results = {}
+    
+    def register(i):
+        store = stores[i % len(stores)]
+        emails = {f"user{i}-{j}@example.com": record(f"user{i}-{j}") for j in range(5)}
+        # Every writer also tries one shared email; exactly one gets it
+        emails["shared@example.com"] = record(f"shared{i}")
+        results[i] = store.add_many(emails)
+    
+    threads = [threading.Thread(target=register, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sum("shared@example.com" in added for added in results.values()) == 1
+    for i, added in results.items():
+        assert {email for email in added if email != "shared@example.com"} == {
+            f"user{i}-{j}@example.com" for j in range(5)
+        }
+    assert len(users_on_disk(path)) == 8 * 5 + 1
@@ -0,0 +1,59 @@
+"""
+Every ranking path must return what a plain scan of the catalog returns.
+"""
+
+import pytest
+
+from conftest import assert_same_ranking, random_products, random_users, ranking, reference_ranking
+from product_recommendation import (
+    ProductDatabase,
+    RecommendationCache,
+    RecommendationEngine,
+    np,
+)
+
+
+BACKENDS = ["python"] + (["numpy"] if np is not None else [])
+
+
+@pytest.fixture
+def catalog(rng):
+    return random_products(rng, 400)
+
+
+@pytest.fixture
+def users(rng, catalog):
+    return random_users(rng, 60, [product.product_id for product in catalog])
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_engine_matches_scan(catalog, users, backend, compact):
+    engine = RecommendationEngine(ProductDatabase(catalog, compact=compact), backend=backend)
+    for user in users:
+        for k in (1, 5, 50):
+            assert_same_ranking(ranking(engine.recommend_products(user, k)), reference_ranking(catalog, user, k))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_cached_rankings_match_scan(catalog, users, backend):
+    cache = RecommendationCache()
+    engine = RecommendationEngine(ProductDatabase(catalog), backend=backend, cache=cache)
+    for _ in range(2):
+        for user in users:
+            assert_same_ranking(ranking(engine.recommend_products(user, 10)), reference_ranking(catalog, user, 10))
+    assert cache.stats()['hits'] > 0
+
+
+def test_batch_matches_scan(catalog, users):
+    engine = RecommendationEngine(ProductDatabase(catalog))
+    for user, recommendations in zip(users, engine.recommend_batch(users, 10, workers=2, chunk_size=16)):
+        assert_same_ranking(ranking(recommendations), reference_ranking(catalog, user, 10))
+
+
+def test_reasons_follow_scores(catalog, users):
+    engine = RecommendationEngine(ProductDatabase(catalog))
+    for user in users[:10]:
+        for recommendation in engine.recommend_products(user, 5):
+            assert recommendation.reasons
+            assert set(recommendation.matching_features) <= set(user.preferred_features)
@@ -0,0 +1,72 @@
+"""
+Recommendation service: request validation and HTTP error handling.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from product_recommendation import ProductDatabase, RecommendationEngine
+from recommendation_service import (
+    RecommendationHTTPServer,
+    RecommendationService,
+    user_from_payload,
+)
+
+
+def payload(**fields):
+    body = {"budget_min": 0, "budget_max": 500}
+    body.update(fields)
+    return body
+
+
+@pytest.mark.parametrize("history", ["12", [1, "2"], [True], {"1": 2}, [1.5]])
+def test_purchase_history_must_be_a_list_of_ints(history):
+    with pytest.raises(ValueError, match="purchase_history"):
+        user_from_payload(payload(purchase_history=history))
+
+
+def test_valid_payload():
+    user = user_from_payload(payload(purchase_history=[3, 1], preferred_categories=["ELECTRONICS"]))
+    assert user.purchase_history == [3, 1]
+    assert user_from_payload(payload(purchase_history=None)).purchase_history == []
+
+
+async def exchange(port, data):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, body = response.split(b"\r\n\r\n", 1)
+    return int(head.split(b" ", 2)[1]), json.loads(body)
+
+
+def request(body):
+    data = json.dumps(body).encode()
+    return b"POST /recommend HTTP/1.1\r\nConnection: close\r\nContent-Length: %d\r\n\r\n%s" % (len(data), data)
+
+
+def test_http_errors():
+    async def run():
+        server = RecommendationHTTPServer(RecommendationService(RecommendationEngine(ProductDatabase())))
+        await server.start(port=0)
+        try:
+            return [
+                await exchange(server.port, data)
+                for data in (
+                    b"GARBAGE\r\n\r\n",
+                    b"GET /health HTTP/1.1\r\nContent-Length: abc\r\n\r\n",
+                    b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n",
+                    request(payload(purchase_history="12")),
+                    request(payload(purchase_history=[1], num_recommendations=3)),
+                )
+            ]
+        finally:
+            await server.stop()
+    
+    responses = asyncio.run(run())
+    assert [status for status, _ in responses] == [400, 400, 200, 400, 200]
+    assert "malformed request line" in responses[0][1]['error']
+    assert len(responses[4][1]['recommendations']) == 3
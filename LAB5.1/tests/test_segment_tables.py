@@ -0,0 +1,60 @@
+"""
+Segment tables: only usable with the catalog they were built from.
+"""
+
+import dataclasses
+
+import pytest
+
+from conftest import random_products, random_users, ranking
+from product_recommendation import Category, ProductDatabase, RecommendationEngine, UserPreference
+from segment_tables import SegmentTable
+
+
+@pytest.fixture
+def products(rng):
+    return random_products(rng, 300)
+
+
+@pytest.fixture
+def table_path(tmp_path, products):
+    path = str(tmp_path / "segments.bin")
+    SegmentTable.build(ProductDatabase(products), depth=50, backend="python").save(path)
+    return path
+
+
+def test_table_matches_catalog_in_another_process(table_path, products, rng):
+    # A fresh database of the same products, as another process would load
+    database = ProductDatabase(products, compact=True)
+    table = SegmentTable.load(table_path, database)
+    engine = RecommendationEngine(database, segments=table)
+    full = RecommendationEngine(database)
+    
+    user = UserPreference(1, "u", 0, 100, [Category.ELECTRONICS], [], [], 4.0)
+    assert table.candidates(user) is not None
+    for user in random_users(rng, 20, [product.product_id for product in products]):
+        recommendations = engine.recommend_products(user, 5)
+        expected = dict(ranking(full.recommend_products(user, len(products))))
+        # Scores are exact even when the table misses a product
+        for product_id, score in ranking(recommendations):
+            assert score == pytest.approx(expected[product_id])
+
+
+def test_table_of_another_catalog_is_rejected(table_path, products):
+    changed = [dataclasses.replace(products[0], price=products[0].price + 1)] + products[1:]
+    other = ProductDatabase(changed)
+    with pytest.raises(ValueError, match="different catalog"):
+        SegmentTable.load(table_path, other)
+    with pytest.raises(ValueError, match="different catalog"):
+        RecommendationEngine(other, segments=SegmentTable.load(table_path))
+
+
+def test_table_is_ignored_after_updates(table_path, products):
+    database = ProductDatabase(products)
+    engine = RecommendationEngine(database, segments=SegmentTable.load(table_path, database))
+    user = UserPreference(1, "u", 0, 100, [Category.ELECTRONICS], [], [], 4.0)
+    assert engine._segment_positions(user, 5, True, {}) is not None
+    
+    database.upsert_products([dataclasses.replace(products[0], rating=5.0)])
+    assert engine._segment_positions(user, 5, True, {}) is None
+    assert engine.recommend_products(user, 5)
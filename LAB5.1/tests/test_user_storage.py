@@ -0,0 +1,125 @@
+"""
+User storage: every backend must behave the same through UserManager.
+"""
+
+import pytest
+
+bcrypt = pytest.importorskip("bcrypt")
+
+from user_storage import HashCostPolicy, UserManager, open_store  # noqa: E402
+
+
+# Tests don't need slow hashes
+FAST = HashCostPolicy(4)
+
+BACKENDS = [".json", ".db", ".log"]
+
+USERS = [
+    ("Ann Lee", "ann@example.com", "Secure123!a"),
+    ("bob Stone", "bob@sample.org", "Secure123!b"),
+    ("Cara Diaz", "cara@example.com", "Secure123!c"),
+    ("Dan Oh", "dan@sample.org", "Secure123!d"),
+    ("Émile Roy", "emile@example.com", "Secure123!e"),
+    ("ann Marsh", "ann.marsh@other.net", "Secure123!f"),
+    ("Zoe Park", "zoe@example.com", "Secure123!g"),
+]
+
+
+@pytest.fixture(params=BACKENDS)
+def path(request, tmp_path):
+    return str(tmp_path / f"users{request.param}")
+
+
+@pytest.fixture
+def manager(path):
+    with UserManager(path, cost_policy=FAST) as manager:
+        assert all(ok for ok, _ in manager.register_users_bulk(USERS))
+        yield manager
+
+
+def all_pages(manager, order, prefix="", limit=3):
+    users, cursor = manager.list_users_page(limit=limit, order=order, prefix=prefix)
+    while cursor is not None:
+        page, cursor = manager.list_users_page(cursor, limit, order, prefix)
+        users.extend(page)
+    return [user['email'] for user in users]
+
+
+def test_register_and_login(manager):
+    assert manager.register_user("New User", "new@example.com", "Secure123!n")[0]
+    assert manager.login_user("new@example.com", "Secure123!n")[0]
+    assert manager.login_user("ann@example.com", "Secure123!a")[0]
+    
+    assert not manager.register_user("Ann Again", "ann@example.com", "Secure123!x")[0]
+    assert not manager.register_user("Weak", "weak@example.com", "password")[0]
+    assert not manager.register_user("Bad Email", "not-an-email", "Secure123!x")[0]
+    assert not manager.login_user("ann@example.com", "Secure123!b")[0]
+    assert not manager.login_user("nobody@example.com", "Secure123!a")[0]
+    assert manager.get_user("ann@example.com")['name'] == "Ann Lee"
+
+
+def test_bulk_registration_reports_each_user(manager):
+    results = manager.register_users_bulk([
+        ("Fay Wu", "fay@example.com", "Secure123!h"),
+        ("Ann Lee", "ann@example.com", "Secure123!a"),
+        ("Fay Copy", "fay@example.com", "Secure123!h"),
+    ])
+    assert [ok for ok, _ in results] == [True, False, False]
+
+
+def test_pages_cover_every_user_in_order(manager):
+    emails = [email for _, email, _ in USERS]
+    assert all_pages(manager, 'email') == sorted(emails)
+    
+    by_name = sorted(USERS, key=lambda user: (user[0].casefold(), user[1]))
+    assert all_pages(manager, 'name') == [email for _, email, _ in by_name]
+    
+    assert all_pages(manager, 'name', prefix="ANN") == ["ann@example.com", "ann.marsh@other.net"]
+    assert all_pages(manager, 'domain', prefix="sample.org") == ["bob@sample.org", "dan@sample.org"]
+    assert all_pages(manager, 'email', prefix="c") == ["cara@example.com"]
+
+
+def test_pages_are_stable_across_changes(manager):
+    first, cursor = manager.list_users_page(limit=3)
+    manager.register_user("Aaron Ash", "aaron@example.com", "Secure123!i")
+    rest, _ = manager.list_users_page(cursor, 10)
+    assert [user['email'] for user in first] == ["ann.marsh@other.net", "ann@example.com", "bob@sample.org"]
+    assert [user['email'] for user in rest][0] == "cara@example.com"
+
+
+def test_delete(manager):
+    assert not manager.delete_user("ann@example.com", "wrong")[0]
+    assert manager.delete_user("ann@example.com", "Secure123!a")[0]
+    assert not manager.login_user("ann@example.com", "Secure123!a")[0]
+    assert "ann@example.com" not in all_pages(manager, 'email')
+    assert not manager.delete_user("ann@example.com", "Secure123!a")[0]
+
+
+def test_users_persist(manager, path):
+    manager.delete_user("bob@sample.org", "Secure123!b")
+    manager.close()
+    with UserManager(path, cost_policy=FAST) as reopened:
+        assert reopened.login_user("ann@example.com", "Secure123!a")[0]
+        assert not reopened.login_user("bob@sample.org", "Secure123!b")[0]
+    store = open_store(path)
+    try:
+        assert len(store) == len(USERS) - 1
+    finally:
+        store.close()
+
+
+def test_login_raises_lower_costs_only(path):
+    with UserManager(path, cost_policy=HashCostPolicy(5)) as manager:
+        manager.register_user("Ann Lee", "ann@example.com", "Secure123!a")
+    
+    with UserManager(path, cost_policy=FAST) as manager:
+        manager.register_user("Bob Stone", "bob@example.com", "Secure123!b")
+        assert manager.login_user("ann@example.com", "Secure123!a")[0]
+    with UserManager(path, cost_policy=HashCostPolicy(5)) as manager:
+        assert manager.login_user("bob@example.com", "Secure123!b")[0]
+    
+    with UserManager(path, cost_policy=FAST) as manager:
+        assert manager.get_user("ann@example.com") is not None
+        store = manager.store
+        assert store.get("ann@example.com")['password_hash'].startswith("$2b$05$")
+        assert store.get("bob@example.com")['password_hash'].startswith("$2b$05$")
@@ -3,70 +3,1396 @@ Secure User Details Storage System
 Stores user information with hashed passwords using bcrypt
 """
 
+import asyncio
+import base64
 import bcrypt
+import csv
 import json
+import math
 import os
 import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: the log backend is then single-process only
+    fcntl = None
 
 # Database file to store user data
 DATABASE_FILE = "users.json"
 
+# Orders users can be listed and searched in
+USER_ORDERS = ('email', 'name', 'domain')
 
-class UserManager:
+# Sorts after every other character, so prefix + this bounds a prefix range
+_MAX_CHAR = "\U0010ffff"
+
+# Compiled once rather than on every registration
+_EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_PASSWORD_RULES = (
+    (re.compile(r'[A-Z]'), "Password must contain at least one uppercase letter."),
+    (re.compile(r'[a-z]'), "Password must contain at least one lowercase letter."),
+    (re.compile(r'[0-9]'), "Password must contain at least one digit."),
+    (re.compile(r'[!@#$%^&*()_+\-=\[\]{};:\'",.<>?/\\|`~]'),
+     "Password must contain at least one special character."),
+)
+_BCRYPT_HASH_PATTERN = re.compile(r'^\$2[aby]\$\d\d\$[./A-Za-z0-9]{53}$')
+
+# Import file extension -> format
+IMPORT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+class StorageError(Exception):
+    """Raised when the user database cannot be read or written."""
+
+
+@contextmanager
+def _file_lock(path: str, shared: bool = False):
     """
-    Manages secure storage and retrieval of user information.
-    Passwords are hashed using bcrypt for security.
+    Hold an advisory lock on a lock file, across processes (POSIX only).
+    
+    Each call opens its own descriptor, so threads of one process exclude
+    each other too. Without fcntl (Windows) this does nothing.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _fsync_directory(path: str):
+    """Make a rename in the directory of path durable (POSIX only)."""
+    if os.name != 'posix':
+        return
+    descriptor = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _sort_key(order: str, email: str, name: str) -> str:
+    """A user's key in one of USER_ORDERS."""
+    if order == 'email':
+        return email
+    if order == 'name':
+        return name.lower()
+    return email.partition('@')[2].lower()
+
+
+class UserIndex:
+    """
+    Sorted secondary keys of a user table, for paging and prefix search.
+    
+    Holds one sorted list of (key, email) pairs per order in USER_ORDERS:
+    the email, the lower-cased name and the lower-cased email domain.
+    Reading a page costs a binary search plus the page itself; adding or
+    removing a user keeps the lists sorted.
     """
     
-    def __init__(self, db_file: str = DATABASE_FILE):
+    def __init__(self, users: Iterable[Tuple[str, str]] = ()):
         """
-        Initialize the UserManager.
+        Index users.
         
         Args:
-            db_file: Path to the JSON file storing user data
+            users: (email, name) pairs
         """
-        self.db_file = db_file
+        self._keys: Dict[str, List[Tuple[str, str]]] = {order: [] for order in USER_ORDERS}
+        for email, name in users:
+            for order in USER_ORDERS:
+                self._keys[order].append((_sort_key(order, email, name), email))
+        for keys in self._keys.values():
+            keys.sort()
+    
+    def add(self, email: str, name: str):
+        for order in USER_ORDERS:
+            insort(self._keys[order], (_sort_key(order, email, name), email))
+    
+    def remove(self, email: str, name: str):
+        for order in USER_ORDERS:
+            keys = self._keys[order]
+            entry = (_sort_key(order, email, name), email)
+            i = bisect_left(keys, entry)
+            if i < len(keys) and keys[i] == entry:
+                del keys[i]
+    
+    def page(
+        self,
+        order: str,
+        prefix: str = "",
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50
+    ) -> List[Tuple[str, str]]:
+        """
+        Get the next (key, email) pairs in an order.
+        
+        Args:
+            order: One of USER_ORDERS
+            prefix: Only keys starting with this
+            after: Last (key, email) of the previous page
+            limit: Most pairs returned
+        """
+        keys = self._keys[order]
+        start = bisect_right(keys, after) if after is not None else bisect_left(keys, (prefix, ""))
+        end = bisect_left(keys, (prefix + _MAX_CHAR, ""))
+        return keys[start:min(end, start + limit)] if start < end else []
+
+
+class UserStore:
+    """
+    Storage of user records, keyed by email.
+    
+    A record is a dictionary with 'name', 'email' and 'password_hash'.
+    Backends differ in how they persist records; UserManager only uses the
+    methods below.
+    """
+    
+    def get(self, email: str) -> Optional[Dict]:
+        """Get the record of an email, or None."""
+        return self.get_many([email]).get(email)
+    
+    def get_many(self, emails: Iterable[str]) -> Dict[str, Dict]:
+        """Get the records of the emails that exist."""
+        raise NotImplementedError
+    
+    def add(self, email: str, record: Dict) -> bool:
+        """
+        Store a new record.
+        
+        Returns:
+            False (storing nothing) if the email is already registered
+            
+        Raises:
+            StorageError: If the record cannot be written
+        """
+        return email in self.add_many({email: record})
+    
+    def add_many(self, records: Dict[str, Dict]) -> set:
+        """
+        Store new records in one write.
+        
+        Returns:
+            The emails that were added; already registered ones are skipped
+            
+        Raises:
+            StorageError: If the records cannot be written
+        """
+        raise NotImplementedError
+    
+    def delete(self, email: str) -> bool:
+        """
+        Remove a record.
+        
+        Returns:
+            True if the email was registered
+            
+        Raises:
+            StorageError: If the change cannot be written
+        """
+        raise NotImplementedError
+    
+    def replace_hashes(self, updates: Dict[str, Tuple[str, str]]) -> int:
+        """
+        Replace password hashes in one write, where they are unchanged.
+        
+        Args:
+            updates: email -> (expected current hash, new hash); users
+                whose hash is no longer the expected one are skipped
+            
+        Returns:
+            Number of hashes replaced
+            
+        Raises:
+            StorageError: If the change cannot be written
+        """
+        raise NotImplementedError
+    
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        """Iterate over (email, record) pairs."""
+        raise NotImplementedError
+    
+    def page(
+        self,
+        order: str,
+        prefix: str = "",
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50
+    ) -> List[Tuple[Tuple[str, str], Dict]]:
+        """
+        Get one page of users sorted by a key.
+        
+        The backends answer from an index in O(log n + limit); this
+        fallback sorts every user.
+        
+        Args:
+            order: One of USER_ORDERS
+            prefix: Only users whose key starts with this
+            after: (key, email) of the last user of the previous page
+            limit: Most users returned
+            
+        Returns:
+            List of ((key, email), record) pairs
+        """
+        users = dict(self.items())
+        index = UserIndex((email, record['name']) for email, record in users.items())
+        return [(entry, users[entry[1]]) for entry in index.page(order, prefix, after, limit)]
+    
+    def __contains__(self, email: str) -> bool:
+        return self.get(email) is not None
+    
+    def __len__(self) -> int:
+        return sum(1 for _ in self.items())
+    
+    def close(self):
+        """Release files and connections."""
+
+
+class JSONFileStore(UserStore):
+    """
+    All users in one JSON file, read and rewritten as a whole.
+    
+    The original format; every write costs O(total users). The parsed
+    table is cached: a read first compares the file's inode, size and
+    modification time with those seen when it was loaded, and re-parses
+    only if they differ, so changes made by other processes are still
+    picked up.
+    
+    Writes are crash-safe and safe with several writer processes. The new
+    file is written beside the old one, fsync'd and renamed over it, so
+    the database is always either the old or the new version. New users
+    are first appended to a journal (users.json.journal); whichever writer
+    then holds the lock (users.json.lock) commits every pending journal
+    entry, so a burst of registrations from many processes costs one
+    rewrite and one fsync rather than one each (group commit). The commit
+    leaves a receipt in the journal naming the users each call added, so
+    every caller learns exactly which of its users were inserted.
+    """
+    
+    # A file modified this recently (in seconds) when it was read could
+    # change again without its modification time changing, since file
+    # timestamps have limited resolution; it is re-read until it settles
+    TIMESTAMP_SLACK = 0.1
+    
+    # Receipts not collected within this many seconds (their writer died)
+    # are dropped
+    RECEIPT_TTL = 3600
+    
+    def __init__(self, path: str, cache: bool = True):
+        """
+        Open a JSON user database, creating it if needed.
+        
+        Args:
+            path: Path to the JSON file
+            cache: Keep the parsed table between calls
+        """
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.lock_path = f"{path}.lock"
+        self.cache = cache
+        # Rewrites of the file done by this instance
+        self.commits = 0
+        self._users: Optional[Dict] = None
+        self._indexes: Optional[UserIndex] = None
+        self._signature = None
+        self._trusted = False
+        self._lock = threading.RLock()
         self._ensure_database_exists()
     
     def _ensure_database_exists(self):
         """Create database file if it doesn't exist."""
-        if not os.path.exists(self.db_file):
-            with open(self.db_file, 'w') as f:
-                json.dump({}, f)
+        if not os.path.exists(self.path):
+            with _file_lock(self.lock_path):
+                if not os.path.exists(self.path):
+                    self._write_file({})
     
-    def _load_users(self) -> Dict:
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        """The file's (inode, size, modification time in ns), or None."""
+        try:
+            status = os.stat(self.path)
+        except OSError:
+            return None
+        return status.st_ino, status.st_size, status.st_mtime_ns
+    
+    def _remember(self, users: Dict, signature: Optional[Tuple[int, int, int]]):
+        """Cache a table known to match the file with this signature."""
+        if users is not self._users:
+            self._indexes = None
+        self._users = users
+        self._signature = signature
+        self._trusted = (
+            signature is not None
+            and time.time() - signature[2] / 1e9 > self.TIMESTAMP_SLACK
+        )
+    
+    def _forget(self):
+        """Drop the cached table and its indexes."""
+        self._users = None
+        self._indexes = None
+    
+    def _load_users(self, strict: bool = False) -> Dict:
         """
-        Load users from the database file.
+        Load users from the database file, or from the cache if it is
+        unchanged.
+        
+        Args:
+            strict: Raise instead of returning an empty table when the
+                file cannot be read, so a damaged file is never
+                overwritten
         
         Returns:
-            Dictionary of users
+            Dictionary of users (the cached one; callers must not keep it)
+            
+        Raises:
+            StorageError: If strict and the file cannot be read
         """
+        signature = self._file_signature()
+        if self.cache and self._users is not None and self._trusted and signature == self._signature:
+            return self._users
+        
         try:
-            with open(self.db_file, 'r') as f:
-                return json.load(f)
+            with open(self.path, 'r') as f:
+                users = json.load(f)
         except (json.JSONDecodeError, IOError) as e:
+            self._forget()
+            if strict:
+                raise StorageError(f"Error reading database: {str(e)}") from e
             print(f"Error reading database: {str(e)}")
             return {}
+        
+        # The signature was taken before reading: if the file changed in
+        # between, the next check sees a new signature and reloads
+        if self.cache:
+            self._remember(users, signature)
+        return users
+    
+    def _write_file(self, users: Dict):
+        """Replace the database file atomically and durably."""
+        temporary = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, 'w') as f:
+                json.dump(users, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.path)
+            _fsync_directory(self.path)
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
     
-    def _save_users(self, users: Dict) -> bool:
+    def _save_users(self, users: Dict):
         """
-        Save users to the database file.
+        Save users to the database file; the caller holds the lock.
         
         Args:
             users: Dictionary of users to save
             
+        Raises:
+            StorageError: If the file cannot be written
+        """
+        try:
+            self._write_file(users)
+        except IOError as e:
+            self._forget()
+            raise StorageError(f"Error writing to database: {str(e)}") from e
+        self.commits += 1
+        if self.cache:
+            self._remember(users, self._file_signature())
+    
+    def _append_journal(self, records: Dict[str, Dict]) -> str:
+        """
+        Queue new users for the next commit.
+        
         Returns:
-            True if successful, False otherwise
+            Token identifying this call's entries in the journal
         """
+        token = f"{os.getpid()}-{threading.get_ident()}-{time.monotonic_ns()}"
+        data = b"".join(
+            json.dumps({'token': token, 'email': email, 'record': record}).encode('utf-8') + b"\n"
+            for email, record in records.items()
+        )
         try:
-            with open(self.db_file, 'w') as f:
-                json.dump(users, f, indent=4)
+            with _file_lock(f"{self.journal_path}.lock"), open(self.journal_path, 'ab') as f:
+                # Finish a line left partial by a crashed writer
+                if f.tell() > 0:
+                    with open(self.journal_path, 'rb') as existing:
+                        existing.seek(-1, os.SEEK_END)
+                        if existing.read(1) != b"\n":
+                            data = b"\n" + data
+                f.write(data)
+        except OSError as e:
+            raise StorageError(f"Error writing to database: {str(e)}") from e
+        return token
+    
+    def _read_journal(self) -> List[Dict]:
+        """Parse the journal; the caller holds the journal lock."""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                lines = f.read().split(b"\n")
+        except FileNotFoundError:
+            return []
+        except OSError as e:
+            raise StorageError(f"Error reading database: {str(e)}") from e
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # partial line of a crashed writer
+        return entries
+    
+    def _write_journal(self, entries: List[Dict]):
+        """Replace the journal's contents; the caller holds the journal lock."""
+        try:
+            with open(self.journal_path, 'wb') as f:
+                f.write(b"".join(json.dumps(entry).encode('utf-8') + b"\n" for entry in entries))
+        except OSError as e:
+            raise StorageError(f"Error writing to database: {str(e)}") from e
+    
+    def _is_pending(self, token: str) -> bool:
+        """Whether entries with this token are still in the journal."""
+        with _file_lock(f"{self.journal_path}.lock"):
+            try:
+                with open(self.journal_path, 'rb') as f:
+                    return f'"token": "{token}"'.encode('utf-8') in f.read()
+            except FileNotFoundError:
+                return False
+    
+    def _discard_journal(self, token: str):
+        """Remove the entries and receipt with this token from the journal."""
+        with _file_lock(f"{self.journal_path}.lock"):
+            self._write_journal([
+                entry for entry in self._read_journal()
+                if token not in (entry.get('token'), entry.get('receipt'))
+            ])
+    
+    def _take_receipt(self, token: str) -> Optional[set]:
+        """
+        Remove and return the receipt of a committed call.
+        
+        Returns:
+            Emails the call added, or None if there is no receipt
+        """
+        with _file_lock(f"{self.journal_path}.lock"):
+            entries = self._read_journal()
+            receipt = None
+            rest = []
+            for entry in entries:
+                if entry.get('receipt') == token:
+                    receipt = entry
+                else:
+                    rest.append(entry)
+            if receipt is None:
+                return None
+            self._write_journal(rest)
+            return set(receipt['added'])
+    
+    def _commit_journal(self):
+        """
+        Apply every pending journal entry in one write; the caller holds
+        the lock exclusively.
+        
+        Receipts are written to the journal before the database file is
+        replaced, and entries are removed only after, so a crash in
+        between replays them: adding a user is idempotent, and a replay
+        adds to the receipts rather than replacing them. The new table is
+        built on a copy and cached only once it is saved.
+        
+        Raises:
+            StorageError: If the database or the journal cannot be read or
+                written; the cached table is left as it was
+        """
+        with _file_lock(f"{self.journal_path}.lock"):
+            pending = [entry for entry in self._read_journal() if 'token' in entry]
+        if not pending:
+            return
+        
+        cached = self._load_users(strict=True)
+        users = dict(cached)
+        added: Dict[str, List[str]] = {}
+        new_users = []
+        for entry in pending:
+            emails = added.setdefault(entry['token'], [])
+            if entry['email'] not in users:
+                users[entry['email']] = entry['record']
+                new_users.append((entry['email'], entry['record']['name']))
+                emails.append(entry['email'])
+        
+        now = time.time()
+        with _file_lock(f"{self.journal_path}.lock"):
+            entries = self._read_journal()
+            # A replay keeps what the interrupted commit already recorded
+            for entry in entries:
+                token = entry.get('receipt')
+                if token in added:
+                    added[token] = list(dict.fromkeys(entry['added'] + added[token]))
+            # Entries appended meanwhile stay for the next commit
+            self._write_journal([
+                entry for entry in entries
+                if entry.get('receipt') not in added
+                and now - entry.get('time', now) < self.RECEIPT_TTL
+            ] + [
+                {'receipt': token, 'added': emails, 'time': now}
+                for token, emails in added.items()
+            ])
+        
+        if new_users:
+            indexes = self._indexes if cached is self._users else None
+            self._save_users(users)
+            if indexes is not None and users is self._users:
+                for email, name in new_users:
+                    indexes.add(email, name)
+                self._indexes = indexes
+        
+        try:
+            with _file_lock(f"{self.journal_path}.lock"):
+                self._write_journal([
+                    entry for entry in self._read_journal() if entry.get('token') not in added
+                ])
+        except StorageError:
+            # The users are saved; the next commit finds them present and
+            # only removes the entries
+            pass
+    
+    def get_many(self, emails: Iterable[str]) -> Dict[str, Dict]:
+        with self._lock:
+            users = self._load_users()
+            return {email: dict(users[email]) for email in emails if email in users}
+    
+    def add_many(self, records: Dict[str, Dict]) -> set:
+        if not records:
+            return set()
+        token = self._append_journal(records)
+        with self._lock:
+            with _file_lock(self.lock_path):
+                # A writer that held the lock before may have committed
+                # these entries already, along with its own
+                if self._is_pending(token):
+                    try:
+                        self._commit_journal()
+                    except StorageError:
+                        # Reported as failed, so they must never be applied
+                        self._discard_journal(token)
+                        raise
+                added = self._take_receipt(token)
+            if added is None:
+                raise StorageError("Error writing to database: journal receipt missing")
+            return added
+    
+    def delete(self, email: str) -> bool:
+        with self._lock, _file_lock(self.lock_path):
+            self._commit_journal()
+            users = self._load_users(strict=True)
+            if email not in users:
+                return False
+            if self._indexes is not None and users is self._users:
+                self._indexes.remove(email, users[email]['name'])
+            del users[email]
+            self._save_users(users)
             return True
-        except IOError as e:
-            print(f"Error writing to database: {str(e)}")
+    
+    def replace_hashes(self, updates: Dict[str, Tuple[str, str]]) -> int:
+        with self._lock, _file_lock(self.lock_path):
+            self._commit_journal()
+            users = self._load_users(strict=True)
+            replaced = 0
+            for email, (expected, new) in updates.items():
+                user = users.get(email)
+                if user is not None and user['password_hash'] == expected:
+                    user['password_hash'] = new
+                    replaced += 1
+            if replaced:
+                self._save_users(users)
+            return replaced
+    
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        with self._lock:
+            return iter([(email, dict(user)) for email, user in self._load_users().items()])
+    
+    def page(
+        self,
+        order: str,
+        prefix: str = "",
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50
+    ) -> List[Tuple[Tuple[str, str], Dict]]:
+        with self._lock:
+            users = self._load_users()
+            # Indexes are built on first use after a load, then kept up
+            # to date by this process's writes
+            indexes = self._indexes
+            if indexes is None or users is not self._users:
+                indexes = UserIndex((email, user['name']) for email, user in users.items())
+                if users is self._users:
+                    self._indexes = indexes
+            return [
+                (entry, dict(users[entry[1]]))
+                for entry in indexes.page(order, prefix, after, limit)
+            ]
+    
+    def __contains__(self, email: str) -> bool:
+        with self._lock:
+            return email in self._load_users()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load_users())
+
+
+class SQLiteUserStore(UserStore):
+    """
+    Users in an SQLite table keyed by email.
+    
+    Lookups and writes are O(log n) B-tree operations. WAL mode lets
+    readers in other processes run while one process writes, and a
+    multi-user add is a single transaction.
+    """
+    
+    # Most variables SQLite accepts in one statement on old versions
+    _BATCH = 500
+    
+    # Column holding each order's key. Keys are computed by _sort_key in
+    # Python: SQLite's lower() only folds ASCII, so it would order and
+    # match non-ASCII names differently from the other backends
+    _KEYS = {
+        'email': "email",
+        'name': "name_key",
+        'domain': "domain_key",
+    }
+    
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS users ("
+                    " email TEXT PRIMARY KEY,"
+                    " name TEXT NOT NULL,"
+                    " password_hash TEXT NOT NULL,"
+                    " name_key TEXT NOT NULL DEFAULT '',"
+                    " domain_key TEXT NOT NULL DEFAULT ''"
+                    ") WITHOUT ROWID"
+                )
+                self._add_key_columns()
+                # Secondary indexes for paging by name and by domain
+                for order in ('name', 'domain'):
+                    self._connection.execute(
+                        f"CREATE INDEX IF NOT EXISTS users_by_{order} "
+                        f"ON users ({self._KEYS[order]}, email)"
+                    )
+        except sqlite3.Error as e:
+            raise StorageError(f"Error opening database: {str(e)}") from e
+        # The connection is shared by the hashing threads
+        self._lock = threading.Lock()
+    
+    def _add_key_columns(self):
+        """Add and fill the key columns of a table created without them."""
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(users)")}
+        if 'name_key' in columns:
+            return
+        # The old indexes were on lower() expressions
+        self._connection.execute("DROP INDEX IF EXISTS users_by_name")
+        self._connection.execute("DROP INDEX IF EXISTS users_by_domain")
+        for column in ('name_key', 'domain_key'):
+            self._connection.execute(f"ALTER TABLE users ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+        rows = self._connection.execute("SELECT email, name FROM users").fetchall()
+        self._connection.executemany(
+            "UPDATE users SET name_key = ?, domain_key = ? WHERE email = ?",
+            ((_sort_key('name', email, name), _sort_key('domain', email, name), email)
+             for email, name in rows)
+        )
+    
+    @staticmethod
+    def _record(row: Tuple[str, str, str]) -> Dict:
+        email, name, password_hash = row
+        return {'name': name, 'email': email, 'password_hash': password_hash}
+    
+    def get_many(self, emails: Iterable[str]) -> Dict[str, Dict]:
+        emails = list(emails)
+        found = {}
+        with self._lock:
+            for start in range(0, len(emails), self._BATCH):
+                batch = emails[start:start + self._BATCH]
+                rows = self._connection.execute(
+                    "SELECT email, name, password_hash FROM users WHERE email IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch
+                )
+                found.update((row[0], self._record(row)) for row in rows)
+        return found
+    
+    def add_many(self, records: Dict[str, Dict]) -> set:
+        added = set()
+        try:
+            with self._lock, self._connection:
+                for email, record in records.items():
+                    cursor = self._connection.execute(
+                        "INSERT OR IGNORE INTO users (email, name, password_hash, name_key, domain_key) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (email, record['name'], record['password_hash'],
+                         _sort_key('name', email, record['name']),
+                         _sort_key('domain', email, record['name']))
+                    )
+                    if cursor.rowcount:
+                        added.add(email)
+        except sqlite3.Error as e:
+            raise StorageError(f"Error writing to database: {str(e)}") from e
+        return added
+    
+    def delete(self, email: str) -> bool:
+        try:
+            with self._lock, self._connection:
+                cursor = self._connection.execute("DELETE FROM users WHERE email = ?", (email,))
+        except sqlite3.Error as e:
+            raise StorageError(f"Error writing to database: {str(e)}") from e
+        return cursor.rowcount > 0
+    
+    def replace_hashes(self, updates: Dict[str, Tuple[str, str]]) -> int:
+        replaced = 0
+        try:
+            with self._lock, self._connection:
+                for email, (expected, new) in updates.items():
+                    cursor = self._connection.execute(
+                        "UPDATE users SET password_hash = ? WHERE email = ? AND password_hash = ?",
+                        (new, email, expected)
+                    )
+                    replaced += cursor.rowcount
+        except sqlite3.Error as e:
+            raise StorageError(f"Error writing to database: {str(e)}") from e
+        return replaced
+    
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT email, name, password_hash FROM users ORDER BY email"
+            ).fetchall()
+        return ((row[0], self._record(row)) for row in rows)
+    
+    def page(
+        self,
+        order: str,
+        prefix: str = "",
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50
+    ) -> List[Tuple[Tuple[str, str], Dict]]:
+        key = self._KEYS[order]
+        conditions = [f"{key} >= ?", f"{key} < ?"]
+        parameters = [prefix, prefix + _MAX_CHAR]
+        if after is not None:
+            conditions.append(f"({key}, email) > (?, ?)")
+            parameters.extend(after)
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {key}, email, name, password_hash FROM users "
+                f"WHERE {' AND '.join(conditions)} ORDER BY {key}, email LIMIT ?",
+                parameters + [limit]
+            ).fetchall()
+        return [((row[0], row[1]), self._record(row[1:])) for row in rows]
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    
+    def close(self):
+        self._connection.close()
+
+
+class LogUserStore(UserStore):
+    """
+    Users in an append-only JSON Lines log with an in-memory hash index.
+    
+    Every change appends one line: the full record, or a deletion marker.
+    The index maps each email to the offset of its latest record, so a
+    lookup is one seek and one line parsed. Lines appended by other
+    processes are indexed before every operation; compact() rewrites the
+    log without superseded lines.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        # Create the file without truncating it
+        open(self.path, 'ab').close()
+        self._mutex = threading.RLock()
+        self._file = None
+        with self._locked(shared=True):
+            self._open()
+    
+    def _open(self):
+        """(Re)open the log and index it from the start."""
+        if self._file is not None:
+            self._file.close()
+            self._reader.close()
+        # One handle scans for new lines, the other reads records
+        self._file = open(self.path, 'rb')
+        self._reader = open(self.path, 'rb')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._index: Dict[str, int] = {}
+        self._indexes: Optional[UserIndex] = None
+        self._indexed_to = 0
+        self._catch_up()
+    
+    def _catch_up(self, repair: bool = False):
+        """
+        Index lines appended since the last call.
+        
+        Args:
+            repair: Truncate a partial last line left by a crashed writer
+                (only safe while holding the write lock)
+        """
+        status = os.stat(self.path)
+        if status.st_ino != self._inode or status.st_size < self._indexed_to:
+            # Compacted by another process
+            self._open()
+            return
+        if status.st_size == self._indexed_to:
+            return
+        
+        self._file.seek(self._indexed_to)
+        offset = self._indexed_to
+        for line in self._file:
+            if not line.endswith(b"\n"):
+                if repair:
+                    os.truncate(self.path, offset)
+                break
+            entry = json.loads(line)
+            email = entry['email']
+            if self._indexes is not None and email in self._index:
+                self._indexes.remove(email, self._read(self._index[email])['name'])
+            if entry.get('deleted'):
+                self._index.pop(email, None)
+            else:
+                self._index[email] = offset
+                if self._indexes is not None:
+                    self._indexes.add(email, entry['name'])
+            offset += len(line)
+        self._indexed_to = offset
+    
+    def _read(self, offset: int) -> Dict:
+        self._reader.seek(offset)
+        entry = json.loads(self._reader.readline())
+        return {'name': entry['name'], 'email': entry['email'], 'password_hash': entry['password_hash']}
+    
+    def _append(self, entries: List[Dict]):
+        """Append entries in one write and sync them to disk."""
+        data = b"".join(json.dumps(entry).encode('utf-8') + b"\n" for entry in entries)
+        try:
+            with open(self.path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            raise StorageError(f"Error writing to database: {str(e)}") from e
+    
+    def get_many(self, emails: Iterable[str]) -> Dict[str, Dict]:
+        with self._locked(shared=True):
+            self._catch_up()
+            return {email: self._read(self._index[email]) for email in emails if email in self._index}
+    
+    def add_many(self, records: Dict[str, Dict]) -> set:
+        with self._locked():
+            self._catch_up(repair=True)
+            added = [email for email in records if email not in self._index]
+            if added:
+                self._append([dict(records[email], email=email) for email in added])
+                self._catch_up()
+            return set(added)
+    
+    def delete(self, email: str) -> bool:
+        with self._locked():
+            self._catch_up(repair=True)
+            if email not in self._index:
+                return False
+            self._append([{'email': email, 'deleted': True}])
+            self._catch_up()
+            return True
+    
+    def replace_hashes(self, updates: Dict[str, Tuple[str, str]]) -> int:
+        with self._locked():
+            self._catch_up(repair=True)
+            entries = []
+            for email, (expected, new) in updates.items():
+                if email in self._index:
+                    record = self._read(self._index[email])
+                    if record['password_hash'] == expected:
+                        entries.append(dict(record, password_hash=new))
+            if entries:
+                self._append(entries)
+                self._catch_up()
+            return len(entries)
+    
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        with self._locked(shared=True):
+            self._catch_up()
+            return iter([(email, self._read(offset)) for email, offset in self._index.items()])
+    
+    def page(
+        self,
+        order: str,
+        prefix: str = "",
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50
+    ) -> List[Tuple[Tuple[str, str], Dict]]:
+        with self._locked(shared=True):
+            self._catch_up()
+            # Built on first use, then maintained as lines are indexed
+            if self._indexes is None:
+                self._indexes = UserIndex(
+                    (email, self._read(offset)['name']) for email, offset in self._index.items()
+                )
+            return [
+                (entry, self._read(self._index[entry[1]]))
+                for entry in self._indexes.page(order, prefix, after, limit)
+            ]
+    
+    def __contains__(self, email: str) -> bool:
+        with self._locked(shared=True):
+            self._catch_up()
+            return email in self._index
+    
+    def __len__(self) -> int:
+        with self._locked(shared=True):
+            self._catch_up()
+            return len(self._index)
+    
+    def compact(self):
+        """Rewrite the log with only the latest record of each user."""
+        with self._locked():
+            self._catch_up(repair=True)
+            records = [self._read(offset) for offset in self._index.values()]
+            temporary = f"{self.path}.compact"
+            with open(temporary, 'wb') as f:
+                for record in records:
+                    f.write(json.dumps(record).encode('utf-8') + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.path)
+            _fsync_directory(self.path)
+            self._open()
+    
+    @contextmanager
+    def _locked(self, shared: bool = False):
+        """
+        Hold the log's lock file across processes (POSIX only).
+        
+        Writers take it exclusively so checks and appends are atomic;
+        readers take it shared so they never see a compaction half done.
+        Threads of this process also share the read handle, so they take
+        turns.
+        """
+        with self._mutex, _file_lock(f"{self.path}.lock", shared):
+            yield
+    
+    def close(self):
+        self._file.close()
+        self._reader.close()
+
+
+# File extension -> storage backend used by open_store
+STORE_BACKENDS = {
+    '.json': JSONFileStore,
+    '.db': SQLiteUserStore,
+    '.sqlite': SQLiteUserStore,
+    '.sqlite3': SQLiteUserStore,
+    '.log': LogUserStore,
+}
+
+
+def open_store(path: str) -> UserStore:
+    """
+    Open the storage backend matching a database file's extension.
+    
+    Any other extension opens a JSON file, as UserManager always has.
+    
+    Args:
+        path: users.db / .sqlite / .sqlite3, users.log, or a JSON file
+        
+    Returns:
+        The store
+    """
+    extension = Path(path).suffix.lower()
+    return STORE_BACKENDS.get(extension, JSONFileStore)(path)
+
+
+def migrate_users(source: str, target: str, batch_size: int = 10000) -> Tuple[int, int]:
+    """
+    Copy every user from one database file into another.
+    
+    Password hashes are copied as they are, so nothing is rehashed. Users
+    already in the target are kept and skipped.
+    
+    Args:
+        source: Database file to read (e.g. users.json)
+        target: Database file to write (e.g. users.db)
+        batch_size: Users written per transaction
+        
+    Returns:
+        Tuple of (users copied, users skipped)
+        
+    Raises:
+        ValueError: If the source does not exist
+    """
+    if not os.path.exists(source):
+        raise ValueError(f"{source}: no such database")
+    source_store = open_store(source)
+    target_store = open_store(target)
+    copied = skipped = 0
+    try:
+        batch = {}
+        for email, record in source_store.items():
+            batch[email] = record
+            if len(batch) >= batch_size:
+                added = len(target_store.add_many(batch))
+                copied += added
+                skipped += len(batch) - added
+                batch = {}
+        if batch:
+            added = len(target_store.add_many(batch))
+            copied += added
+            skipped += len(batch) - added
+    finally:
+        source_store.close()
+        target_store.close()
+    return copied, skipped
+
+
+
+def _hash_rounds(hashed_password: str) -> Optional[int]:
+    """The cost stored in a bcrypt hash ("$2b$12$..." -> 12), or None."""
+    try:
+        return int(hashed_password.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+@dataclass(frozen=True)
+class HashCostPolicy:
+    """
+    The bcrypt cost (log2 of the key-expansion rounds) used for new hashes.
+    
+    Each step up doubles the time to hash, for users and attackers alike.
+    With ``rehash`` set, a stored hash of a lower cost is replaced after the
+    user's next successful login, so raising the cost upgrades accounts as
+    their owners log in. Hashes of a higher cost are kept unless
+    ``downgrade`` is also set, so hosts with different policies sharing
+    one store do not rehash the same accounts back and forth.
+    """
+    rounds: int = 12
+    rehash: bool = True
+    downgrade: bool = False
+    
+    def __post_init__(self):
+        if not 4 <= self.rounds <= 31:
+            raise ValueError("bcrypt rounds must be between 4 and 31")
+    
+    @classmethod
+    def calibrate(
+        cls,
+        target_seconds: float = 0.25,
+        min_rounds: int = 10,
+        max_rounds: int = 16,
+        rehash: bool = True
+    ) -> "HashCostPolicy":
+        """
+        Pick the cost whose hash time on this host is closest to a target.
+        
+        Times a few cheap hashes and extrapolates, since every extra round
+        doubles the time; takes a few tens of milliseconds. The result
+        depends on the host and its load, so hosts sharing a store should
+        use one fixed policy rather than calibrating each.
+        
+        Args:
+            target_seconds: Desired time to hash (or verify) one password
+            min_rounds: Lowest cost accepted, however slow the host
+            max_rounds: Highest cost accepted, however fast the host
+            rehash: See HashCostPolicy
+            
+        Returns:
+            The policy
+        """
+        sample_rounds = 6
+        salt = bcrypt.gensalt(rounds=sample_rounds)
+        seconds = float('inf')
+        for _ in range(3):
+            start = time.perf_counter()
+            bcrypt.hashpw(b"calibration", salt)
+            seconds = min(seconds, time.perf_counter() - start)
+        
+        rounds = sample_rounds + round(math.log2(target_seconds / max(seconds, 1e-9)))
+        return cls(max(min_rounds, min(max_rounds, rounds)), rehash)
+    
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Whether a stored hash should be replaced at this policy's cost."""
+        rounds = _hash_rounds(hashed_password)
+        if not self.rehash or rounds is None:
             return False
+        return rounds < self.rounds or (self.downgrade and rounds > self.rounds)
+
+
+class PasswordRehasher:
+    """
+    Rehashes passwords at the current cost after logins, off the request
+    path.
+    
+    A login only queues the user; a background thread waits up to
+    ``max_delay`` seconds to collect a batch, hashes it on the manager's
+    thread pool and writes every new hash in one store call. A hash is
+    replaced only if it has not changed in the meantime. Plain passwords
+    stay in memory only until their batch is written.
+    """
+    
+    def __init__(self, manager: "UserManager", batch_size: int = 64, max_delay: float = 0.5):
+        self.manager = manager
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        # Hashes replaced so far
+        self.rehashed = 0
+        self._pending: Dict[str, Tuple[str, str]] = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+    
+    def submit(self, email: str, password: str, old_hash: str):
+        """Queue a user whose password was just verified against old_hash."""
+        with self._condition:
+            if self._closed or email in self._pending:
+                return
+            self._pending[email] = (password, old_hash)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="rehash", daemon=True)
+                self._thread.start()
+            # Wake the thread to start a batch, and again when it is full
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._condition.notify()
+    
+    def _take_batch(self) -> Dict[str, Tuple[str, str]]:
+        """Wait for work, then give the batch time to fill."""
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._closed:
+                self._condition.wait_for(
+                    lambda: len(self._pending) >= self.batch_size or self._closed,
+                    timeout=self.max_delay
+                )
+            batch, self._pending = self._pending, {}
+            return batch
+    
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+            elif self._closed:
+                return
+    
+    def _write(self, batch: Dict[str, Tuple[str, str]]) -> int:
+        """Rehash and store a batch; a failure is reported and the batch dropped."""
+        try:
+            return self._rehash(batch)
+        except Exception as e:
+            # The users keep their old hashes and are queued again on
+            # their next login; the thread must survive to serve them
+            print(f"Error rehashing passwords: {str(e)}")
+            return 0
+    
+    def _rehash(self, batch: Dict[str, Tuple[str, str]]) -> int:
+        emails = list(batch)
+        hashes = self.manager._executor().map(
+            self.manager._hash_password, [batch[email][0] for email in emails]
+        )
+        updates = {email: (batch[email][1], new_hash) for email, new_hash in zip(emails, hashes)}
+        replaced = self.manager.store.replace_hashes(updates)
+        self.rehashed += replaced
+        return replaced
+    
+    def flush(self) -> int:
+        """
+        Rehash everything queued now, in the calling thread.
+        
+        Returns:
+            Number of hashes replaced
+        """
+        with self._condition:
+            batch, self._pending = self._pending, {}
+        return self._write(batch) if batch else 0
+    
+    def close(self):
+        """Write what is queued and stop the background thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+@dataclass
+class ImportReport:
+    """Outcome of UserManager.import_users."""
+    rows: int = 0
+    imported: int = 0
+    # Rows rejected by validation, including malformed lines
+    invalid: int = 0
+    # Rows repeating an email seen earlier in the file
+    duplicates: int = 0
+    # Rows whose email was already registered
+    existing: int = 0
+    # Valid rows lost to a storage error
+    failed: int = 0
+    seconds: float = 0.0
+    # (line number, message) of the first rejected rows
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    
+    # Most rejections kept in errors
+    MAX_ERRORS = 100
+    
+    def reject(self, line: int, message: str):
+        """Record a rejected row's message, while there is room."""
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((line, message))
+    
+    def __str__(self) -> str:
+        rate = self.rows / self.seconds if self.seconds else 0.0
+        return (f"Imported {self.imported:,} of {self.rows:,} rows in {self.seconds:.2f}s "
+                f"({rate:,.0f} rows/s): {self.invalid:,} invalid, {self.duplicates:,} duplicate, "
+                f"{self.existing:,} already registered, {self.failed:,} failed")
+
+
+def _read_import_rows(path: str) -> Iterator[Tuple[int, Optional[Dict]]]:
+    """
+    Read the rows of a CSV or JSONL import file.
+    
+    Yields:
+        (line number, fields) pairs; fields is None for a malformed line
+    
+    Raises:
+        ValueError: If the file type is unknown or a CSV file lacks a column
+    """
+    file_format = IMPORT_FORMATS.get(Path(path).suffix.lower())
+    if file_format is None:
+        raise ValueError(f"Unknown import file type '{path}', expected one of {list(IMPORT_FORMATS)}")
+    
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if file_format == 'csv':
+            reader = csv.DictReader(f)
+            columns = set(reader.fieldnames or ())
+            if not {'name', 'email'} <= columns or not columns & {'password', 'password_hash'}:
+                raise ValueError(f"{path}: expected columns name, email and password or password_hash")
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else None
+
+
+class UserManager:
+    """
+    Manages secure storage and retrieval of user information.
+    Passwords are hashed using bcrypt for security.
+    
+    Each bcrypt call costs hundreds of milliseconds of CPU. bcrypt releases
+    the GIL while hashing, so the async and batch methods run it on a
+    thread pool and scale with the number of cores. The cost itself is set
+    by a HashCostPolicy.
+    """
+    
+    def __init__(
+        self,
+        db_file: str = DATABASE_FILE,
+        hash_workers: Optional[int] = None,
+        store: Optional[UserStore] = None,
+        cost_policy: Optional[HashCostPolicy] = None
+    ):
+        """
+        Initialize the UserManager.
+        
+        Args:
+            db_file: Path to the database file; its extension picks the
+                backend (.db/.sqlite/.sqlite3 or .log; anything else is JSON)
+            hash_workers: Threads used for hashing by the async and batch
+                methods (default: CPU count)
+            store: Storage backend to use instead of opening db_file
+            cost_policy: bcrypt cost of new hashes (default:
+                HashCostPolicy(), a fixed 12 rounds)
+        """
+        self.db_file = db_file
+        self.hash_workers = hash_workers or os.cpu_count() or 1
+        self._hash_executor = None
+        self.store = store if store is not None else open_store(db_file)
+        self.cost_policy = cost_policy if cost_policy is not None else HashCostPolicy()
+        self.rehasher = PasswordRehasher(self)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        """
+        Finish queued rehashes, stop the hashing threads, if any were
+        started, and close the store.
+        """
+        self.rehasher.close()
+        if self._hash_executor is not None:
+            self._hash_executor.shutdown()
+            self._hash_executor = None
+        self.store.close()
+    
+    def _executor(self) -> ThreadPoolExecutor:
+        """Get the hashing thread pool, starting it on first use."""
+        if self._hash_executor is None:
+            self._hash_executor = ThreadPoolExecutor(
+                max_workers=self.hash_workers,
+                thread_name_prefix="bcrypt"
+            )
+        return self._hash_executor
+    
+    def _add_user(self, name: str, email: str, hashed_password: str) -> Tuple[bool, str]:
+        """
+        Store a new user whose password is already hashed.
+        
+        Returns:
+            Tuple of (success, message)
+        """
+        # Store user data (password is hashed, never stored in plain text)
+        record = {
+            'name': name.strip(),
+            'email': email.strip(),
+            'password_hash': hashed_password  # Only hash is stored
+        }
+        
+        # Save to database
+        try:
+            if not self.store.add(email, record):
+                # Registered by someone else while hashing
+                return False, "Error: Email already registered."
+        except StorageError as e:
+            print(str(e))
+            return False, "Error: Failed to save user to database."
+        return True, f"Success: User '{name}' registered successfully."
     
     def _validate_email(self, email: str) -> bool:
         """
@@ -78,8 +1404,7 @@ class UserManager:
         Returns:
             True if valid, False otherwise
         """
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+        return _EMAIL_PATTERN.match(email) is not None
     
     def _validate_password(self, password: str) -> Tuple[bool, str]:
         """
@@ -94,17 +1419,9 @@ class UserManager:
         if len(password) < 8:
             return False, "Password must be at least 8 characters long."
         
-        if not re.search(r'[A-Z]', password):
-            return False, "Password must contain at least one uppercase letter."
-        
-        if not re.search(r'[a-z]', password):
-            return False, "Password must contain at least one lowercase letter."
-        
-        if not re.search(r'[0-9]', password):
-            return False, "Password must contain at least one digit."
-        
-        if not re.search(r'[!@#$%^&*()_+\-=\[\]{};:\'",.<>?/\\|`~]', password):
-            return False, "Password must contain at least one special character."
+        for pattern, message in _PASSWORD_RULES:
+            if not pattern.search(password):
+                return False, message
         
         return True, "Password is strong."
     
@@ -118,8 +1435,8 @@ class UserManager:
         Returns:
             Hashed password (bytes decoded as string)
         """
-        # Generate salt and hash the password
-        salt = bcrypt.gensalt(rounds=12)  # 12 rounds provides good security/speed balance
+        # Generate salt and hash the password at the policy's cost
+        salt = bcrypt.gensalt(rounds=self.cost_policy.rounds)
         hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
         return hashed.decode('utf-8')
     
@@ -153,45 +1470,243 @@ class UserManager:
             Tuple of (success, message)
         """
         # Validate inputs
+        error = self._check_registration(name, email, password)
+        if error:
+            return False, error
+        
+        # Check if email already exists
+        if email in self.store:
+            return False, "Error: Email already registered."
+        
+        # Hash the password
+        hashed_password = self._hash_password(password)
+        
+        return self._add_user(name, email, hashed_password)
+    
+    def _check_registration(self, name: str, email: str, password: str) -> Optional[str]:
+        """
+        Validate registration details.
+        
+        Returns:
+            Error message, or None if the details are valid
+        """
         if not name or not name.strip():
-            return False, "Error: Name cannot be empty."
+            return "Error: Name cannot be empty."
         
         if not email or not email.strip():
-            return False, "Error: Email cannot be empty."
+            return "Error: Email cannot be empty."
         
         if not self._validate_email(email):
-            return False, "Error: Invalid email format."
+            return "Error: Invalid email format."
         
         if not password:
-            return False, "Error: Password cannot be empty."
+            return "Error: Password cannot be empty."
         
         # Validate password strength
         is_valid, message = self._validate_password(password)
         if not is_valid:
-            return False, f"Error: {message}"
+            return f"Error: {message}"
         
-        # Load existing users
-        users = self._load_users()
+        return None
+    
+    async def register_user_async(self, name: str, email: str, password: str) -> Tuple[bool, str]:
+        """
+        Register a new user without blocking the event loop while hashing.
         
-        # Check if email already exists
-        if email in users:
+        Args:
+            name: User's full name
+            email: User's email address
+            password: User's password (will be hashed)
+            
+        Returns:
+            Tuple of (success, message), as from register_user
+        """
+        error = self._check_registration(name, email, password)
+        if error:
+            return False, error
+        
+        if email in self.store:
             return False, "Error: Email already registered."
         
-        # Hash the password
-        hashed_password = self._hash_password(password)
+        loop = asyncio.get_running_loop()
+        hashed_password = await loop.run_in_executor(self._executor(), self._hash_password, password)
+        return self._add_user(name, email, hashed_password)
+    
+    def register_users_bulk(self, users: Iterable[Tuple[str, str, str]]) -> List[Tuple[bool, str]]:
+        """
+        Register many users, hashing their passwords in parallel.
         
-        # Store user data (password is hashed, never stored in plain text)
-        users[email] = {
-            'name': name.strip(),
-            'email': email.strip(),
-            'password_hash': hashed_password  # Only hash is stored
-        }
+        Every user is validated as by register_user; the valid ones are
+        hashed on the thread pool and saved with a single write.
         
-        # Save to database
-        if self._save_users(users):
-            return True, f"Success: User '{name}' registered successfully."
+        Args:
+            users: (name, email, password) tuples
+            
+        Returns:
+            List of (success, message) tuples, in input order
+        """
+        users = list(users)
+        results: List[Optional[Tuple[bool, str]]] = [None] * len(users)
+        accepted = []
+        seen = set()
+        
+        for i, (name, email, password) in enumerate(users):
+            error = self._check_registration(name, email, password)
+            if error:
+                results[i] = (False, error)
+            elif email in seen:
+                results[i] = (False, "Error: Email already registered.")
+            else:
+                seen.add(email)
+                accepted.append(i)
+        
+        # Skip hashing for users who are already registered
+        existing = self.store.get_many(users[i][1] for i in accepted)
+        for i in accepted:
+            if users[i][1] in existing:
+                results[i] = (False, "Error: Email already registered.")
+        accepted = [i for i in accepted if users[i][1] not in existing]
+        
+        hashes = self._executor().map(self._hash_password, [users[i][2] for i in accepted])
+        records = {}
+        for i, hashed_password in zip(accepted, hashes):
+            name, email, _ = users[i]
+            records[email] = {
+                'name': name.strip(),
+                'email': email.strip(),
+                'password_hash': hashed_password
+            }
+        
+        try:
+            added = self.store.add_many(records) if records else set()
+        except StorageError as e:
+            print(str(e))
+            for i in accepted:
+                results[i] = (False, "Error: Failed to save user to database.")
+            return results
+        
+        for i in accepted:
+            if users[i][1] in added:
+                results[i] = (True, f"Success: User '{users[i][0]}' registered successfully.")
+            else:
+                results[i] = (False, "Error: Email already registered.")
+        return results
+    
+    def _check_import_row(self, row: Optional[Dict]) -> Tuple[Optional[str], Tuple[str, str, str, bool]]:
+        """
+        Validate one import row.
+        
+        Returns:
+            (error message or None, (name, email, password or hash, is_hash))
+        """
+        if row is None:
+            return "Error: Malformed line.", None
+        
+        name = str(row.get('name') or '').strip()
+        email = str(row.get('email') or '').strip()
+        password_hash = str(row.get('password_hash') or '')
+        if password_hash:
+            # Migrated hashes are kept; their strength cannot be checked
+            if not name:
+                return "Error: Name cannot be empty.", None
+            if not email:
+                return "Error: Email cannot be empty.", None
+            if not self._validate_email(email):
+                return "Error: Invalid email format.", None
+            if _BCRYPT_HASH_PATTERN.match(password_hash) is None:
+                return "Error: Invalid bcrypt hash.", None
+            return None, (name, email, password_hash, True)
+        
+        password = str(row.get('password') or '')
+        error = self._check_registration(name, email, password)
+        if error:
+            return error, None
+        return None, (name, email, password, False)
+    
+    def import_users(self, path: str, batch_size: int = 10000) -> ImportReport:
+        """
+        Register every user in a CSV or JSONL file.
+        
+        Rows have a name, an email and either a password, validated and
+        hashed as by register_user, or the password_hash of a bcrypt hash
+        migrated from another system, stored as is. Rows are checked against
+        the precompiled patterns and against the emails earlier in the file,
+        then looked up in the store batch_size at a time; passwords are
+        hashed on the thread pool and all the new users are saved in one
+        store transaction, so a failed import adds nobody.
+        
+        Hashing dominates: at 12 rounds each password costs about 0.3
+        seconds of CPU, so large migrations should bring their existing
+        hashes (a hash of a lower cost is replaced on the user's next
+        login, see HashCostPolicy).
+        
+        Args:
+            path: .csv file with a header row, or .jsonl file of objects
+            batch_size: Rows looked up and hashed per step
+            
+        Returns:
+            ImportReport counting what happened to each row
+            
+        Raises:
+            ValueError: If the file cannot be read as an import file
+        """
+        start = time.perf_counter()
+        report = ImportReport()
+        seen = set()
+        accepted: List[Tuple[int, Tuple[str, str, str, bool]]] = []
+        
+        for line, row in _read_import_rows(path):
+            report.rows += 1
+            error, user = self._check_import_row(row)
+            if error:
+                report.invalid += 1
+                report.reject(line, error)
+            elif user[1] in seen:
+                report.duplicates += 1
+                report.reject(line, "Error: Email appears earlier in the file.")
+            else:
+                seen.add(user[1])
+                accepted.append((line, user))
+        seen.clear()
+        
+        records = {}
+        executor = self._executor()
+        for batch_start in range(0, len(accepted), batch_size):
+            batch = accepted[batch_start:batch_start + batch_size]
+            existing = self.store.get_many(user[1] for _, user in batch)
+            new_users = []
+            for line, user in batch:
+                if user[1] in existing:
+                    report.existing += 1
+                    report.reject(line, "Error: Email already registered.")
+                else:
+                    new_users.append(user)
+            
+            plain = [user for user in new_users if not user[3]]
+            hashes = dict(zip(
+                (user[1] for user in plain),
+                executor.map(self._hash_password, [user[2] for user in plain])
+            ))
+            for name, email, secret, is_hash in new_users:
+                records[email] = {
+                    'name': name,
+                    'email': email,
+                    'password_hash': secret if is_hash else hashes[email]
+                }
+        accepted.clear()
+        
+        try:
+            added = self.store.add_many(records) if records else set()
+        except StorageError as e:
+            print(str(e))
+            report.failed = len(records)
         else:
-            return False, "Error: Failed to save user to database."
+            report.imported = len(added)
+            # Registered by another writer since the lookup
+            report.existing += len(records) - len(added)
+        
+        report.seconds = time.perf_counter() - start
+        return report
     
     def login_user(self, email: str, password: str) -> Tuple[bool, str]:
         """
@@ -208,23 +1723,80 @@ class UserManager:
         if not email or not password:
             return False, "Error: Email and password are required."
         
-        # Load users
-        users = self._load_users()
+        # Look up the user
+        user = self.store.get(email)
         
         # Check if email exists
-        if email not in users:
+        if user is None:
             return False, "Error: Invalid email or password."
         
         # Retrieve stored password hash
-        stored_hash = users[email]['password_hash']
+        stored_hash = user['password_hash']
         
         # Verify password
         if self._verify_password(password, stored_hash):
-            user_name = users[email]['name']
+            if self.cost_policy.needs_rehash(stored_hash):
+                self.rehasher.submit(email, password, stored_hash)
+            user_name = user['name']
             return True, f"Success: Welcome back, {user_name}!"
         else:
             return False, "Error: Invalid email or password."
     
+    async def login_user_async(self, email: str, password: str) -> Tuple[bool, str]:
+        """
+        Authenticate a user without blocking the event loop while verifying.
+        
+        Args:
+            email: User's email address
+            password: User's password
+            
+        Returns:
+            Tuple of (success, message), as from login_user
+        """
+        if not email or not password:
+            return False, "Error: Email and password are required."
+        
+        user = self.store.get(email)
+        if user is None:
+            return False, "Error: Invalid email or password."
+        
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(
+            self._executor(), self._verify_password, password, user['password_hash']
+        ):
+            if self.cost_policy.needs_rehash(user['password_hash']):
+                self.rehasher.submit(email, password, user['password_hash'])
+            return True, f"Success: Welcome back, {user['name']}!"
+        return False, "Error: Invalid email or password."
+    
+    def verify_many(self, credentials: Iterable[Tuple[str, str]]) -> List[bool]:
+        """
+        Check many (email, password) pairs, verifying in parallel.
+        
+        All the users are looked up in one store call.
+        
+        Args:
+            credentials: (email, password) tuples
+            
+        Returns:
+            Whether each pair is valid, in input order
+        """
+        credentials = list(credentials)
+        users = self.store.get_many(email for email, _ in credentials if email)
+        
+        def verify(pair: Tuple[str, str]) -> bool:
+            email, password = pair
+            if not email or not password or email not in users:
+                return False
+            stored_hash = users[email]['password_hash']
+            if not self._verify_password(password, stored_hash):
+                return False
+            if self.cost_policy.needs_rehash(stored_hash):
+                self.rehasher.submit(email, password, stored_hash)
+            return True
+        
+        return list(self._executor().map(verify, credentials))
+    
     def get_user(self, email: str) -> Optional[Dict]:
         """
         Retrieve user information (excluding password hash).
@@ -235,27 +1807,121 @@ class UserManager:
         Returns:
             User data dictionary or None if not found
         """
-        users = self._load_users()
+        user = self.store.get(email)
         
-        if email not in users:
+        if user is None:
             return None
         
-        user = users[email].copy()
+        user = user.copy()
         # Don't return the password hash
         del user['password_hash']
         return user
     
+    def list_users_page(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        order: str = 'email',
+        prefix: str = ""
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Get one page of users (without passwords), sorted by email, name
+        or email domain.
+        
+        Pages are read from the store's sorted indexes, so a page costs
+        O(log n + limit) however many users there are. Users added or
+        removed between pages do not shift the pages after them.
+        
+        Args:
+            cursor: Cursor returned with the previous page (None for the
+                first page)
+            limit: Users per page
+            order: 'email', 'name' or 'domain'
+            prefix: Only users whose email, name (case-insensitive) or
+                domain (case-insensitive) starts with this
+            
+        Returns:
+            Tuple of (users, cursor of the next page or None at the end)
+            
+        Raises:
+            ValueError: If the order, limit or cursor is invalid
+        """
+        if order not in USER_ORDERS:
+            raise ValueError(f"Unknown order '{order}', expected one of {USER_ORDERS}")
+        if limit <= 0:
+            raise ValueError("Limit must be positive")
+        if order != 'email':
+            prefix = prefix.lower()
+        
+        after = None
+        if cursor is not None:
+            try:
+                cursor_order, cursor_prefix, key, email = json.loads(base64.urlsafe_b64decode(cursor))
+            except (ValueError, TypeError):
+                raise ValueError("Invalid cursor") from None
+            if (cursor_order, cursor_prefix) != (order, prefix):
+                raise ValueError("Cursor belongs to a different listing")
+            after = (key, email)
+        
+        entries = self.store.page(order, prefix, after, limit)
+        users = [{'name': record['name'], 'email': record['email']} for _, record in entries]
+        
+        next_cursor = None
+        if len(entries) == limit:
+            key, email = entries[-1][0]
+            next_cursor = base64.urlsafe_b64encode(
+                json.dumps([order, prefix, key, email]).encode('utf-8')
+            ).decode('ascii')
+        return users, next_cursor
+    
+    def iter_users(self, order: str = 'email', prefix: str = "", page_size: int = 500) -> Iterator[Dict]:
+        """
+        Stream users (without passwords) page by page.
+        
+        Only one page is held in memory at a time.
+        
+        Args:
+            order: 'email', 'name' or 'domain'
+            prefix: See list_users_page
+            page_size: Users fetched per page
+            
+        Yields:
+            User data dictionaries
+        """
+        cursor = None
+        while True:
+            users, cursor = self.list_users_page(cursor, page_size, order, prefix)
+            yield from users
+            if cursor is None:
+                return
+    
+    def search_users(self, prefix: str, by: str = 'name', limit: int = 50) -> List[Dict]:
+        """
+        Find users whose name, email or email domain starts with a prefix.
+        
+        Args:
+            prefix: Start of the name / email / domain (e.g. "example.")
+            by: 'name', 'email' or 'domain'
+            limit: Most users returned
+            
+        Returns:
+            Matching users (without passwords), sorted by that key
+        """
+        return self.list_users_page(limit=limit, order=by, prefix=prefix)[0]
+    
     def list_all_users(self) -> list:
         """
         Get list of all registered users (without passwords).
         
+        Holds every user in memory at once; use iter_users or
+        list_users_page for large databases.
+        
         Returns:
             List of user data dictionaries
         """
-        users = self._load_users()
         user_list = []
         
-        for user_data in users.values():
+        for _, user_data in self.store.items():
             user_info = {
                 'name': user_data['name'],
                 'email': user_data['email']
@@ -281,15 +1947,16 @@ class UserManager:
         if not is_valid:
             return False, "Error: Invalid credentials. Account deletion failed."
         
-        users = self._load_users()
+        user = self.store.get(email)
         
-        if email in users:
-            user_name = users[email]['name']
-            del users[email]
+        if user is not None:
+            user_name = user['name']
             
-            if self._save_users(users):
-                return True, f"Success: User '{user_name}' deleted successfully."
-            else:
+            try:
+                if self.store.delete(email):
+                    return True, f"Success: User '{user_name}' deleted successfully."
+            except StorageError as e:
+                print(str(e))
                 return False, "Error: Failed to delete user from database."
         
         return False, "Error: User not found."
@@ -350,15 +2017,21 @@ def main():
                 print("Error: User not found.")
         
         elif choice == '4':
-            # List all users
+            # List all users, one page at a time
             print("\n--- All Registered Users ---")
-            users = manager.list_all_users()
+            users, cursor = manager.list_users_page(limit=20)
             
-            if users:
-                for i, user in enumerate(users, 1):
-                    print(f"{i}. {user['name']} ({user['email']})")
-            else:
+            if not users:
                 print("No users registered yet.")
+            
+            count = 0
+            while users:
+                for user in users:
+                    count += 1
+                    print(f"{count}. {user['name']} ({user['email']})")
+                if cursor is None or input("Show more? (y/n): ").strip().lower() != 'y':
+                    break
+                users, cursor = manager.list_users_page(cursor, limit=20)
         
         elif choice == '5':
             # Delete account
@@ -0,0 +1,177 @@
+"""
+User Storage Stress Benchmark
+Registers users from several processes at once, checks that none are lost
+and reports throughput, latency and how many file rewrites were needed
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, TextIO
+
+from user_storage import STORE_BACKENDS, open_store
+
+# Backend name -> database file extension
+BACKEND_EXTENSIONS = {'json': '.json', 'sqlite': '.db', 'log': '.log'}
+
+# Stands in for a bcrypt hash; hashing is not what is measured here
+FAKE_HASH = "$2b$12$" + "x" * 53
+
+
+def _record(email: str) -> Dict:
+    return {'name': email.split('@')[0], 'email': email, 'password_hash': FAKE_HASH}
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(percent / 100 * len(ordered))), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _register_worker(path: str, worker: int, count: int, batch: int, barrier, results):
+    """Register ``count`` users, ``batch`` per call, once every worker is ready."""
+    store = open_store(path)
+    barrier.wait()
+    added = 0
+    latencies = []
+    for start in range(0, count, batch):
+        records = {
+            email: _record(email)
+            for email in (f"w{worker}-u{i}@example.com" for i in range(start, min(start + batch, count)))
+        }
+        request_start = time.perf_counter()
+        added += len(store.add_many(records))
+        latencies.append(time.perf_counter() - request_start)
+    results.put({'added': added, 'commits': getattr(store, 'commits', None), 'latencies': latencies})
+    store.close()
+
+
+def run_stress_benchmark(
+    backend: str,
+    processes: int,
+    users: int,
+    batch: int = 1,
+    preload: int = 0,
+    directory: str = None
+) -> Dict:
+    """
+    Register users concurrently from several processes.
+
+    Args:
+        backend: Name in BACKEND_EXTENSIONS
+        processes: Writer processes started at the same time
+        users: Users registered by each process
+        batch: Users per add_many call (1 = one register_user each)
+        preload: Users in the database before the run
+        directory: Where to create the database (default: a temporary one)
+
+    Returns:
+        Dictionary with throughput, latency percentiles, the number of file
+        rewrites (JSON backend) and the number of lost registrations
+    """
+    if backend not in BACKEND_EXTENSIONS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {list(BACKEND_EXTENSIONS)}")
+
+    with tempfile.TemporaryDirectory(dir=directory) as workdir:
+        path = os.path.join(workdir, "users" + BACKEND_EXTENSIONS[backend])
+        store = open_store(path)
+        if preload:
+            store.add_many({
+                email: _record(email)
+                for email in (f"preload-{i}@example.com" for i in range(preload))
+            })
+
+        context = multiprocessing.get_context()
+        barrier = context.Barrier(processes + 1)
+        results = context.Queue()
+        workers = [
+            context.Process(target=_register_worker, args=(path, worker, users, batch, barrier, results))
+            for worker in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        barrier.wait()
+        start = time.perf_counter()
+        reports = [results.get() for _ in workers]
+        elapsed = time.perf_counter() - start
+        for process in workers:
+            process.join()
+
+        expected = preload + processes * users
+        stored = len(store)
+        store.close()
+
+    latencies = [latency for report in reports for latency in report['latencies']]
+    commits = [report['commits'] for report in reports]
+    registered = processes * users
+    return {
+        'backend': backend,
+        'processes': processes,
+        'users_per_process': users,
+        'batch': batch,
+        'preload': preload,
+        'seconds': elapsed,
+        'registrations_per_second': registered / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'p50': _percentile(latencies, 50) * 1000,
+            'p99': _percentile(latencies, 99) * 1000,
+            'max': _percentile(latencies, 100) * 1000,
+        },
+        'file_rewrites': sum(commits) if None not in commits else None,
+        'reported_added': sum(report['added'] for report in reports),
+        'lost': expected - stored,
+    }
+
+
+def print_stress_report(results: List[Dict], output: TextIO = None):
+    """Print stress results as a table (to stdout by default)."""
+    output = output or sys.stdout
+    print(f"{'Backend':<8} {'Procs':>6} {'Users':>8} {'Regs/s':>10} {'p50 (ms)':>10} "
+          f"{'p99 (ms)':>10} {'Rewrites':>9} {'Lost':>6}", file=output)
+    print("-" * 74, file=output)
+    for result in results:
+        rewrites = result['file_rewrites']
+        print(f"{result['backend']:<8} {result['processes']:>6} "
+              f"{result['processes'] * result['users_per_process']:>8,} "
+              f"{result['registrations_per_second']:>10.1f} {result['latency_ms']['p50']:>10.2f} "
+              f"{result['latency_ms']['p99']:>10.2f} {rewrites if rewrites is not None else '-':>9} "
+              f"{result['lost']:>6}", file=output)
+
+
+def main():
+    """Run the stress benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--backends', default=','.join(BACKEND_EXTENSIONS),
+                        help=f"Comma-separated backends (default: {','.join(BACKEND_EXTENSIONS)})")
+    parser.add_argument('--processes', type=int, default=8, help="Concurrent writer processes")
+    parser.add_argument('--users', type=int, default=100, help="Users registered per process")
+    parser.add_argument('--batch', type=int, default=1, help="Users per call (1 = like register_user)")
+    parser.add_argument('--preload', type=int, default=10000, help="Users in the database beforehand")
+    parser.add_argument('--dir', help="Directory for the database files (default: system temp)")
+    parser.add_argument('--json', metavar='PATH', help="Also write the results as JSON ('-' for stdout; the table then goes to stderr)")
+    args = parser.parse_args()
+
+    results = [
+        run_stress_benchmark(backend, args.processes, args.users, args.batch, args.preload, args.dir)
+        for backend in args.backends.split(',') if backend
+    ]
+    # Keep stdout parseable when the JSON goes there
+    print_stress_report(results, sys.stderr if args.json == '-' else sys.stdout)
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()